@@ -8,12 +8,24 @@ DATA_POINT_SIGNED_URL_METADATA_KEY = "_signed_url"
 
 DATA_POINT_FILE_PATH_METADATA_KEY = "_data_point_file_path"
 
+DATA_SOURCE_FQN_METADATA_KEY = "_data_source_fqn"
+
+DATA_INGESTION_RUN_NAME_METADATA_KEY = "_data_ingestion_run_name"
+
 DEFAULT_BATCH_SIZE = 100
 
 DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE = 1000
 
 FQN_SEPARATOR = "::"
 
+# Separator between the logical collection name and the generation suffix of the
+# physical collection backing it. Collection names can never contain it.
+SHADOW_COLLECTION_SEPARATOR = "__"
+
+# Lease of a data ingestion run in progress, renewed while the run is alive so that a
+# crashed run stops blocking the runs of its collection once it expires
+DATA_INGESTION_RUN_LEASE_SECONDS = 600
+
 # parser constants
 
 MULTI_MODAL_PARSER_PROMPT = """Given an image containing one or more charts/graphs, and texts, provide a detailed analysis of the data represented in the charts. Your task is to analyze the image and provide insights based on the data it represents.
@@ -37,7 +37,7 @@ def parse_args_ingest_total_collection() -> IngestDataToCollectionDto:
         type=str,
         required=False,
         default="INCREMENTAL",
-        help="Data Ingestion Mode. NONE/INCREMENTAL/FULL",
+        help="Data Ingestion Mode. NONE/INCREMENTAL/FULL/BLUE_GREEN",
     )
     parser.add_argument(
         "--raise_error_on_failure",
@@ -0,0 +1,336 @@
+import hashlib
+import re
+from collections import defaultdict
+from enum import Enum
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from pydantic import Field
+
+from backend.constants import FQN_SEPARATOR, SHADOW_COLLECTION_SEPARATOR
+from backend.logger import logger
+from backend.modules.metadata_store.base import BaseMetadataStore
+from backend.types import ConfiguredBaseModel, DedupIndexEntry, SkippedChunk
+
+# Metadata key set on duplicate chunks in LINK mode
+DUPLICATE_OF_METADATA_KEY = "_duplicate_of"
+# Number of bands the 64 bit SimHash is split into for candidate lookup.
+# Two signatures within `max_hamming_distance` < bands bits of each other share at least one band.
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = 64 // SIMHASH_BANDS
+WORD_REGEX = re.compile(r"\w+")
+
+
+class DedupMode(str, Enum):
+    """
+    OFF: No deduplication
+    SKIP: Duplicate chunks are neither embedded nor stored, they are re-admitted once their canonical chunk is gone
+    LINK: Duplicate chunks are stored with `_duplicate_of` pointing to the data point of the canonical chunk
+    """
+
+    OFF = "off"
+    SKIP = "skip"
+    LINK = "link"
+
+
+class DedupConfig(ConfiguredBaseModel):
+    """
+    Configuration of chunk deduplication, read from the `dedup` key of the data source metadata
+    """
+
+    mode: DedupMode = DedupMode.OFF
+    max_hamming_distance: int = Field(default=3, ge=0, lt=SIMHASH_BANDS)
+    shingle_size: int = Field(default=3, ge=1)
+    # Chunks with fewer shingles are only checked for exact duplicates
+    min_shingles: int = Field(default=8, ge=1)
+
+
+class DedupStats(ConfiguredBaseModel):
+    chunks: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    skipped_characters: int = 0
+    readmitted_chunks: int = 0
+
+    @property
+    def skipped_chunks(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+
+def normalize_text(text: str) -> List[str]:
+    return WORD_REGEX.findall(text.lower())
+
+
+def exact_hash(words: List[str]) -> str:
+    return hashlib.blake2b(" ".join(words).encode(), digest_size=16).hexdigest()
+
+
+def simhash(words: List[str], shingle_size: int) -> int:
+    """
+    64 bit SimHash over word shingles, computed with numpy bit counting
+    """
+    shingles = [
+        " ".join(words[i : i + shingle_size])
+        for i in range(max(len(words) - shingle_size + 1, 1))
+    ]
+    hashes = np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big"
+            )
+            for shingle in shingles
+        ],
+        dtype=">u8",
+    )
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, 64)
+    signature_bits = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(signature_bits).tobytes(), "big")
+
+
+def _bands(signature: int) -> List[Tuple[int, int]]:
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [
+        (band, (signature >> (band * SIMHASH_BAND_BITS)) & mask)
+        for band in range(SIMHASH_BANDS)
+    ]
+
+
+class ChunkDeduplicator:
+    """
+    Detects exact (normalized text hash) and near (SimHash) duplicate chunks against an index
+    of canonical chunks kept per collection in the metadata store. A chunk is never a duplicate
+    of a chunk of its own data point, so re-ingesting a changed data point does not drop its content.
+
+    In SKIP mode the skipped chunks are kept in the index as well: once the data point of their
+    canonical chunk changes or is deleted, they are re-admitted (see `readmit_orphaned_chunks`).
+    Only the entries of the data points touched by a run are written back, so concurrent runs of
+    the same collection do not overwrite each other's entries.
+    """
+
+    def __init__(self, collection_name: str, config: DedupConfig):
+        # Blue / green runs ingest into a shadow collection of the same logical collection
+        self.collection_name = collection_name.split(SHADOW_COLLECTION_SEPARATOR)[0]
+        self.config = config
+        self.stats = DedupStats()
+        # data point fqn -> [(exact hash, simhash or None)] of its canonical chunks
+        self._entries: Dict[str, List[Tuple[str, Optional[int]]]] = {}
+        # data point fqn -> its chunks skipped as duplicates
+        self._skipped: Dict[str, List[SkippedChunk]] = {}
+        # Data points whose entries changed in this run
+        self._dirty: Set[str] = set()
+        self._exact: Dict[str, Set[str]] = defaultdict(set)
+        self._bands: Dict[Tuple[int, int], Set[Tuple[int, str]]] = defaultdict(set)
+
+    async def aload(self, client: BaseMetadataStore):
+        """
+        Load the index from the metadata store. The entries of data points touched by this run
+        are kept, all others are replaced with their stored version.
+        """
+        self._forget(
+            [fqn for fqn in self._indexed_data_point_fqns() if fqn not in self._dirty]
+        )
+        for entry in await client.aget_dedup_index(self.collection_name):
+            if entry.data_point_fqn in self._dirty:
+                continue
+            for chunk_hash, signature in entry.chunks:
+                self._add(entry.data_point_fqn, chunk_hash, signature)
+            if entry.skipped_chunks:
+                self._skipped[entry.data_point_fqn] = entry.skipped_chunks
+
+    async def asave(self, client: BaseMetadataStore):
+        """
+        Write the entries of the data points touched by this run to the metadata store
+        """
+        entries = []
+        deleted_data_point_fqns = []
+        for data_point_fqn in self._dirty:
+            if data_point_fqn in self._entries or data_point_fqn in self._skipped:
+                entries.append(
+                    DedupIndexEntry(
+                        data_point_fqn=data_point_fqn,
+                        chunks=self._entries.get(data_point_fqn, []),
+                        skipped_chunks=self._skipped.get(data_point_fqn, []),
+                    )
+                )
+            else:
+                deleted_data_point_fqns.append(data_point_fqn)
+        await client.aupdate_dedup_index(
+            collection_name=self.collection_name,
+            entries=entries,
+            deleted_data_point_fqns=deleted_data_point_fqns,
+        )
+        self._dirty.clear()
+
+    def _indexed_data_point_fqns(self) -> Set[str]:
+        return set(self._entries) | set(self._skipped)
+
+    def _add(self, data_point_fqn: str, chunk_hash: str, signature: Optional[int]):
+        self._entries.setdefault(data_point_fqn, []).append((chunk_hash, signature))
+        self._exact[chunk_hash].add(data_point_fqn)
+        if signature is not None:
+            for band in _bands(signature):
+                self._bands[band].add((signature, data_point_fqn))
+
+    def _forget(self, data_point_fqns: List[str]):
+        for data_point_fqn in data_point_fqns:
+            self._skipped.pop(data_point_fqn, None)
+            for chunk_hash, signature in self._entries.pop(data_point_fqn, []):
+                self._exact[chunk_hash].discard(data_point_fqn)
+                if not self._exact[chunk_hash]:
+                    del self._exact[chunk_hash]
+                if signature is not None:
+                    for band in _bands(signature):
+                        self._bands[band].discard((signature, data_point_fqn))
+
+    def remove_data_points(self, data_point_fqns: List[str]):
+        """
+        Forget the canonical and skipped chunks of the given data points, e.g. because they are being re-ingested
+        """
+        self._forget(data_point_fqns)
+        self._dirty.update(data_point_fqns)
+
+    def remove_data_source(self, data_source_fqn: str):
+        """
+        Forget all canonical chunks of a data source, used before FULL ingestion replaces all its vectors
+        """
+        prefix = f"{data_source_fqn}{FQN_SEPARATOR}"
+        self.remove_data_points(
+            [fqn for fqn in self._indexed_data_point_fqns() if fqn.startswith(prefix)]
+        )
+
+    def _find_canonical(
+        self, data_point_fqn: str, chunk_hash: str, signature: Optional[int]
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Returns the data point of the canonical chunk, if any, and whether the match is exact
+        """
+        for canonical in self._exact.get(chunk_hash, ()):
+            if canonical != data_point_fqn:
+                return canonical, True
+        if signature is None:
+            return None, False
+        for band in _bands(signature):
+            for candidate, canonical in self._bands.get(band, ()):
+                if (
+                    canonical != data_point_fqn
+                    and bin(candidate ^ signature).count("1")
+                    <= self.config.max_hamming_distance
+                ):
+                    return canonical, False
+        return None, False
+
+    def deduplicate(
+        self, data_point_fqn: str, documents: List[Document]
+    ) -> List[Document]:
+        """
+        Filter (SKIP) or annotate (LINK) duplicate chunks of a data point and register the rest as canonical
+        """
+        # The previous chunks of this data point are being replaced
+        self.remove_data_points([data_point_fqn])
+        deduplicated_documents = []
+        for document in documents:
+            self.stats.chunks += 1
+            words = normalize_text(document.page_content)
+            chunk_hash = exact_hash(words)
+            signature = None
+            if len(words) - self.config.shingle_size + 1 >= self.config.min_shingles:
+                signature = simhash(words, self.config.shingle_size)
+
+            canonical, is_exact = self._find_canonical(
+                data_point_fqn, chunk_hash, signature
+            )
+            if canonical is None:
+                self._add(data_point_fqn, chunk_hash, signature)
+                deduplicated_documents.append(document)
+                continue
+
+            if is_exact:
+                self.stats.exact_duplicates += 1
+            else:
+                self.stats.near_duplicates += 1
+            if self.config.mode == DedupMode.LINK:
+                document.metadata[DUPLICATE_OF_METADATA_KEY] = canonical
+                deduplicated_documents.append(document)
+            else:
+                self.stats.skipped_characters += len(document.page_content)
+                self._skipped.setdefault(data_point_fqn, []).append(
+                    SkippedChunk(
+                        chunk_hash=chunk_hash,
+                        signature=signature,
+                        duplicate_of=canonical,
+                        page_content=document.page_content,
+                        metadata=document.metadata,
+                    )
+                )
+        return deduplicated_documents
+
+    def readmit_orphaned_chunks(self) -> List[Document]:
+        """
+        Return the skipped chunks that no longer duplicate any canonical chunk, because the data
+        point of their canonical chunk changed or was deleted. They become canonical chunks of
+        their own data point and have to be upserted.
+        """
+        readmitted_documents = []
+        for data_point_fqn in list(self._skipped):
+            skipped_chunks = []
+            for skipped_chunk in self._skipped[data_point_fqn]:
+                canonical, _ = self._find_canonical(
+                    data_point_fqn, skipped_chunk.chunk_hash, skipped_chunk.signature
+                )
+                if canonical is not None:
+                    if canonical != skipped_chunk.duplicate_of:
+                        skipped_chunk.duplicate_of = canonical
+                        self._dirty.add(data_point_fqn)
+                    skipped_chunks.append(skipped_chunk)
+                    continue
+                self._add(
+                    data_point_fqn, skipped_chunk.chunk_hash, skipped_chunk.signature
+                )
+                self._dirty.add(data_point_fqn)
+                readmitted_documents.append(
+                    Document(
+                        page_content=skipped_chunk.page_content,
+                        metadata=skipped_chunk.metadata,
+                    )
+                )
+            if skipped_chunks:
+                self._skipped[data_point_fqn] = skipped_chunks
+            else:
+                del self._skipped[data_point_fqn]
+        self.stats.readmitted_chunks += len(readmitted_documents)
+        if readmitted_documents:
+            logger.info(
+                f"Re-admitting {len(readmitted_documents)} chunks whose canonical chunks are gone"
+            )
+        return readmitted_documents
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "dedup_mode": self.config.mode,
+            "dedup_chunks": self.stats.chunks,
+            "dedup_exact_duplicates": self.stats.exact_duplicates,
+            "dedup_near_duplicates": self.stats.near_duplicates,
+        }
+        if self.config.mode == DedupMode.SKIP:
+            stats.update(
+                {
+                    "dedup_skipped_chunks": self.stats.skipped_chunks,
+                    "dedup_skipped_characters": self.stats.skipped_characters,
+                    "dedup_readmitted_chunks": self.stats.readmitted_chunks,
+                }
+            )
+        return stats
+
+
+async def get_deduplicator(
+    client: BaseMetadataStore,
+    collection_name: str,
+    dedup_config: Optional[Dict[str, Any]],
+) -> Optional[ChunkDeduplicator]:
+    config = DedupConfig.model_validate(dedup_config or {})
+    if config.mode == DedupMode.OFF:
+        return None
+    deduplicator = ChunkDeduplicator(collection_name, config)
+    await deduplicator.aload(client)
+    return deduplicator
@@ -1,5 +1,6 @@
-import tempfile
+import asyncio
 from concurrent.futures import Executor
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional
 
 from fastapi import HTTPException
@@ -8,13 +9,19 @@ from langchain.docstore.document import Document
 from truefoundry.deploy import trigger_job
 
 from backend.constants import (
+    DATA_INGESTION_RUN_LEASE_SECONDS,
+    DATA_INGESTION_RUN_NAME_METADATA_KEY,
     DATA_POINT_FILE_PATH_METADATA_KEY,
     DATA_POINT_FQN_METADATA_KEY,
     DATA_POINT_HASH_METADATA_KEY,
+    DATA_SOURCE_FQN_METADATA_KEY,
 )
+from backend.indexer.dedup import ChunkDeduplicator, get_deduplicator
 from backend.indexer.types import DataIngestionConfig
+from backend.indexer.workspace import IngestionWorkspace
 from backend.logger import logger
 from backend.modules.dataloaders.loader import get_loader_for_data_source
+from backend.modules.metadata_store.base import BaseMetadataStore
 from backend.modules.metadata_store.client import get_client
 from backend.modules.model_gateway.model_gateway import model_gateway
 from backend.modules.parsers.parser import get_parser_for_extension_with_cache
@@ -51,6 +58,10 @@ async def sync_data_source_to_collection(inputs: DataIngestionConfig):
     7. If the data ingestion mode is set to FULL, deletes the outdated data point vectors from the vector store.
     8. Updates the data ingestion run status to indicate the completion of data cleanup.
 
+    If the data ingestion mode is set to BLUE_GREEN, the data source is rebuilt into a shadow collection instead
+    (see `_blue_green_sync_data_source_to_collection`). Blue/green runs never run concurrently with other runs
+    of the collection (see `_data_ingestion_run_lease`).
+
     Args:
         inputs (DataIngestionConfig): The configuration for data ingestion.
 
@@ -60,23 +71,121 @@ async def sync_data_source_to_collection(inputs: DataIngestionConfig):
     Returns:
         None
     """
+    if inputs.data_ingestion_mode == DataIngestionMode.BLUE_GREEN and (
+        not VECTOR_STORE_CLIENT.supports_blue_green_reindex(inputs.collection_name)
+    ):
+        logger.warning(
+            f"Vector db cannot swap collection {inputs.collection_name}, falling back to FULL ingestion"
+        )
+        inputs = inputs.model_copy(
+            update={"data_ingestion_mode": DataIngestionMode.FULL}
+        )
+
+    async with _data_ingestion_run_lease(inputs):
+        if inputs.data_ingestion_mode == DataIngestionMode.BLUE_GREEN:
+            await _blue_green_sync_data_source_to_collection(inputs=inputs)
+        else:
+            await _in_place_sync_data_source_to_collection(inputs=inputs)
+
+
+@asynccontextmanager
+async def _data_ingestion_run_lease(inputs: DataIngestionConfig):
+    """
+    Holds the lease of the data ingestion run while it is in progress.
+
+    A blue/green run copies the vectors of the other data sources when it starts, anything
+    other runs write to the collection afterwards would be dropped by the swap. So a
+    blue/green run is rejected if any other run of the collection holds a lease, and any
+    run is rejected while a blue/green run of the collection holds one. Both runs register
+    their lease before looking at the others, so two runs starting together cannot both
+    go ahead.
+    """
+    client = await get_client()
+    await client.arenew_data_ingestion_run_lease(
+        data_ingestion_run_name=inputs.data_ingestion_run_name,
+        lease_seconds=DATA_INGESTION_RUN_LEASE_SECONDS,
+    )
+
+    async def renew_lease():
+        while True:
+            await asyncio.sleep(DATA_INGESTION_RUN_LEASE_SECONDS / 10)
+            try:
+                await client.arenew_data_ingestion_run_lease(
+                    data_ingestion_run_name=inputs.data_ingestion_run_name,
+                    lease_seconds=DATA_INGESTION_RUN_LEASE_SECONDS,
+                )
+            except Exception as e:
+                logger.exception(f"Failed to renew data ingestion run lease: {e}")
+
+    renew_lease_task = None
+    try:
+        blue_green = inputs.data_ingestion_mode == DataIngestionMode.BLUE_GREEN
+        conflicting_run_names = [
+            data_ingestion_run.name
+            for data_ingestion_run in await client.aget_leased_data_ingestion_runs(
+                collection_name=inputs.collection_name
+            )
+            if data_ingestion_run.name != inputs.data_ingestion_run_name
+            and (
+                blue_green
+                or data_ingestion_run.data_ingestion_mode
+                == DataIngestionMode.BLUE_GREEN
+            )
+        ]
+        if conflicting_run_names:
+            await client.aupdate_data_ingestion_run_status(
+                data_ingestion_run_name=inputs.data_ingestion_run_name,
+                status=DataIngestionRunStatus.ERROR,
+            )
+            raise Exception(
+                f"Collection {inputs.collection_name} is being ingested by {conflicting_run_names}, "
+                "blue/green runs cannot run concurrently with other runs of the collection"
+            )
+        renew_lease_task = asyncio.create_task(renew_lease())
+        yield
+    finally:
+        if renew_lease_task:
+            renew_lease_task.cancel()
+        try:
+            await client.arenew_data_ingestion_run_lease(
+                data_ingestion_run_name=inputs.data_ingestion_run_name,
+                lease_seconds=None,
+            )
+        except Exception as e:
+            # The lease expires on its own, do not replace the error of the run
+            logger.exception(f"Failed to release data ingestion run lease: {e}")
+
+
+async def _in_place_sync_data_source_to_collection(inputs: DataIngestionConfig):
+    """
+    Synchronizes the data source to the collection it is served from, see
+    `sync_data_source_to_collection`
+    """
+    # FULL ingestion re-ingests every data point, so if the vector db can delete by filter
+    # the old vectors are cleaned up with a single filter and do not need to be listed at all
+    use_filtered_cleanup = (
+        inputs.data_ingestion_mode == DataIngestionMode.FULL
+        and VECTOR_STORE_CLIENT.supports_filtered_deletes()
+    )
+
     client = await get_client()
     await client.aupdate_data_ingestion_run_status(
         data_ingestion_run_name=inputs.data_ingestion_run_name,
         status=DataIngestionRunStatus.FETCHING_EXISTING_VECTORS,
     )
     try:
-        existing_data_point_vectors = VECTOR_STORE_CLIENT.list_data_point_vectors(
-            collection_name=inputs.collection_name,
-            data_source_fqn=inputs.data_source.fqn,
-        )
+        existing_data_point_vectors = []
+        if not use_filtered_cleanup:
+            existing_data_point_vectors = VECTOR_STORE_CLIENT.list_data_point_vectors(
+                collection_name=inputs.collection_name,
+                data_source_fqn=inputs.data_source.fqn,
+            )
+            logger.info(
+                f"Total existing data point vectors in collection {inputs.collection_name}: {len(existing_data_point_vectors)}"
+            )
         previous_snapshot = get_data_point_fqn_to_hash_map(
             data_point_vectors=existing_data_point_vectors
         )
-
-        logger.info(
-            f"Total existing data point vectors in collection {inputs.collection_name}: {len(existing_data_point_vectors)}"
-        )
     except Exception as e:
         logger.exception(e)
         await client.aupdate_data_ingestion_run_status(
@@ -112,10 +221,17 @@ async def sync_data_source_to_collection(inputs: DataIngestionConfig):
             status=DataIngestionRunStatus.DATA_CLEANUP_STARTED,
         )
         try:
-            VECTOR_STORE_CLIENT.delete_data_point_vectors(
-                collection_name=inputs.collection_name,
-                data_point_vectors=existing_data_point_vectors,
-            )
+            if use_filtered_cleanup:
+                VECTOR_STORE_CLIENT.delete_data_source_vectors(
+                    collection_name=inputs.collection_name,
+                    data_source_fqn=inputs.data_source.fqn,
+                    exclude_data_ingestion_run_name=inputs.data_ingestion_run_name,
+                )
+            else:
+                VECTOR_STORE_CLIENT.delete_data_point_vectors(
+                    collection_name=inputs.collection_name,
+                    data_point_vectors=existing_data_point_vectors,
+                )
         except Exception as e:
             logger.exception(e)
             await client.aupdate_data_ingestion_run_status(
@@ -129,6 +245,106 @@ async def sync_data_source_to_collection(inputs: DataIngestionConfig):
     )
 
 
+async def _blue_green_sync_data_source_to_collection(inputs: DataIngestionConfig):
+    """
+    Rebuilds the data source into a shadow collection and swaps it in once ingestion completes:
+    1. Creates a shadow collection and copies the vectors of all other data sources into it.
+    2. Ingests the data source into the shadow collection from scratch.
+    3. Atomically swaps the shadow collection in place of the current collection.
+    4. Drops the swapped out collection in the background.
+
+    Searches keep hitting the current collection until the swap, so they never see duplicates.
+    If anything fails before the swap, the shadow collection is dropped and the current collection is left untouched.
+
+    Args:
+        inputs (DataIngestionConfig): The configuration for data ingestion.
+
+    Returns:
+        None
+    """
+    client = await get_client()
+    await client.aupdate_data_ingestion_run_status(
+        data_ingestion_run_name=inputs.data_ingestion_run_name,
+        status=DataIngestionRunStatus.FETCHING_EXISTING_VECTORS,
+    )
+    shadow_collection_name = None
+    try:
+        shadow_collection_name = VECTOR_STORE_CLIENT.create_shadow_collection(
+            collection_name=inputs.collection_name,
+            embeddings=model_gateway.get_embedder_from_embedder_config(
+                inputs.embedder_config
+            ),
+            vector_dtype=inputs.embedder_config.vector_dtype,
+        )
+        # Off the event loop, the lease of the run keeps being renewed during the copy
+        copied_vectors_count = await asyncio.to_thread(
+            VECTOR_STORE_CLIENT.copy_data_point_vectors,
+            source_collection_name=inputs.collection_name,
+            target_collection_name=shadow_collection_name,
+            exclude_data_source_fqn=inputs.data_source.fqn,
+        )
+        logger.info(
+            f"Copied {copied_vectors_count} vectors of other data sources from {inputs.collection_name} to {shadow_collection_name}"
+        )
+    except Exception as e:
+        logger.exception(e)
+        _drop_physical_collection_quietly(shadow_collection_name)
+        await client.aupdate_data_ingestion_run_status(
+            data_ingestion_run_name=inputs.data_ingestion_run_name,
+            status=DataIngestionRunStatus.FETCHING_EXISTING_VECTORS_FAILED,
+        )
+        raise e
+
+    await client.aupdate_data_ingestion_run_status(
+        data_ingestion_run_name=inputs.data_ingestion_run_name,
+        status=DataIngestionRunStatus.DATA_INGESTION_STARTED,
+    )
+    try:
+        await _sync_data_source_to_collection(
+            inputs=inputs.model_copy(
+                update={"collection_name": shadow_collection_name}
+            ),
+            previous_snapshot={},
+        )
+        previous_collection_name = VECTOR_STORE_CLIENT.swap_collection(
+            collection_name=inputs.collection_name,
+            shadow_collection_name=shadow_collection_name,
+        )
+    except Exception as e:
+        logger.exception(e)
+        _drop_physical_collection_quietly(shadow_collection_name)
+        await client.aupdate_data_ingestion_run_status(
+            data_ingestion_run_name=inputs.data_ingestion_run_name,
+            status=DataIngestionRunStatus.DATA_INGESTION_FAILED,
+        )
+        raise e
+    await client.aupdate_data_ingestion_run_status(
+        data_ingestion_run_name=inputs.data_ingestion_run_name,
+        status=DataIngestionRunStatus.DATA_INGESTION_COMPLETED,
+    )
+
+    # The old collection is no longer served, drop it without holding up the run
+    if previous_collection_name:
+        asyncio.get_running_loop().run_in_executor(
+            None, _drop_physical_collection_quietly, previous_collection_name
+        )
+    await client.aupdate_data_ingestion_run_status(
+        data_ingestion_run_name=inputs.data_ingestion_run_name,
+        status=DataIngestionRunStatus.COMPLETED,
+    )
+
+
+def _drop_physical_collection_quietly(physical_collection_name: Optional[str]):
+    if not physical_collection_name:
+        return
+    try:
+        VECTOR_STORE_CLIENT.drop_physical_collection(physical_collection_name)
+    except Exception as e:
+        logger.exception(
+            f"Failed to drop physical collection {physical_collection_name}: {e}"
+        )
+
+
 async def _sync_data_source_to_collection(
     inputs: DataIngestionConfig, previous_snapshot: Dict[str, str] = None
 ):
@@ -149,37 +365,108 @@ async def _sync_data_source_to_collection(
     client = await get_client()
 
     failed_data_point_fqns = []
+    # Data points ingested without any chunk, e.g. all their chunks were skipped as duplicates
+    empty_data_point_fqns = []
     documents_ingested_count = 0
-    # Create a temp dir to store the data
-    with tempfile.TemporaryDirectory() as tmp_dirname:
+    # Chunks that duplicate chunks already in the collection are skipped or linked, see `DedupConfig`
+    deduplicator = await get_deduplicator(
+        client, inputs.collection_name, (inputs.data_source.metadata or {}).get("dedup")
+    )
+    if deduplicator and inputs.data_ingestion_mode in (
+        DataIngestionMode.FULL,
+        DataIngestionMode.BLUE_GREEN,
+    ):
+        # All vectors of the data source are replaced, including those of deleted data points
+        deduplicator.remove_data_source(inputs.data_source.fqn)
+    # Create a workspace to store the data, files are evicted as soon as their batch is ingested
+    with IngestionWorkspace(
+        disk_budget_bytes=settings.INGESTION_WORKSPACE_DISK_BUDGET_MB * 1024 * 1024
+    ) as workspace:
         # Load the data from the source to the dest dir
         logger.info("Loading data from data source")
         data_source_loader = get_loader_for_data_source(inputs.data_source.type)
         loaded_data_points_batch_iterator = data_source_loader.load_filtered_data(
             data_source=inputs.data_source,
-            dest_dir=tmp_dirname,
+            dest_dir=workspace.path,
             previous_snapshot=previous_snapshot,
             batch_size=inputs.batch_size,
             data_ingestion_mode=inputs.data_ingestion_mode,
         )
 
-        async for loaded_data_points_batch in loaded_data_points_batch_iterator:
+        # The next batch is loaded while the current one is being ingested,
+        # the loader is paused whenever the workspace is over its disk budget
+        loaded_batches = asyncio.Queue(maxsize=1)
+
+        async def _load_batches():
             try:
-                await ingest_data_points(
-                    inputs=inputs,
-                    loaded_data_points=loaded_data_points_batch,
-                    documents_ingested_count=documents_ingested_count,
-                )
-                documents_ingested_count = documents_ingested_count + len(
-                    loaded_data_points_batch
-                )
+                async for loaded_data_points_batch in loaded_data_points_batch_iterator:
+                    await workspace.track(loaded_data_points_batch)
+                    await loaded_batches.put(loaded_data_points_batch)
+                    await workspace.wait_for_capacity()
+                await workspace.sweep()
             except Exception as e:
-                logger.exception(e)
-                if inputs.raise_error_on_failure:
-                    raise e
-                failed_data_point_fqns.extend(
-                    [doc.data_point_fqn for doc in loaded_data_points_batch]
+                await loaded_batches.put(e)
+                return
+            await loaded_batches.put(None)
+
+        loader_task = asyncio.create_task(_load_batches())
+        try:
+            while (loaded_data_points_batch := await loaded_batches.get()) is not None:
+                if isinstance(loaded_data_points_batch, Exception):
+                    raise loaded_data_points_batch
+                try:
+                    empty_data_point_fqns.extend(
+                        await ingest_data_points(
+                            inputs=inputs,
+                            loaded_data_points=loaded_data_points_batch,
+                            documents_ingested_count=documents_ingested_count,
+                            deduplicator=deduplicator,
+                        )
+                    )
+                    documents_ingested_count = documents_ingested_count + len(
+                        loaded_data_points_batch
+                    )
+                except Exception as e:
+                    logger.exception(e)
+                    if inputs.raise_error_on_failure:
+                        raise e
+                    failed_data_point_fqns.extend(
+                        [doc.data_point_fqn for doc in loaded_data_points_batch]
+                    )
+                    if deduplicator:
+                        # Chunks of a failed batch are not in the collection and cannot be canonical
+                        deduplicator.remove_data_points(
+                            [doc.data_point_fqn for doc in loaded_data_points_batch]
+                        )
+                finally:
+                    await workspace.evict(loaded_data_points_batch)
+                if deduplicator:
+                    # Persisted batch by batch, the index matches the vectors written so far
+                    await deduplicator.asave(client)
+
+            if (
+                empty_data_point_fqns
+                and inputs.data_ingestion_mode == DataIngestionMode.INCREMENTAL
+            ):
+                _delete_data_point_vectors_by_fqn(inputs, empty_data_point_fqns)
+            if deduplicator and not failed_data_point_fqns:
+                await _readmit_orphaned_chunks(inputs, deduplicator, client)
+                await deduplicator.asave(client)
+        finally:
+            loader_task.cancel()
+            await asyncio.gather(loader_task, return_exceptions=True)
+            run_stats = workspace.get_stats()
+            if deduplicator:
+                run_stats.update(deduplicator.get_stats())
+            logger.info(f"Ingestion run stats: {run_stats}")
+            # Stats are best effort, they must not replace the error of a failed run
+            try:
+                await client.alog_stats_for_data_ingestion_run(
+                    data_ingestion_run_name=inputs.data_ingestion_run_name,
+                    stats=run_stats,
                 )
+            except Exception as e:
+                logger.warning(f"Failed to log ingestion run stats: {e}")
 
         if len(failed_data_point_fqns) > 0:
             logger.error(
@@ -195,11 +482,64 @@ async def _sync_data_source_to_collection(
             )
 
 
+def _delete_data_point_vectors_by_fqn(
+    inputs: DataIngestionConfig, data_point_fqns: List[str]
+):
+    """
+    Delete the previous vectors of data points that were ingested without any chunk. Incremental
+    upserts only replace the versions of the data points they write, these would be kept forever.
+    """
+    data_point_fqns = set(data_point_fqns)
+    data_point_vectors = [
+        data_point_vector
+        for data_point_vector in VECTOR_STORE_CLIENT.list_data_point_vectors(
+            collection_name=inputs.collection_name,
+            data_source_fqn=inputs.data_source.fqn,
+        )
+        if data_point_vector.data_point_fqn in data_point_fqns
+    ]
+    if not data_point_vectors:
+        return
+    logger.info(
+        f"Deleting {len(data_point_vectors)} vectors of {len(data_point_fqns)} data points without chunks"
+    )
+    VECTOR_STORE_CLIENT.delete_data_point_vectors(
+        collection_name=inputs.collection_name,
+        data_point_vectors=data_point_vectors,
+    )
+
+
+async def _readmit_orphaned_chunks(
+    inputs: DataIngestionConfig,
+    deduplicator: ChunkDeduplicator,
+    client: BaseMetadataStore,
+):
+    """
+    Upsert the skipped chunks whose canonical chunks were changed or deleted by this run,
+    possibly by a concurrent run, so their content is not lost
+    """
+    # Pick up the entries written by concurrent runs since the index was loaded
+    await deduplicator.aload(client)
+    documents = deduplicator.readmit_orphaned_chunks()
+    if not documents:
+        return
+    VECTOR_STORE_CLIENT.upsert_documents(
+        collection_name=inputs.collection_name,
+        documents=documents,
+        embeddings=model_gateway.get_embedder_from_embedder_config(
+            inputs.embedder_config
+        ),
+        # The other chunks of their data points are unchanged and must be kept
+        incremental=False,
+    )
+
+
 async def ingest_data_points(
     inputs: DataIngestionConfig,
     loaded_data_points: List[LoadedDataPoint],
     documents_ingested_count: int,
-):
+    deduplicator: Optional[ChunkDeduplicator] = None,
+) -> List[str]:
     """
     Ingests data points into the vector store for a given batch.
 
@@ -207,51 +547,72 @@ async def ingest_data_points(
         inputs (DataIngestionConfig): Configuration for data ingestion.
         loaded_data_points (List[LoadedDataPoint]): List of loaded data points to be ingested.
         documents_ingested_count (int): Current count of ingested documents.
+        deduplicator (Optional[ChunkDeduplicator]): Filters duplicate chunks before they are embedded.
 
     Returns:
-        None
+        List[str]: FQNs of the data points without any chunk to upsert.
     """
     # Calculate embeddings for the data points
-    embeddings = model_gateway.get_embedder_from_model_config(
-        inputs.embedder_config.name
-    )
+    embeddings = model_gateway.get_embedder_from_embedder_config(inputs.embedder_config)
     documents_to_be_upserted = []
     logger.info(
         f"Processing {len(loaded_data_points)} new documents. Total ingested: {documents_ingested_count}"
     )
 
     parser_cache = {}
+    # Data points of a batch are parsed concurrently, e.g. WebParser crawls several pages at once
+    parse_semaphore = asyncio.Semaphore(settings.PARSER_CONCURRENCY)
 
-    for index, data_point in enumerate(loaded_data_points, start=1):
-        logger.info(f"Parsing document {index}/{len(loaded_data_points)}")
+    async def _parse_data_point(index: int, data_point: LoadedDataPoint):
+        async with parse_semaphore:
+            logger.info(f"Parsing document {index}/{len(loaded_data_points)}")
 
-        # Get the parser for the data point extension
-        parser = get_parser_for_extension_with_cache(
-            data_point.file_extension, inputs.parser_config, parser_cache
-        )
-        if not parser:
-            logger.warning(
-                f"No parser found for {data_point.data_point_fqn} with extension: {data_point.file_extension}"
+            # Get the parser for the data point extension
+            parser = get_parser_for_extension_with_cache(
+                data_point.file_extension, inputs.parser_config, parser_cache
             )
-            continue
+            if not parser:
+                logger.warning(
+                    f"No parser found for {data_point.data_point_fqn} with extension: {data_point.file_extension}"
+                )
+                return []
 
-        # For the current data point, get the chunks by parser
-        chunks = await parser.get_chunks(data_point.local_filepath, data_point.metadata)
+            # For the current data point, get the chunks by parser
+            chunks = await parser.get_chunks(
+                data_point.local_filepath,
+                data_point.metadata,
+                data_point_hash=data_point.data_point_hash,
+            )
+            logger.info(f"{data_point.local_filepath} -> {len(chunks)} chunks")
 
-        # Enrich the chunk with data point metadata
-        documents_to_be_upserted.extend(
-            [
-                enrich_chunk_with_data_point_metadata(chunk, data_point)
+            # Enrich the chunk with data point metadata
+            return [
+                enrich_chunk_with_data_point_metadata(
+                    chunk, data_point, inputs.data_ingestion_run_name
+                )
                 for chunk in chunks
             ]
-        )
 
-        logger.info(f"{data_point.local_filepath} -> {len(chunks)} chunks")
+    # gather keeps the documents in the order of the data points
+    parsed_documents = await asyncio.gather(
+        *[
+            _parse_data_point(index, data_point)
+            for index, data_point in enumerate(loaded_data_points, start=1)
+        ]
+    )
+    empty_data_point_fqns = []
+    for data_point, documents in zip(loaded_data_points, parsed_documents):
+        # Deduplicate in data point order so that the first occurrence of a chunk is the canonical one
+        if deduplicator:
+            documents = deduplicator.deduplicate(data_point.data_point_fqn, documents)
+        if not documents:
+            empty_data_point_fqns.append(data_point.data_point_fqn)
+        documents_to_be_upserted.extend(documents)
 
     # If there are no documents to be upserted, log a warning and return
     if not documents_to_be_upserted:
         logger.warning("No documents to index in this batch.")
-        return
+        return empty_data_point_fqns
     # Ingest the documents to the vector store
     logger.info(f"Upserting {len(documents_to_be_upserted)} documents to vector store")
     VECTOR_STORE_CLIENT.upsert_documents(
@@ -260,9 +621,12 @@ async def ingest_data_points(
         embeddings=embeddings,
         incremental=inputs.data_ingestion_mode == DataIngestionMode.INCREMENTAL,
     )
+    return empty_data_point_fqns
 
 
-def enrich_chunk_with_data_point_metadata(chunk: Document, data_point: LoadedDataPoint):
+def enrich_chunk_with_data_point_metadata(
+    chunk: Document, data_point: LoadedDataPoint, data_ingestion_run_name: str
+):
     # Add the data point metadata to the chunk metadata
     chunk.metadata.update(data_point.metadata or {})
     # Add the data point fqn and hash to the chunk metadata
@@ -272,7 +636,9 @@ def enrich_chunk_with_data_point_metadata(chunk: Document, data_point: LoadedDat
             DATA_POINT_FQN_METADATA_KEY: data_point.data_point_fqn,
             DATA_POINT_HASH_METADATA_KEY: data_point.data_point_hash,
             DATA_POINT_FILE_PATH_METADATA_KEY: data_point.local_filepath,
-            "_data_source_fqn": data_point.data_source_fqn,
+            DATA_SOURCE_FQN_METADATA_KEY: data_point.data_source_fqn,
+            # Lets FULL ingestion clean up vectors of previous runs with a single filter
+            DATA_INGESTION_RUN_NAME_METADATA_KEY: data_ingestion_run_name,
         }
     )
 
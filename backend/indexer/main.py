@@ -3,6 +3,7 @@ import asyncio
 from backend.indexer.argument_parser import parse_args_ingest_total_collection
 from backend.indexer.indexer import ingest_data
 from backend.logger import logger
+from backend.modules.parsers.web_parser import close_browser_pools
 from backend.types import DataIngestionMode, IngestDataToCollectionDto
 
 
@@ -21,6 +22,8 @@ async def main():
     except Exception as e:
         logger.exception(e)
         exit(1)
+    finally:
+        await close_browser_pools()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from backend.logger import logger
+from backend.types import LoadedDataPoint
+
+
+class IngestionWorkspace:
+    """
+    Temporary directory the loader writes data points to during an ingestion run.
+
+    Tracks the files of every loaded data point that lives in the workspace, evicts them as soon as
+    their batch has been upserted and applies backpressure to the loader once `disk_budget_bytes`
+    is reached. Usage is measured on disk, so files the loader writes without yielding them (bulk
+    downloads, archives, unchanged files) count as well, they are swept once the loader is exhausted.
+    Files outside the workspace (e.g. the source files of a local directory) are never tracked or
+    deleted.
+
+    Use as a context manager:
+        with IngestionWorkspace(disk_budget_bytes) as workspace:
+            loader.load_filtered_data(..., dest_dir=workspace.path, ...)
+    """
+
+    def __init__(self, disk_budget_bytes: Optional[int] = None):
+        # None or 0 means unbounded
+        self.disk_budget_bytes = disk_budget_bytes or None
+        self.path: Optional[str] = None
+        self.usage_bytes = 0
+        self.peak_usage_bytes = 0
+        self.evicted_bytes = 0
+        self.backpressure_waits = 0
+        self._tracked: Dict[str, int] = {}
+        self._capacity = asyncio.Condition()
+
+    def __enter__(self) -> "IngestionWorkspace":
+        self.path = tempfile.mkdtemp()
+        return self
+
+    def __exit__(self, *exc):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _owns(self, filepath: str) -> bool:
+        return os.path.abspath(filepath).startswith(os.path.join(self.path, ""))
+
+    def _disk_usage(self) -> int:
+        usage = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                try:
+                    usage += os.lstat(os.path.join(dirpath, filename)).st_size
+                except OSError:
+                    continue
+        return usage
+
+    async def _refresh_usage(self):
+        self.usage_bytes = await asyncio.to_thread(self._disk_usage)
+        self.peak_usage_bytes = max(self.peak_usage_bytes, self.usage_bytes)
+
+    async def track(self, loaded_data_points: List[LoadedDataPoint]):
+        """
+        Account for the files of a freshly loaded batch
+        """
+        for data_point in loaded_data_points:
+            filepath = os.path.abspath(data_point.local_filepath)
+            if filepath in self._tracked or not self._owns(filepath):
+                continue
+            try:
+                size = os.path.getsize(filepath)
+            except OSError:
+                continue
+            self._tracked[filepath] = size
+        await self._refresh_usage()
+
+    async def evict(self, loaded_data_points: List[LoadedDataPoint]):
+        """
+        Delete the files of a batch that has been ingested and release their bytes
+        """
+        for data_point in loaded_data_points:
+            filepath = os.path.abspath(data_point.local_filepath)
+            size = self._tracked.pop(filepath, None)
+            if size is None:
+                continue
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to evict {filepath}: {e}")
+            self.evicted_bytes += size
+        await self._refresh_usage()
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    def _remove_untracked(self) -> int:
+        removed_bytes = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                filepath = os.path.join(dirpath, filename)
+                if filepath in self._tracked:
+                    continue
+                try:
+                    size = os.lstat(filepath).st_size
+                    os.remove(filepath)
+                except OSError as e:
+                    logger.warning(f"Failed to evict {filepath}: {e}")
+                    continue
+                removed_bytes += size
+        return removed_bytes
+
+    async def sweep(self):
+        """
+        Delete the files the loader left in the workspace outside of any batch, once the loader is
+        exhausted none of them will be ingested
+        """
+        self.evicted_bytes += await asyncio.to_thread(self._remove_untracked)
+        await self._refresh_usage()
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    def _has_capacity(self) -> bool:
+        # Always let the loader proceed when nothing is in flight, a single batch may exceed the budget
+        return (
+            self.disk_budget_bytes is None
+            or not self._tracked
+            or self.usage_bytes < self.disk_budget_bytes
+        )
+
+    async def wait_for_capacity(self):
+        """
+        Block until the workspace is below its disk budget
+        """
+        if self._has_capacity():
+            return
+        self.backpressure_waits += 1
+        logger.debug(
+            f"Workspace at {self.usage_bytes} bytes, waiting for eviction below {self.disk_budget_bytes} bytes"
+        )
+        async with self._capacity:
+            await self._capacity.wait_for(self._has_capacity)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workspace_peak_usage_bytes": self.peak_usage_bytes,
+            "workspace_evicted_bytes": self.evicted_bytes,
+            "workspace_disk_budget_bytes": self.disk_budget_bytes,
+            "workspace_backpressure_waits": self.backpressure_waits,
+        }
@@ -0,0 +1,160 @@
+# This script measures the CPU spent encoding answer streams as server sent events, with the
+# previous per token pydantic serialization and with `SSEEncoder`
+"""
+How to run:
+
+python -m backend.migration.benchmark_sse_encoder \
+--num_streams 200 \
+--num_tokens 400 \
+--num_docs 10 \
+--token_interval_ms 5
+
+Every stream sends one docs event followed by `--num_tokens` answer tokens, tokens arrive every
+`--token_interval_ms` like they would from a model server. All streams run concurrently on one
+event loop and are drained by a consumer standing in for the ASGI server (one send per chunk).
+Reported: CPU seconds of the process, chunks sent and bytes sent.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List
+
+from langchain.docstore.document import Document
+
+from backend.constants import DATA_POINT_FQN_METADATA_KEY, DATA_POINT_HASH_METADATA_KEY
+from backend.modules.query_controllers.base import BaseQueryController
+from backend.modules.query_controllers.sse import SSEEncoder
+from backend.modules.query_controllers.types import Answer, Docs
+
+
+def make_docs(num_docs: int) -> List[Document]:
+    return [
+        Document(
+            page_content="Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+            * 20,
+            metadata={
+                "_id": f"doc-{i}",
+                DATA_POINT_FQN_METADATA_KEY: f"localdir::/data/file-{i}.pdf",
+                DATA_POINT_HASH_METADATA_KEY: "0" * 32,
+                "_data_source_fqn": "localdir::/data",
+                "filename": f"file-{i}.pdf",
+                "collection_name": "benchmark",
+                "page_number": i,
+                "relevance_score": 1 / (i + 1),
+                # Not part of `required_metadata`, dropped from the stream
+                "chunk_hash": "0" * 64,
+                "parser": "PdfParserFast",
+            },
+        )
+        for i in range(num_docs)
+    ]
+
+
+async def answer_stream(
+    docs: List[Document], num_tokens: int, token_interval: float, enrich: bool
+) -> AsyncIterator:
+    controller = BaseQueryController()
+    if enrich:
+        yield Docs(content=controller._enrich_context_for_stream_response(docs))
+    else:
+        yield Docs.model_construct(content=docs)
+    for i in range(num_tokens):
+        if token_interval:
+            await asyncio.sleep(token_interval)
+        yield Answer(content=f" token{i}")
+
+
+async def legacy_sse_wrap(gen) -> AsyncIterator[str]:
+    async for data in gen:
+        yield "event: data\n"
+        yield f"data: {data.model_dump_json()}\n\n"
+    yield "event: end\n"
+
+
+async def drain(chunks) -> Dict[str, int]:
+    sent = {"chunks": 0, "bytes": 0}
+    async for chunk in chunks:
+        sent["chunks"] += 1
+        sent["bytes"] += len(chunk)
+        # Every chunk is one ASGI send, yield to the loop like a socket write would
+        await asyncio.sleep(0)
+    return sent
+
+
+async def run(args: argparse.Namespace, mode: str) -> Dict[str, float]:
+    docs = make_docs(args.num_docs)
+    token_interval = args.token_interval_ms / 1000
+    streams = []
+    for _ in range(args.num_streams):
+        if mode == "legacy":
+            chunks = legacy_sse_wrap(
+                answer_stream(docs, args.num_tokens, token_interval, enrich=True)
+            )
+        else:
+            encoder = SSEEncoder(
+                required_metadata=BaseQueryController.required_metadata,
+                coalesce_window_ms=args.coalesce_window_ms,
+                coalesce_max_chars=args.coalesce_max_chars,
+                gzip=mode == "encoder+gzip",
+            )
+            chunks = encoder.stream(
+                answer_stream(docs, args.num_tokens, token_interval, enrich=False)
+            )
+        streams.append(drain(chunks))
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    results = await asyncio.gather(*streams)
+    return {
+        "mode": mode,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "wall_seconds": time.perf_counter() - wall_start,
+        "chunks": sum(result["chunks"] for result in results),
+        "bytes": sum(result["bytes"] for result in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SSE encoding")
+    parser.add_argument(
+        "--num_streams", type=int, help="Concurrent streams", default=200
+    )
+    parser.add_argument(
+        "--num_tokens", type=int, help="Answer tokens per stream", default=400
+    )
+    parser.add_argument(
+        "--num_docs", type=int, help="Documents of the docs event", default=10
+    )
+    parser.add_argument(
+        "--token_interval_ms",
+        type=float,
+        help="Delay between two tokens of a stream",
+        default=5.0,
+    )
+    parser.add_argument(
+        "--coalesce_window_ms", type=float, help="Coalescing window", default=20.0
+    )
+    parser.add_argument(
+        "--coalesce_max_chars", type=int, help="Coalescing size", default=64
+    )
+    args = parser.parse_args()
+
+    rows = [
+        asyncio.run(run(args, mode)) for mode in ("legacy", "encoder", "encoder+gzip")
+    ]
+    header = list(rows[0].keys())
+    print(" | ".join(header))
+    for row in rows:
+        print(
+            " | ".join(
+                f"{value:.4f}" if isinstance(value, float) else str(value)
+                for value in row.values()
+            )
+        )
+    saved = 1 - rows[1]["cpu_seconds"] / rows[0]["cpu_seconds"]
+    print(f"CPU saved by the encoder: {saved:.1%}")
+
+
+if __name__ == "__main__":
+    main()
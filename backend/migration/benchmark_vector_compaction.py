@@ -0,0 +1,242 @@
+# This script measures the recall / latency / memory trade-off of compact vector storage
+# (Matryoshka dimension truncation and float16 / uint8 storage) on a sample of a qdrant collection
+"""
+How to run:
+
+python -m backend.migration.benchmark_vector_compaction \
+--qdrant_url http://localhost:6333 \
+--collection_name creditcard \
+--dimensions 3072 1536 768 256 \
+--sample_size 20000 \
+--num_queries 200 \
+--top_k 10
+
+The collection has to be indexed with full dimension float32 vectors, they are the ground truth.
+Queries are sampled from the stored vectors and are excluded from the results. Brute force search
+with numpy is used for every configuration so that only the effect of the vectors is measured.
+uint8 mirrors qdrant scalar quantization: int8 search with the quantile clipped range, then
+rescoring of `--oversampling` x top_k candidates with the (truncated) float32 vectors.
+"""
+
+import argparse
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from backend.logger import logger
+from backend.types import VectorDataType
+
+
+def fetch_vectors(
+    client: QdrantClient, collection_name: str, sample_size: int, batch_size: int
+) -> np.ndarray:
+    vectors = []
+    offset = None
+    while len(vectors) < sample_size:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=min(batch_size, sample_size - len(vectors)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=True,
+        )
+        vectors.extend(record.vector for record in records)
+        if offset is None:
+            break
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    truncated = vectors[:, :dimensions]
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
+
+
+def top_k_excluding_self(
+    scores: np.ndarray, query_ids: np.ndarray, top_k: int
+) -> np.ndarray:
+    scores[np.arange(len(query_ids)), query_ids] = -np.inf
+    candidates = np.argpartition(-scores, top_k, axis=1)[:, :top_k]
+    order = np.argsort(
+        -np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable"
+    )
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def quantize(vectors: np.ndarray, quantile: float) -> Tuple[np.ndarray, float, float]:
+    low, high = np.quantile(vectors, [1 - quantile, quantile])
+    scale = (high - low) / 255
+    quantized = np.clip(np.round((vectors - low) / scale), 0, 255).astype(np.uint8)
+    return quantized, low, scale
+
+
+def search(
+    vectors: np.ndarray,
+    query_ids: np.ndarray,
+    vector_dtype: VectorDataType,
+    top_k: int,
+    oversampling: float,
+    quantile: float,
+) -> np.ndarray:
+    queries = vectors[query_ids]
+    if vector_dtype == VectorDataType.FLOAT16:
+        return top_k_excluding_self(
+            (queries.astype(np.float16) @ vectors.astype(np.float16).T).astype(
+                np.float32
+            ),
+            query_ids,
+            top_k,
+        )
+    if vector_dtype == VectorDataType.UINT8:
+        quantized, low, scale = quantize(vectors, quantile)
+        dequantized = quantized.astype(np.float32) * scale + low
+        candidates = top_k_excluding_self(
+            queries @ dequantized.T, query_ids, int(top_k * oversampling)
+        )
+        rescored = np.einsum("qd,qkd->qk", queries, vectors[candidates])
+        order = np.argsort(-rescored, axis=1, kind="stable")[:, :top_k]
+        return np.take_along_axis(candidates, order, axis=1)
+    return top_k_excluding_self(queries @ vectors.T, query_ids, top_k)
+
+
+def recall(results: np.ndarray, ground_truth: np.ndarray) -> float:
+    return float(
+        np.mean(
+            [
+                len(set(result) & set(expected)) / len(expected)
+                for result, expected in zip(results.tolist(), ground_truth.tolist())
+            ]
+        )
+    )
+
+
+def benchmark(
+    vectors: np.ndarray,
+    dimensions: List[int],
+    num_queries: int,
+    top_k: int,
+    oversampling: float,
+    quantile: float,
+    seed: int,
+) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(
+        len(vectors), size=min(num_queries, len(vectors)), replace=False
+    )
+    full_dimension = vectors.shape[1]
+    ground_truth = search(
+        truncate(vectors, full_dimension),
+        query_ids,
+        VectorDataType.FLOAT32,
+        top_k,
+        oversampling,
+        quantile,
+    )
+
+    bytes_per_component = {
+        VectorDataType.FLOAT32: 4,
+        VectorDataType.FLOAT16: 2,
+        VectorDataType.UINT8: 1,
+    }
+    rows = []
+    for dimension in dimensions:
+        if dimension > full_dimension:
+            logger.warning(
+                f"Skipping {dimension} dimensions, the collection has {full_dimension} dimensions"
+            )
+            continue
+        truncated_vectors = truncate(vectors, dimension)
+        for vector_dtype in VectorDataType:
+            start = time.perf_counter()
+            results = search(
+                truncated_vectors,
+                query_ids,
+                vector_dtype,
+                top_k,
+                oversampling,
+                quantile,
+            )
+            elapsed = time.perf_counter() - start
+            rows.append(
+                {
+                    "dimensions": dimension,
+                    "vector_dtype": vector_dtype.value,
+                    f"recall@{top_k}": recall(results, ground_truth),
+                    "latency_ms_per_query": elapsed * 1000 / len(query_ids),
+                    # Vectors held in RAM for search, uint8 keeps float32 originals on disk
+                    "bytes_per_vector": dimension * bytes_per_component[vector_dtype],
+                }
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Matryoshka truncation and float16 / uint8 vector storage on a qdrant collection"
+    )
+    parser.add_argument("--qdrant_url", type=str, help="Qdrant url", required=True)
+    parser.add_argument(
+        "--qdrant_api_key", type=str, help="Qdrant api key", default=None
+    )
+    parser.add_argument(
+        "--collection_name", type=str, help="Collection name", required=True
+    )
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        nargs="+",
+        help="Target dimensions to benchmark",
+        required=True,
+    )
+    parser.add_argument(
+        "--sample_size", type=int, help="Number of vectors to sample", default=20000
+    )
+    parser.add_argument(
+        "--num_queries", type=int, help="Number of query vectors", default=200
+    )
+    parser.add_argument("--top_k", type=int, help="Top k for recall", default=10)
+    parser.add_argument(
+        "--oversampling",
+        type=float,
+        help="Candidates rescored per result for uint8",
+        default=2.0,
+    )
+    parser.add_argument(
+        "--quantile", type=float, help="Quantile for uint8 quantization", default=0.99
+    )
+    parser.add_argument(
+        "--batch_size", type=int, help="Scroll batch size", default=1000
+    )
+    parser.add_argument("--seed", type=int, help="Random seed", default=0)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.qdrant_url, api_key=args.qdrant_api_key)
+    vectors = fetch_vectors(
+        client, args.collection_name, args.sample_size, args.batch_size
+    )
+    logger.info(f"Fetched {vectors.shape[0]} vectors of {vectors.shape[1]} dimensions")
+
+    rows = benchmark(
+        vectors,
+        dimensions=args.dimensions,
+        num_queries=args.num_queries,
+        top_k=args.top_k,
+        oversampling=args.oversampling,
+        quantile=args.quantile,
+        seed=args.seed,
+    )
+    header = list(rows[0].keys()) if rows else []
+    print(" | ".join(header))
+    for row in rows:
+        print(
+            " | ".join(
+                f"{value:.4f}" if isinstance(value, float) else str(value)
+                for value in row.values()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
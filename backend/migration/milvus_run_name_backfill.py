@@ -0,0 +1,60 @@
+# This script sets a data ingestion run name on milvus vectors written before run names were
+# recorded in the metadata, so that FULL ingestion runs clean them up with a filtered delete
+"""
+How to run:
+
+python -m backend.migration.milvus_run_name_backfill \
+--collection_name creditcard
+
+Omit --collection_name to backfill every collection of the metadata store.
+The milvus instance is the one of VECTOR_DB_CONFIG. The vectors are re-inserted with the run
+name and the old ones are deleted, run it when no ingestion runs are in progress. It only needs
+to run once, vectors written by ingestion runs always carry their run name.
+"""
+
+import argparse
+import asyncio
+
+from backend.logger import logger
+from backend.modules.metadata_store.client import get_client
+from backend.modules.vector_db.client import VECTOR_STORE_CLIENT
+from backend.modules.vector_db.milvus import MilvusVectorDB
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill the data ingestion run names of milvus vectors"
+    )
+    parser.add_argument(
+        "--collection_name",
+        type=str,
+        help="Collection to backfill, all collections if not set",
+        default=None,
+    )
+    parser.add_argument(
+        "--data_ingestion_run_name",
+        type=str,
+        help="Run name set on the vectors, any name other than the next run's works",
+        default="backfilled",
+    )
+    args = parser.parse_args()
+
+    if not isinstance(VECTOR_STORE_CLIENT, MilvusVectorDB):
+        raise Exception("VECTOR_DB_CONFIG does not point to a milvus instance")
+
+    if args.collection_name:
+        collection_names = [args.collection_name]
+    else:
+        client = await get_client()
+        collection_names = await client.alist_collections()
+
+    for collection_name in collection_names:
+        backfilled_count = VECTOR_STORE_CLIENT.backfill_data_ingestion_run_names(
+            collection_name=collection_name,
+            data_ingestion_run_name=args.data_ingestion_run_name,
+        )
+        logger.info(f"Backfilled {backfilled_count} vectors of {collection_name}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
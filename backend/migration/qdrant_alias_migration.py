@@ -0,0 +1,54 @@
+# This script converts qdrant collections created before aliasing was introduced into aliases
+# of a physical collection, so that they can be reindexed with BLUE_GREEN ingestion runs
+"""
+How to run:
+
+python -m backend.migration.qdrant_alias_migration \
+--collection_name creditcard
+
+Omit --collection_name to migrate every collection of the metadata store.
+The qdrant instance is the one of VECTOR_DB_CONFIG. A collection is not served for a moment
+while it is migrated, and writes of ingestion runs during its migration make it fail, so run
+it when no ingestion runs are in progress.
+"""
+
+import argparse
+import asyncio
+
+from backend.logger import logger
+from backend.modules.metadata_store.client import get_client
+from backend.modules.vector_db.client import VECTOR_STORE_CLIENT
+from backend.modules.vector_db.qdrant import QdrantVectorDB
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Convert qdrant collections into aliases of physical collections"
+    )
+    parser.add_argument(
+        "--collection_name",
+        type=str,
+        help="Collection to migrate, all collections if not set",
+        default=None,
+    )
+    args = parser.parse_args()
+
+    if not isinstance(VECTOR_STORE_CLIENT, QdrantVectorDB):
+        raise Exception("VECTOR_DB_CONFIG does not point to a qdrant instance")
+
+    if args.collection_name:
+        collection_names = [args.collection_name]
+    else:
+        client = await get_client()
+        collection_names = await client.alist_collections()
+
+    for collection_name in collection_names:
+        if VECTOR_STORE_CLIENT.supports_blue_green_reindex(collection_name):
+            logger.info(f"{collection_name} is already an alias, skipping")
+            continue
+        physical_collection_name = VECTOR_STORE_CLIENT.migrate_to_alias(collection_name)
+        logger.info(f"Migrated {collection_name} -> {physical_collection_name}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from typing import Callable, Iterator, List, Tuple
+
+from backend.types import ConfiguredBaseModel
+
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+ZIP_EXTENSIONS = (".zip",)
+
+
+class ArchiveMember(ConfiguredBaseModel):
+    """
+    A regular file inside an archive
+    name: Path of the member inside the archive
+    member_hash: CRC32 and size for zip members, size and mtime for tar members (tar has no checksums of file contents)
+    """
+
+    name: str
+    size: int
+    member_hash: str
+
+    @property
+    def file_extension(self) -> str:
+        return os.path.splitext(self.name)[1]
+
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ZIP_EXTENSIONS + TAR_EXTENSIONS)
+
+
+def iter_archive_members(
+    archive_path: str,
+    dest_dir: str,
+    batch_size: int,
+    is_wanted: Callable[[ArchiveMember], bool],
+) -> Iterator[List[Tuple[ArchiveMember, str]]]:
+    """
+    Stream the members of an archive selected by `is_wanted` into files in `dest_dir`, in a
+    single pass over the archive, and yield them in batches of `batch_size`.
+    Members are written under generated names (keeping their extension) so that member paths
+    can never escape `dest_dir`.
+
+    Args:
+        archive_path (str): Path of the zip or tar archive.
+        dest_dir (str): Directory to write the members to.
+        batch_size (int): Number of members per batch.
+        is_wanted (Callable[[ArchiveMember], bool]): Whether a member has to be extracted.
+
+    Returns:
+        Iterator[List[Tuple[ArchiveMember, str]]]: Batches of members and the paths of their extracted files.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    batch: List[Tuple[ArchiveMember, str]] = []
+
+    def _stream_to_file(member: ArchiveMember, src):
+        fd, local_filepath = tempfile.mkstemp(
+            suffix=member.file_extension, dir=dest_dir
+        )
+        with os.fdopen(fd, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        batch.append((member, local_filepath))
+
+    if archive_path.lower().endswith(ZIP_EXTENSIONS):
+        with zipfile.ZipFile(archive_path) as zip_file:
+            for info in zip_file.infolist():
+                member = ArchiveMember(
+                    name=info.filename,
+                    size=info.file_size,
+                    member_hash=f"{info.CRC:08x}:{info.file_size}",
+                )
+                if info.is_dir() or not is_wanted(member):
+                    continue
+                with zip_file.open(info) as src:
+                    _stream_to_file(member, src)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+        return
+
+    # Compressed tars can only be read sequentially, the archive is decompressed once and
+    # the batches are yielded as the members stream by
+    with tarfile.open(archive_path, mode="r|*") as tar_file:
+        for info in tar_file:
+            if not info.isfile():
+                continue
+            member = ArchiveMember(
+                name=posixpath.normpath(info.name),
+                size=info.size,
+                member_hash=f"{info.size}:{info.mtime}",
+            )
+            if not is_wanted(member):
+                continue
+            with tar_file.extractfile(info) as src:
+                _stream_to_file(member, src)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
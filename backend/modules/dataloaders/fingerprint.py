@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import Field
+
+from backend.logger import logger
+from backend.settings import settings
+from backend.types import ConfiguredBaseModel
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# Read files in 1MB blocks while hashing
+HASH_BLOCK_SIZE = 1024 * 1024
+
+DEFAULT_HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+class FingerprintMode(str, Enum):
+    """
+    How data point hashes are computed for files
+    STAT: (size, mtime_ns, inode) only, file contents are never read
+    CONTENT: hash of the file contents, only recomputed when the stat fingerprint changes
+    """
+
+    STAT = "stat"
+    CONTENT = "content"
+
+
+class FileFingerprint(ConfiguredBaseModel):
+    """
+    Fingerprint of a single file
+    """
+
+    size: int
+    mtime_ns: int
+    inode: int
+    content_hash: Optional[str] = None
+
+    @classmethod
+    def from_stat(cls, stat_result: os.stat_result) -> "FileFingerprint":
+        return cls(
+            size=stat_result.st_size,
+            mtime_ns=stat_result.st_mtime_ns,
+            inode=stat_result.st_ino,
+        )
+
+    @property
+    def stat_hash(self) -> str:
+        return f"{self.size}:{self.mtime_ns}:{self.inode}"
+
+    def same_stat(self, other: "FileFingerprint") -> bool:
+        return (self.size, self.mtime_ns, self.inode) == (
+            other.size,
+            other.mtime_ns,
+            other.inode,
+        )
+
+
+def _new_content_hasher() -> Tuple[str, object]:
+    if xxhash is not None:
+        return "xxh3", xxhash.xxh3_128()
+    if blake3 is not None:
+        return "blake3", blake3.blake3()
+    return "blake2b", hashlib.blake2b(digest_size=16)
+
+
+def compute_content_hash(path: str) -> str:
+    """
+    Hash the contents of a file with the fastest available algorithm (xxhash > blake3 > blake2b).
+    The algorithm name is part of the returned hash.
+    """
+    algorithm, hasher = _new_content_hasher()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            hasher.update(block)
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+class ArchiveFingerprint(ConfiguredBaseModel):
+    """
+    Fingerprint of an archive whose members are ingested as data points
+    archive_hash: Hash of the archive file when its members were listed
+    members: Data point fqn to data point hash of each member
+    """
+
+    archive_hash: str
+    members: Dict[str, str] = Field(default_factory=dict)
+
+
+class FingerprintManifest(ConfiguredBaseModel):
+    """
+    Persistent map of relative file path to its last known fingerprint for a data source,
+    and of archive path to the fingerprint of the archive
+    """
+
+    data_source_fqn: str
+    files: Dict[str, FileFingerprint] = Field(default_factory=dict)
+    archives: Dict[str, ArchiveFingerprint] = Field(default_factory=dict)
+
+    @staticmethod
+    def get_manifest_path(data_source_fqn: str) -> str:
+        file_name = hashlib.sha256(data_source_fqn.encode()).hexdigest() + ".json"
+        return os.path.join(settings.LOADER_MANIFEST_DIRECTORY, file_name)
+
+    @classmethod
+    def load(cls, data_source_fqn: str) -> "FingerprintManifest":
+        manifest_path = cls.get_manifest_path(data_source_fqn)
+        try:
+            with open(manifest_path) as f:
+                manifest = cls.model_validate(json.load(f))
+            if manifest.data_source_fqn == data_source_fqn:
+                return manifest
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return cls(data_source_fqn=data_source_fqn)
+
+    def save(self):
+        manifest_path = self.get_manifest_path(self.data_source_fqn)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        # Write to a temporary file first so that a crash never leaves a corrupted manifest
+        tmp_manifest_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_manifest_path, "w") as f:
+            f.write(self.model_dump_json())
+        os.replace(tmp_manifest_path, manifest_path)
+
+
+class Fingerprinter:
+    """
+    Computes data point hashes for local files, reusing the manifest to skip rehashing unchanged files
+    """
+
+    def __init__(
+        self,
+        data_source_fqn: str,
+        mode: FingerprintMode = FingerprintMode.STAT,
+        max_workers: int = DEFAULT_HASH_WORKERS,
+    ):
+        self.mode = FingerprintMode(mode)
+        self.max_workers = max_workers
+        self.previous_manifest = FingerprintManifest.load(data_source_fqn)
+        self.manifest = FingerprintManifest(data_source_fqn=data_source_fqn)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> "Fingerprinter":
+        if self.mode == FingerprintMode.CONTENT:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="fingerprint"
+            )
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        # Only persist complete walks, a partial manifest would drop entries of unvisited files
+        if exc[0] is None:
+            self.manifest.save()
+
+    async def fingerprint(self, files: List[Tuple[str, str]]) -> Dict[str, str]:
+        """
+        Compute the data point hash of the given files.
+
+        Args:
+            files (List[Tuple[str, str]]): List of (relative path, full path) of the files.
+
+        Returns:
+            Dict[str, str]: Map of relative path to data point hash.
+        """
+        hashes: Dict[str, str] = {}
+        to_be_hashed: List[Tuple[str, str]] = []
+        for rel_path, full_path in files:
+            fingerprint = FileFingerprint.from_stat(os.stat(full_path))
+            self.manifest.files[rel_path] = fingerprint
+            if self.mode == FingerprintMode.STAT:
+                hashes[rel_path] = fingerprint.stat_hash
+                continue
+            previous_fingerprint = self.previous_manifest.files.get(rel_path)
+            if (
+                previous_fingerprint is not None
+                and previous_fingerprint.content_hash
+                and previous_fingerprint.same_stat(fingerprint)
+            ):
+                fingerprint.content_hash = previous_fingerprint.content_hash
+                hashes[rel_path] = fingerprint.content_hash
+            else:
+                to_be_hashed.append((rel_path, full_path))
+
+        if to_be_hashed:
+            loop = asyncio.get_running_loop()
+            content_hashes = await asyncio.gather(
+                *[
+                    loop.run_in_executor(
+                        self._executor, compute_content_hash, full_path
+                    )
+                    for _, full_path in to_be_hashed
+                ]
+            )
+            for (rel_path, _), content_hash in zip(to_be_hashed, content_hashes):
+                self.manifest.files[rel_path].content_hash = content_hash
+                hashes[rel_path] = content_hash
+        return hashes
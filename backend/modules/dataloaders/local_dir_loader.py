@@ -1,11 +1,53 @@
+import fcntl
 import os
 import shutil
-from typing import AsyncGenerator, Dict, List
+from typing import AsyncGenerator, Dict, List, Tuple
 
 from backend.logger import logger
+from backend.modules.dataloaders.fingerprint import Fingerprinter, FingerprintMode
 from backend.modules.dataloaders.loader import BaseDataLoader
 from backend.types import DataIngestionMode, DataPoint, DataSource, LoadedDataPoint
 
+# ioctl request to clone a file's extents on copy-on-write file systems (btrfs, xfs)
+# Ref: https://man7.org/linux/man-pages/man2/ioctl_ficlone.2.html
+FICLONE = 0x40049409
+
+
+def _reflink(src: str, dst: str):
+    """
+    Create a copy-on-write clone of `src` at `dst`. Raises OSError if not supported.
+    """
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.remove(dst)
+            raise
+
+
+def isolate_file(src: str, dst: str) -> str:
+    """
+    Make `src` available at `dst` without copying its contents where possible.
+    Tries a reflink first, then a hardlink and only falls back to a full copy.
+
+    Args:
+        src (str): Path of the source file.
+        dst (str): Path where the file should be made available.
+
+    Returns:
+        str: `dst`
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    for link in (_reflink, os.link):
+        try:
+            link(src, dst)
+            return dst
+        except OSError:
+            continue
+    shutil.copy2(src, dst)
+    return dst
+
 
 class LocalDirLoader(BaseDataLoader):
     """
@@ -22,6 +64,13 @@ class LocalDirLoader(BaseDataLoader):
     ) -> AsyncGenerator[List[LoadedDataPoint], None]:
         """
         Loads data from a local directory specified by the given source URI.
+
+        The source directory is walked in place and change detection runs before file contents are touched.
+        Data point hashes come from `Fingerprinter`: by default (size, mtime_ns, inode), or a content hash
+        with `fingerprint_mode: content` in the data source metadata, which is only recomputed for files
+        whose stat fingerprint changed since the last run.
+        Parsers get the original file path, unless `isolate_files` is set in the data source metadata,
+        in which case each file to be parsed is reflinked / hardlinked / copied into `dest_dir`.
         """
         # Data source URI is the path of the local directory.
         source_dir = data_source.uri
@@ -32,62 +81,110 @@ class LocalDirLoader(BaseDataLoader):
             source_dir = os.path.join(os.getcwd(), source_dir)
 
         logger.info(
-            f"CURRENT DIR:{os.getcwd()}, Path exists: {os.path.exists(source_dir)}, Dir contents: {os.listdir(source_dir)}"
+            f"CURRENT DIR:{os.getcwd()}, Path exists: {os.path.exists(source_dir)}"
         )
         # Check if the source directory exists.
         if not os.path.exists(source_dir):
             raise Exception("Source directory does not exist")
 
-        # If the source directory and destination directory are the same, do nothing.
         logger.info("source_dir: %s", source_dir)
         logger.info("dest_dir: %s", dest_dir)
-        if source_dir == dest_dir:
-            # Terminate the function
-            return
+        isolate_files = bool((data_source.metadata or {}).get("isolate_files", False))
+        fingerprint_mode = (data_source.metadata or {}).get(
+            "fingerprint_mode", FingerprintMode.STAT
+        )
 
-        # Copy the entire directory (including subdirectories) from source to destination.
-        shutil.copytree(source_dir, dest_dir, dirs_exist_ok=True)
+        with Fingerprinter(
+            data_source_fqn=data_source.fqn, mode=fingerprint_mode
+        ) as fingerprinter:
+            files: List[Tuple[str, str]] = []
+            # Batches are cut from the loaded data points, unchanged files are filtered out first
+            loaded_data_points: List[LoadedDataPoint] = []
+            for root, d_names, f_names in os.walk(source_dir):
+                for f in f_names:
+                    if f.startswith("."):
+                        continue
+                    full_path = os.path.join(root, f)
+                    files.append((os.path.relpath(full_path, source_dir), full_path))
+                    if len(files) >= batch_size:
+                        loaded_data_points.extend(
+                            await self._load_files(
+                                files,
+                                data_source,
+                                dest_dir,
+                                previous_snapshot,
+                                data_ingestion_mode,
+                                fingerprinter,
+                                isolate_files,
+                            )
+                        )
+                        files = []
+                        while len(loaded_data_points) >= batch_size:
+                            yield loaded_data_points[:batch_size]
+                            loaded_data_points = loaded_data_points[batch_size:]
+            loaded_data_points.extend(
+                await self._load_files(
+                    files,
+                    data_source,
+                    dest_dir,
+                    previous_snapshot,
+                    data_ingestion_mode,
+                    fingerprinter,
+                    isolate_files,
+                )
+            )
+            for i in range(0, len(loaded_data_points), batch_size):
+                yield loaded_data_points[i : i + batch_size]
 
-        logger.info(f"Dest dir contents: {os.listdir(dest_dir)}")
+    async def _load_files(
+        self,
+        files: List[Tuple[str, str]],
+        data_source: DataSource,
+        dest_dir: str,
+        previous_snapshot: Dict[str, str],
+        data_ingestion_mode: DataIngestionMode,
+        fingerprinter: Fingerprinter,
+        isolate_files: bool,
+    ) -> List[LoadedDataPoint]:
+        """
+        Fingerprint a batch of files and load the ones that need to be ingested
+        """
+        data_point_hashes = await fingerprinter.fingerprint(files)
 
         loaded_data_points: List[LoadedDataPoint] = []
-        for root, d_names, f_names in os.walk(dest_dir):
-            for f in f_names:
-                if f.startswith("."):
-                    continue
-                full_path = os.path.join(root, f)
-                rel_path = os.path.relpath(full_path, dest_dir)
-                file_ext = os.path.splitext(f)[1]
-                logger.info(
-                    f"full_path: {full_path}, rel_path: {rel_path}, file_ext: {file_ext}"
-                )
-                data_point = DataPoint(
-                    data_source_fqn=data_source.fqn,
-                    data_point_uri=rel_path,
-                    data_point_hash=str(os.lstat(full_path)),
-                    local_filepath=full_path,
-                    file_extension=file_ext,
+        for rel_path, full_path in files:
+            file_ext = os.path.splitext(full_path)[1]
+            data_point = DataPoint(
+                data_source_fqn=data_source.fqn,
+                data_point_uri=rel_path,
+                data_point_hash=data_point_hashes[rel_path],
+            )
+
+            # If the data ingestion mode is incremental, check if the data point already exists.
+            if (
+                data_ingestion_mode == DataIngestionMode.INCREMENTAL
+                and previous_snapshot.get(data_point.data_point_fqn)
+                and previous_snapshot.get(data_point.data_point_fqn)
+                == data_point.data_point_hash
+            ):
+                continue
+
+            local_filepath = full_path
+            if isolate_files:
+                local_filepath = isolate_file(
+                    full_path, os.path.join(dest_dir, rel_path)
                 )
+            logger.info(
+                f"full_path: {full_path}, local_filepath: {local_filepath}, file_ext: {file_ext}"
+            )
 
-                # If the data ingestion mode is incremental, check if the data point already exists.
-                if (
-                    data_ingestion_mode == DataIngestionMode.INCREMENTAL
-                    and previous_snapshot.get(data_point.data_point_fqn)
-                    and previous_snapshot.get(data_point.data_point_fqn)
-                    == data_point.data_point_hash
-                ):
-                    continue
-
-                loaded_data_points.append(
-                    LoadedDataPoint(
-                        data_point_hash=data_point.data_point_hash,
-                        data_point_uri=data_point.data_point_uri,
-                        data_source_fqn=data_point.data_source_fqn,
-                        local_filepath=full_path,
-                        file_extension=file_ext,
-                    )
+            loaded_data_points.append(
+                LoadedDataPoint(
+                    data_point_hash=data_point.data_point_hash,
+                    data_point_uri=data_point.data_point_uri,
+                    data_source_fqn=data_point.data_source_fqn,
+                    local_filepath=local_filepath,
+                    file_extension=file_ext,
                 )
-                if len(loaded_data_points) >= batch_size:
-                    yield loaded_data_points
-                    loaded_data_points.clear()
-        yield loaded_data_points
+            )
+        return loaded_data_points
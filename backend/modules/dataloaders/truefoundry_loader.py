@@ -1,17 +1,68 @@
+import asyncio
 import os
-from typing import AsyncGenerator, Dict, List
+import posixpath
+from typing import AsyncGenerator, Dict, List, Optional
 
+import aiofiles
+import aiohttp
 from truefoundry.ml import get_client as get_tfy_client
 
 from backend.logger import logger
+from backend.modules.dataloaders.archive import (
+    ArchiveMember,
+    is_archive,
+    iter_archive_members,
+)
+from backend.modules.dataloaders.fingerprint import (
+    ArchiveFingerprint,
+    FingerprintManifest,
+)
 from backend.modules.dataloaders.loader import BaseDataLoader
-from backend.types import DataIngestionMode, DataPoint, DataSource, LoadedDataPoint
-from backend.utils import unzip_file
+from backend.modules.dataloaders.web_crawler import (
+    DOWNLOAD_CHUNK_SIZE,
+    get_content_hash,
+)
+from backend.types import (
+    ConfiguredBaseModel,
+    DataIngestionMode,
+    DataPoint,
+    DataSource,
+    LoadedDataPoint,
+)
+
+# Files probed and downloaded concurrently
+MAX_CONCURRENT_DOWNLOADS = 8
+DOWNLOAD_TIMEOUT = 60 * 60
+PROBE_TIMEOUT = 30
+
+
+class RemoteFile(ConfiguredBaseModel):
+    """
+    A file of the data directory manifest
+    path: Path of the file in the data directory
+    size: Size in bytes
+    signed_url: Pre-signed download URL, if the storage provides one
+    content_hash: ETag or Last-Modified of the stored object, if the storage sends one
+    dataset_updated_at: Last update of the data directory, stands in for a missing content_hash
+    """
+
+    path: str
+    size: int
+    signed_url: Optional[str] = None
+    content_hash: Optional[str] = None
+    dataset_updated_at: Optional[str] = None
+
+    @property
+    def file_hash(self) -> str:
+        return f"{self.size}:{self.content_hash or self.dataset_updated_at}"
 
 
 class TrueFoundryLoader(BaseDataLoader):
     """
     Load data from a TrueFoundry data source (data-dir).
+    The file manifest of the data directory is listed first, only new or changed files are
+    downloaded, concurrently and streamed to disk. Archives are only downloaded if they or one
+    of their members changed since the last run, according to the loader manifest.
     """
 
     async def load_filtered_data(
@@ -25,93 +76,271 @@ class TrueFoundryLoader(BaseDataLoader):
         """
         Loads data from a truefoundry data directory with FQN specified by the given source URI.
         """
-        tfy_files_dir = None
-
         # Check if the data source type is data-dir. Other data source types are not supported with TrueFoundry.
         if not data_source.uri.startswith("data-dir"):
             raise ValueError(f"Unsupported data source type {data_source.uri}")
 
-        # Since only data-dir is allowed, we can directly use the FQN to get the data directory.
         try:
             # Log into TrueFoundry
             tfy_client = get_tfy_client()
             # Data source URI contains the Truefoundry FQN(Fully Qualified Name) of the data directory.
-            # Use the FQN to get the data directory from TrueFoundry.
-            dataset = tfy_client.get_data_directory_by_fqn(data_source.uri)
-            # Download the data directory to the destination directory.
-            tfy_files_dir = dataset.download(path=dest_dir)
-            logger.debug(f"Data directory download info: {tfy_files_dir}")
+            dataset = await asyncio.to_thread(
+                tfy_client.get_data_directory_by_fqn, data_source.uri
+            )
+            remote_files = await asyncio.to_thread(self._list_remote_files, dataset)
         except Exception as e:
-            logger.error(f"Error downloading data directory: {str(e)}")
-            raise ValueError(f"Failed to download data directory: {str(e)}")
-
-        # If tfy_files_dir is None, it means the data was not downloaded.
-        if tfy_files_dir is None:
-            logger.error("Download info not found")
-            raise ValueError("Failed to download data directory")
-
-        if os.path.exists(os.path.join(tfy_files_dir, "files")):
-            logger.debug("Files directory exists")
-            tfy_files_dir = os.path.join(tfy_files_dir, "files")
-            logger.debug(f"[Updated] download info: {tfy_files_dir} for data-dir")
-
-        # If the downloaded data directory is a ZIP file, unzip its contents.
-        for file_name in os.listdir(tfy_files_dir):
-            logger.debug(f"file_name: {file_name}")
-            # If the file is a ZIP file, unzip its contents.
-            if file_name.endswith(".zip"):
-                logger.debug(
-                    f"Unzipped file_path: {os.path.join(tfy_files_dir, file_name)}"
-                )
-                unzip_file(
-                    file_path=os.path.join(tfy_files_dir, file_name),
-                    dest_dir=tfy_files_dir,
-                )
+            logger.error(f"Error listing data directory: {str(e)}")
+            raise ValueError(f"Failed to list data directory: {str(e)}")
+        logger.info(f"Found {len(remote_files)} files in {data_source.uri}")
 
-        logger.info("Downloaded data to: {}".format(dest_dir))
+        incremental = data_ingestion_mode == DataIngestionMode.INCREMENTAL
+        previous_manifest = FingerprintManifest.load(data_source.fqn)
+        manifest = FingerprintManifest(data_source_fqn=data_source.fqn)
+        # Archive members are extracted batch by batch into this directory, the files are evicted by the
+        # ingestion workspace once their batch is ingested
+        members_dir = os.path.join(dest_dir, ".archive_members")
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
 
-        # Initialize the list of loaded data points.
-        loaded_data_points: List[LoadedDataPoint] = []
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=MAX_CONCURRENT_DOWNLOADS)
+        ) as session:
+            await asyncio.gather(
+                *[
+                    self._probe(session, semaphore, remote_file)
+                    for remote_file in remote_files
+                ]
+            )
 
-        # Walk through the downloaded data directory and process each file.
-        for root, _dirs, files in os.walk(tfy_files_dir):
-            for f in files:
-                # Skip hidden files.
-                if f.startswith("."):
+            changed_files: List[RemoteFile] = []
+            changed_archives: List[RemoteFile] = []
+            for remote_file in remote_files:
+                if is_archive(remote_file.path):
+                    archive_fingerprint = previous_manifest.archives.get(
+                        remote_file.path
+                    )
+                    if incremental and self._is_archive_unchanged(
+                        remote_file, archive_fingerprint, previous_snapshot
+                    ):
+                        manifest.archives[remote_file.path] = archive_fingerprint
+                    else:
+                        changed_archives.append(remote_file)
                     continue
-                full_path = os.path.join(root, f)
-                logger.debug(f"Processing file: {full_path}")
-                rel_path = os.path.relpath(full_path, dest_dir)
-                file_ext = os.path.splitext(f)[1]
-                # Create a DataPoint object for the current file.
-                data_point = DataPoint(
-                    data_source_fqn=data_source.fqn,
-                    data_point_uri=rel_path,
-                    data_point_hash=f"{os.path.getsize(full_path)}:{dataset.updated_at}",
-                )
-
-                # If the data ingestion mode is incremental, check if the data point already exists.
-                if (
-                    data_ingestion_mode == DataIngestionMode.INCREMENTAL
-                    and previous_snapshot.get(data_point.data_point_fqn)
-                    == data_point.data_point_hash
+                if incremental and self._is_unchanged(
+                    self._get_data_point(data_source, remote_file), previous_snapshot
                 ):
                     continue
+                changed_files.append(remote_file)
+            logger.info(
+                f"Downloading {len(changed_files)} changed files and {len(changed_archives)} changed archives "
+                f"of {len(remote_files)} files"
+            )
 
-                # Add the data point to the list of loaded data points.
-                loaded_data_points.append(
-                    LoadedDataPoint(
-                        data_point_hash=data_point.data_point_hash,
-                        data_point_uri=data_point.data_point_uri,
-                        data_source_fqn=data_point.data_source_fqn,
-                        local_filepath=full_path,
-                        file_extension=file_ext,
+            for i in range(0, len(changed_files), batch_size):
+                batch_files = changed_files[i : i + batch_size]
+                local_filepaths = await asyncio.gather(
+                    *[
+                        self._download(session, semaphore, dataset, dest_dir, file)
+                        for file in batch_files
+                    ]
+                )
+                yield [
+                    self._to_loaded_data_point(
+                        self._get_data_point(data_source, file), local_filepath
                     )
+                    for file, local_filepath in zip(batch_files, local_filepaths)
+                ]
+
+            # Archive members are data points of their own, an archive is only downloaded if it changed
+            for archive in changed_archives:
+                archive_path = await self._download(
+                    session, semaphore, dataset, dest_dir, archive
+                )
+                archive_fingerprint = ArchiveFingerprint(archive_hash=archive.file_hash)
+                # One pass over the archive, batches are extracted as they stream by
+                members = iter_archive_members(
+                    archive_path,
+                    members_dir,
+                    batch_size,
+                    is_wanted=lambda member: self._is_member_wanted(
+                        self._get_member_data_point(data_source, archive, member),
+                        archive_fingerprint,
+                        previous_snapshot,
+                        incremental,
+                    ),
                 )
-                # If the number of loaded data points is greater than or equal to the batch size, yield the loaded data points.
-                if len(loaded_data_points) >= batch_size:
-                    yield loaded_data_points
-                    loaded_data_points.clear()
+                while extracted := await asyncio.to_thread(next, members, None):
+                    yield [
+                        self._to_loaded_data_point(
+                            self._get_member_data_point(data_source, archive, member),
+                            local_filepath,
+                        )
+                        for member, local_filepath in extracted
+                    ]
+                # The members are extracted, the archive itself is never ingested
+                os.remove(archive_path)
+                manifest.archives[archive.path] = archive_fingerprint
+
+        # Only persist complete runs, a partial manifest would drop entries of unread archives
+        manifest.save()
+
+    def _list_remote_files(self, dataset) -> List[RemoteFile]:
+        """
+        Walk the data directory listing, without downloading anything
+        """
+        remote_files: List[RemoteFile] = []
+        pending_dirs = [None]
+        while pending_dirs:
+            for file_info in dataset.list_files(path=pending_dirs.pop()):
+                if file_info.is_dir:
+                    pending_dirs.append(file_info.path)
+                # Skip hidden files.
+                elif not posixpath.basename(file_info.path).startswith("."):
+                    remote_files.append(
+                        RemoteFile(
+                            path=file_info.path,
+                            size=file_info.file_size or 0,
+                            signed_url=file_info.signed_url,
+                            dataset_updated_at=str(dataset.updated_at),
+                        )
+                    )
+        return remote_files
+
+    async def _probe(
+        self,
+        session: aiohttp.ClientSession,
+        semaphore: asyncio.Semaphore,
+        remote_file: RemoteFile,
+    ):
+        """
+        Read the ETag / Last-Modified of a file with a single byte range request.
+        Signed URLs are only valid for GET, so HEAD cannot be used.
+        """
+        if not remote_file.signed_url:
+            return
+        try:
+            async with semaphore:
+                async with session.get(
+                    remote_file.signed_url,
+                    headers={"Range": "bytes=0-0"},
+                    timeout=aiohttp.ClientTimeout(total=PROBE_TIMEOUT),
+                ) as response:
+                    content_hash = (
+                        get_content_hash(response.headers)
+                        if response.status in (200, 206)
+                        else None
+                    )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Failed to probe {remote_file.path}: {e}")
+            return
+        remote_file.content_hash = content_hash
+
+    async def _download(
+        self,
+        session: aiohttp.ClientSession,
+        semaphore: asyncio.Semaphore,
+        dataset,
+        dest_dir: str,
+        remote_file: RemoteFile,
+    ) -> str:
+        """
+        Stream a file to `dest_dir`, under its path in the data directory
+        """
+        dest_dir = os.path.abspath(dest_dir)
+        local_filepath = os.path.normpath(os.path.join(dest_dir, remote_file.path))
+        if not local_filepath.startswith(os.path.join(dest_dir, "")):
+            raise ValueError(f"Invalid file path {remote_file.path}")
+        os.makedirs(os.path.dirname(local_filepath), exist_ok=True)
+        async with semaphore:
+            if remote_file.signed_url:
+                try:
+                    async with session.get(
+                        remote_file.signed_url,
+                        timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT),
+                    ) as response:
+                        if response.status == 200:
+                            async with aiofiles.open(local_filepath, "wb") as f:
+                                async for chunk in response.content.iter_chunked(
+                                    DOWNLOAD_CHUNK_SIZE
+                                ):
+                                    await f.write(chunk)
+                            return local_filepath
+                        logger.debug(
+                            f"Signed URL of {remote_file.path} answered {response.status}"
+                        )
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Failed to download {remote_file.path}: {e}")
+            # Signed URLs expire, the SDK signs a new one
+            await asyncio.to_thread(
+                dataset.download,
+                remote_path=remote_file.path,
+                path=dest_dir,
+                overwrite=True,
+            )
+        return local_filepath
+
+    def _get_data_point(
+        self, data_source: DataSource, remote_file: RemoteFile
+    ) -> DataPoint:
+        return DataPoint(
+            data_source_fqn=data_source.fqn,
+            data_point_uri=remote_file.path,
+            data_point_hash=remote_file.file_hash,
+        )
+
+    def _get_member_data_point(
+        self, data_source: DataSource, archive: RemoteFile, member: ArchiveMember
+    ) -> DataPoint:
+        return DataPoint(
+            data_source_fqn=data_source.fqn,
+            data_point_uri=f"{archive.path}/{member.name}",
+            data_point_hash=member.member_hash,
+        )
+
+    def _is_member_wanted(
+        self,
+        data_point: DataPoint,
+        archive_fingerprint: ArchiveFingerprint,
+        previous_snapshot: Dict[str, str],
+        incremental: bool,
+    ) -> bool:
+        data_point_fqn = data_point.data_point_fqn
+        archive_fingerprint.members[data_point_fqn] = data_point.data_point_hash
+        return not (incremental and self._is_unchanged(data_point, previous_snapshot))
+
+    def _is_unchanged(
+        self, data_point: DataPoint, previous_snapshot: Dict[str, str]
+    ) -> bool:
+        return (
+            previous_snapshot.get(data_point.data_point_fqn)
+            == data_point.data_point_hash
+        )
+
+    def _is_archive_unchanged(
+        self,
+        archive: RemoteFile,
+        archive_fingerprint: Optional[ArchiveFingerprint],
+        previous_snapshot: Dict[str, str],
+    ) -> bool:
+        """
+        An archive is unchanged if it has the hash it had when its members were last listed,
+        and all those members are ingested with the hashes they had then
+        """
+        return (
+            archive_fingerprint is not None
+            and archive_fingerprint.archive_hash == archive.file_hash
+            and all(
+                previous_snapshot.get(data_point_fqn) == data_point_hash
+                for data_point_fqn, data_point_hash in archive_fingerprint.members.items()
+            )
+        )
 
-        # Yield the remaining loaded data points.
-        yield loaded_data_points
+    def _to_loaded_data_point(
+        self, data_point: DataPoint, local_filepath: str
+    ) -> LoadedDataPoint:
+        return LoadedDataPoint(
+            data_point_hash=data_point.data_point_hash,
+            data_point_uri=data_point.data_point_uri,
+            data_source_fqn=data_point.data_source_fqn,
+            local_filepath=local_filepath,
+            file_extension=os.path.splitext(data_point.data_point_uri)[1],
+        )
@@ -0,0 +1,319 @@
+import asyncio
+import gzip
+import os
+import tempfile
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import aiofiles
+import aiohttp
+from bs4 import BeautifulSoup
+from multidict import CIMultiDict
+from pydantic import Field
+
+from backend.logger import logger
+from backend.types import ConfiguredBaseModel
+
+DEFAULT_USER_AGENT = "CognitaWebLoader/1.0"
+# Size of the chunks in which response bodies are streamed to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class CrawlerConfig(ConfiguredBaseModel):
+    """
+    Configuration of the web crawler, read from the `crawler` key of the data source metadata
+    """
+
+    max_concurrency: int = Field(default=16, ge=1)
+    max_concurrency_per_host: int = Field(default=4, ge=1)
+    request_timeout: float = Field(default=30, gt=0)
+    connect_timeout: float = Field(default=10, gt=0)
+    respect_robots_txt: bool = True
+    user_agent: str = DEFAULT_USER_AGENT
+    max_sitemap_depth: int = Field(default=3, ge=0)
+
+
+class CrawlResult(ConfiguredBaseModel):
+    """
+    Outcome of a conditional request for a single URL
+    not_modified: The server answered 304 for the previous validators
+    content_hash: ETag, Last-Modified or None if the server sent neither
+    local_filepath: Path of the downloaded body, if it was downloaded
+    """
+
+    url: str
+    status: int
+    not_modified: bool = False
+    content_hash: Optional[str] = None
+    local_filepath: Optional[str] = None
+
+
+class _HostState:
+    """
+    Per host concurrency limit, robots.txt rules and crawl-delay bookkeeping
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.robots: Optional[RobotFileParser] = None
+        self.robots_lock = asyncio.Lock()
+        self.delay_lock = asyncio.Lock()
+        self.next_request_at = 0.0
+
+
+def conditional_headers(previous_hash: Optional[str]) -> Dict[str, str]:
+    """
+    Build the conditional request headers from a previously stored data point hash.
+    Data point hashes of web pages are the raw ETag or Last-Modified value returned by the server.
+    """
+    if not previous_hash:
+        return {}
+    if previous_hash.startswith(('"', 'W/"')):
+        return {"If-None-Match": previous_hash}
+    try:
+        parsedate_to_datetime(previous_hash)
+    except (TypeError, ValueError):
+        # Sitemap lastmod dates and the date fallback are not valid validators
+        return {}
+    return {"If-Modified-Since": previous_hash}
+
+
+def get_content_hash(headers: CIMultiDict) -> Optional[str]:
+    return headers.get("ETag") or headers.get("Last-Modified")
+
+
+class WebCrawler:
+    """
+    Polite concurrent crawler used by `WebLoader`.
+    Bounds the number of in flight requests globally and per host, honours robots.txt
+    disallow rules and crawl-delay, and uses conditional requests so that unchanged pages
+    cost a single 304 response.
+
+    Use as an async context manager:
+        async with WebCrawler(config) as crawler:
+            urls = await crawler.get_sitemap_urls(url)
+    """
+
+    def __init__(self, config: Optional[CrawlerConfig] = None):
+        self.config = config or CrawlerConfig()
+        self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        self._hosts: Dict[str, _HostState] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "WebCrawler":
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(
+                total=self.config.request_timeout,
+                sock_connect=self.config.connect_timeout,
+            ),
+            connector=aiohttp.TCPConnector(
+                limit=self.config.max_concurrency,
+                limit_per_host=self.config.max_concurrency_per_host,
+            ),
+            headers={"User-Agent": self.config.user_agent},
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    def _get_host_state(self, url: str) -> _HostState:
+        host = urlparse(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(self.config.max_concurrency_per_host)
+        return self._hosts[host]
+
+    async def _get_robots(self, url: str) -> RobotFileParser:
+        host_state = self._get_host_state(url)
+        async with host_state.robots_lock:
+            if host_state.robots is not None:
+                return host_state.robots
+            parsed_url = urlparse(url)
+            robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
+            robots = RobotFileParser(robots_url)
+            try:
+                async with self._session.get(robots_url) as response:
+                    if response.status in (401, 403):
+                        robots.disallow_all = True
+                    elif response.status < 400:
+                        robots.parse((await response.text()).splitlines())
+                    else:
+                        robots.allow_all = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Failed to fetch {robots_url}: {e}")
+                robots.allow_all = True
+            host_state.robots = robots
+            return robots
+
+    async def is_allowed(self, url: str) -> bool:
+        if not self.config.respect_robots_txt:
+            return True
+        robots = await self._get_robots(url)
+        return robots.can_fetch(self.config.user_agent, url)
+
+    async def _wait_for_crawl_delay(self, url: str):
+        if not self.config.respect_robots_txt:
+            return
+        crawl_delay = (await self._get_robots(url)).crawl_delay(self.config.user_agent)
+        if not crawl_delay:
+            return
+        host_state = self._get_host_state(url)
+        async with host_state.delay_lock:
+            wait = host_state.next_request_at - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            host_state.next_request_at = time.monotonic() + float(crawl_delay)
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        dest_dir: Optional[str] = None,
+        suffix: Optional[str] = None,
+    ) -> Tuple[int, CIMultiDict, Optional[str]]:
+        """
+        Make a request within the global and per host limits.
+        If `dest_dir` is given, a successful response body is streamed to a file in it.
+        """
+        host_state = self._get_host_state(url)
+        async with self._semaphore, host_state.semaphore:
+            await self._wait_for_crawl_delay(url)
+            async with self._session.request(
+                method, url, headers=headers, allow_redirects=True
+            ) as response:
+                local_filepath = None
+                if dest_dir is not None and response.status == 200:
+                    # Could have used path as per URL but that makes us vulnerable to path traversal attacks
+                    fd, local_filepath = tempfile.mkstemp(suffix=suffix, dir=dest_dir)
+                    os.close(fd)
+                    async with aiofiles.open(local_filepath, "wb") as f:
+                        async for chunk in response.content.iter_chunked(
+                            DOWNLOAD_CHUNK_SIZE
+                        ):
+                            await f.write(chunk)
+                return response.status, response.headers.copy(), local_filepath
+
+    async def fetch(
+        self,
+        url: str,
+        previous_hash: Optional[str] = None,
+        dest_dir: Optional[str] = None,
+        suffix: Optional[str] = None,
+    ) -> CrawlResult:
+        """
+        Conditionally fetch `url` against the validators in `previous_hash`.
+        Without `dest_dir` only the headers are requested (HEAD), otherwise the body is
+        streamed to a temporary file in `dest_dir` (GET).
+        """
+        status, headers, local_filepath = await self._request(
+            "GET" if dest_dir is not None else "HEAD",
+            url,
+            headers=conditional_headers(previous_hash),
+            dest_dir=dest_dir,
+            suffix=suffix,
+        )
+        return CrawlResult(
+            url=url,
+            status=status,
+            not_modified=status == 304,
+            content_hash=previous_hash if status == 304 else get_content_hash(headers),
+            local_filepath=local_filepath,
+        )
+
+    async def _fetch_sitemap(self, sitemap_url: str) -> Optional[str]:
+        host_state = self._get_host_state(sitemap_url)
+        async with self._semaphore, host_state.semaphore:
+            await self._wait_for_crawl_delay(sitemap_url)
+            async with self._session.get(sitemap_url) as response:
+                if response.status != 200:
+                    logger.debug(f"Failed to fetch {sitemap_url}: {response.status}")
+                    return None
+                content = await response.read()
+        # Servers send gzipped sitemaps either as .xml.gz files or with Content-Encoding
+        # that aiohttp already decoded, so check the magic bytes rather than the headers
+        if content[:2] == GZIP_MAGIC:
+            content = gzip.decompress(content)
+        return content.decode("utf-8", errors="replace")
+
+    async def _get_urls_from_sitemap(
+        self, sitemap_url: str, depth: int
+    ) -> List[Tuple[str, Optional[str]]]:
+        sitemap_content = await self._fetch_sitemap(sitemap_url)
+        if not sitemap_content:
+            return []
+        soup = BeautifulSoup(sitemap_content, "xml")
+
+        # A sitemap index points to other sitemaps
+        if soup.find("sitemapindex"):
+            if depth >= self.config.max_sitemap_depth:
+                logger.warning(f"Max sitemap depth reached at {sitemap_url}")
+                return []
+            child_sitemap_urls = [
+                loc.text.strip() for loc in soup.select("sitemap > loc")
+            ]
+            logger.debug(
+                f"Found {len(child_sitemap_urls)} sitemaps in sitemap index {sitemap_url}"
+            )
+            results = await asyncio.gather(
+                *[
+                    self._get_urls_from_sitemap(child_sitemap_url, depth + 1)
+                    for child_sitemap_url in child_sitemap_urls
+                ]
+            )
+            return [url for urls in results for url in urls]
+
+        urls = []
+        for url in soup.find_all("url"):
+            loc = url.find("loc")
+            if not loc:
+                continue
+            lastmod = url.find("lastmod")
+            urls.append((loc.text.strip(), lastmod.text.strip() if lastmod else None))
+        return urls
+
+    async def _get_urls_from_sitemaps(
+        self, sitemap_urls: List[str]
+    ) -> Dict[str, Optional[str]]:
+        results = await asyncio.gather(
+            *[
+                self._get_urls_from_sitemap(sitemap_url, depth=0)
+                for sitemap_url in sitemap_urls
+            ]
+        )
+        # Preserve order and drop duplicates listed in multiple sitemaps
+        urls: Dict[str, Optional[str]] = {}
+        for sitemap_entries in results:
+            for page_url, lastmod in sitemap_entries:
+                urls.setdefault(page_url, lastmod)
+        return urls
+
+    async def get_sitemap_urls(self, url: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        Collect (url, lastmod) of all pages listed in the sitemaps of `url`.
+        Looks for `<url>/sitemap.xml` first and then for the sitemaps listed in robots.txt,
+        keeping only the pages under `url`. Sitemap index files are followed recursively
+        and gzipped sitemaps are supported.
+        """
+        urls = await self._get_urls_from_sitemaps(
+            [urljoin(f"{url.rstrip('/')}/", "sitemap.xml")]
+        )
+        if not urls and self.config.respect_robots_txt:
+            robots_sitemap_urls = (await self._get_robots(url)).site_maps() or []
+            urls = {
+                page_url: lastmod
+                for page_url, lastmod in (
+                    await self._get_urls_from_sitemaps(robots_sitemap_urls)
+                ).items()
+                if page_url.startswith(url)
+            }
+        if not urls:
+            logger.debug(f"No sitemap found for {url}")
+            return [(url, None)]
+        logger.debug(f"Found {len(urls)} URLs in the sitemaps of {url}")
+        return list(urls.items())
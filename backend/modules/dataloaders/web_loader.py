@@ -1,18 +1,19 @@
 # Author: https://github.com/paulpierre/markdown-crawler/
 # Description: A multithreaded web crawler that recursively crawls a website and creates a markdown file for each page.
+import asyncio
 import mimetypes
 import os
 import tempfile
 from datetime import date
-from typing import AsyncGenerator, Dict, List, Tuple
+from typing import AsyncGenerator, Dict, List, Optional
 
 import aiohttp
-from bs4 import BeautifulSoup
 from fastapi import HTTPException
 
 from backend.logger import logger
 from backend.modules.dataloaders.loader import BaseDataLoader
-from backend.types import DataIngestionMode, DataSource, LoadedDataPoint
+from backend.modules.dataloaders.web_crawler import CrawlerConfig, WebCrawler
+from backend.types import DataIngestionMode, DataPoint, DataSource, LoadedDataPoint
 
 DEFAULT_BASE_DIR = os.path.join(
     tempfile.gettempdir(), "webloader"
@@ -25,32 +26,6 @@ DEFAULT_DOMAIN_MATCH = True
 DEFAULT_BASE_PATH_MATCH = True
 
 
-async def fetch_sitemap(url: str) -> str:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return await response.text()
-
-
-async def extract_urls_from_sitemap(url: str) -> List[Tuple[str, str]]:
-    sitemap_url = f"{url.rstrip('/')}/sitemap.xml"
-    sitemap_content = await fetch_sitemap(sitemap_url)
-    if not sitemap_content:
-        logger.debug(f"No sitemap found for {url}")
-        return [(url, None)]
-    logger.debug(f"Found sitemap for {url} at {sitemap_url}")
-    soup = BeautifulSoup(sitemap_content, "xml")
-    urls = [
-        (
-            loc.text,
-            loc.find_next_sibling("lastmod").text
-            if loc.find_next_sibling("lastmod")
-            else None,
-        )
-        for loc in soup.find_all("loc")
-    ]
-    return urls
-
-
 class WebLoader(BaseDataLoader):
     """
     Load data from a web URL
@@ -66,6 +41,11 @@ class WebLoader(BaseDataLoader):
     ) -> AsyncGenerator[List[LoadedDataPoint], None]:
         """
         Loads data from a web URL and converts it to Markdown format.
+
+        URLs are checked concurrently by `WebCrawler`, bounded globally and per host
+        (`crawler` in the data source metadata, see `CrawlerConfig`). In incremental mode
+        pages are requested with the ETag / Last-Modified stored as their data point hash,
+        so unchanged pages are skipped on a 304 without transferring their body.
         """
 
         if not data_source.uri.startswith(("http://", "https://")):
@@ -73,77 +53,124 @@ class WebLoader(BaseDataLoader):
                 f"Invalid URL: {data_source.uri}. URL must start with http:// or https://"
             )
 
-        urls = [(data_source.uri, None)]
-
-        if data_source.metadata.get("use_sitemap", False):
-            urls = await extract_urls_from_sitemap(data_source.uri)
-            logger.debug(f"Found a total of {len(urls)} URLs.")
-
-        loaded_data_points: List[LoadedDataPoint] = []
-
-        async with aiohttp.ClientSession() as session:
-            for url, lastmod in urls:
-                content_hash = lastmod
-                # If last modified date is not available, fetch it from the web url
-                if not content_hash:
-                    logger.debug(f"Cannot find last modified date for {url}.")
-                    async with session.head(url) as response:
-                        if response.status != 200:
-                            logger.warning(
-                                f"Failed to fetch {url}: Status {response.status}"
-                            )
-                            continue
-
-                        # Use ETag or Last-Modified header as the content hash
-                        content_hash = (
-                            response.headers.get("ETag", None)
-                            or response.headers.get("Last-Modified", None)
-                            or date.today().isoformat()
-                        )
-                        logger.debug(
-                            f"Last modified date for {url}: {response.headers.get('Last-Modified', 'today')}"
+        metadata = data_source.metadata or {}
+        crawler_config = CrawlerConfig.model_validate(metadata.get("crawler") or {})
+
+        async with WebCrawler(crawler_config) as crawler:
+            urls = [(data_source.uri, None)]
+
+            if metadata.get("use_sitemap", False):
+                urls = await crawler.get_sitemap_urls(data_source.uri)
+                logger.debug(f"Found a total of {len(urls)} URLs.")
+
+            # Check a window of URLs concurrently, at least enough to saturate the crawler
+            window_size = max(batch_size, crawler_config.max_concurrency)
+            loaded_data_points: List[LoadedDataPoint] = []
+            for i in range(0, len(urls), window_size):
+                results = await asyncio.gather(
+                    *[
+                        self._load_url(
+                            crawler,
+                            url,
+                            lastmod,
+                            data_source,
+                            dest_dir,
+                            previous_snapshot,
+                            data_ingestion_mode,
                         )
-
-                else:
-                    logger.debug(f"Last modified date for {url}: {content_hash}")
-
-                if previous_snapshot.get(url) == content_hash:
-                    logger.debug(f"No changes detected for {url}")
-                    continue
-
-                extension = "url"
-                local_filepath = url
-                if mime := mimetypes.guess_type(url)[0]:
-                    extension = mimetypes.guess_extension(mime) or "url"
-
-                if extension != "url":
-                    async with session.get(url) as response:
-                        if response.status != 200:
-                            message = f"Failed to obtain data from {url}: Status {response.status}"
-                            logger.error(message)
-                            raise HTTPException(
-                                status_code=response.status, message=message
-                            )
-                        # Could have used path as per URL but that makes us vulnerable to path traversal attacks
-                        with tempfile.NamedTemporaryFile(
-                            delete=False, suffix=extension, dir=dest_dir, mode="wb"
-                        ) as temp_file:
-                            temp_file.write(await response.read())
-                            temp_file.write
-                            local_filepath = temp_file.name
-
-                loaded_data_points.append(
-                    LoadedDataPoint(
-                        data_point_hash=content_hash,
-                        data_point_uri=url,
-                        data_source_fqn=f"web::{url}",
-                        local_filepath=local_filepath,
-                        file_extension=extension,
-                    )
+                        for url, lastmod in urls[i : i + window_size]
+                    ]
                 )
-
-                if len(loaded_data_points) >= batch_size:
-                    yield loaded_data_points
-                    loaded_data_points = []
+                for loaded_data_point in results:
+                    if loaded_data_point is None:
+                        continue
+                    loaded_data_points.append(loaded_data_point)
+                    if len(loaded_data_points) >= batch_size:
+                        yield loaded_data_points
+                        loaded_data_points = []
 
             yield loaded_data_points
+
+    async def _load_url(
+        self,
+        crawler: WebCrawler,
+        url: str,
+        lastmod: Optional[str],
+        data_source: DataSource,
+        dest_dir: str,
+        previous_snapshot: Dict[str, str],
+        data_ingestion_mode: DataIngestionMode,
+    ) -> Optional[LoadedDataPoint]:
+        """
+        Check a single URL for changes and download it if it is not parsed from the web directly.
+        Returns None if the URL is unchanged or could not be fetched.
+        """
+        previous_hash = None
+        if data_ingestion_mode == DataIngestionMode.INCREMENTAL:
+            previous_hash = previous_snapshot.get(
+                DataPoint(
+                    data_source_fqn=data_source.fqn,
+                    data_point_uri=url,
+                    data_point_hash="",
+                ).data_point_fqn
+            )
+
+        if lastmod:
+            logger.debug(f"Last modified date for {url}: {lastmod}")
+            if previous_hash == lastmod:
+                logger.debug(f"No changes detected for {url}")
+                return None
+
+        if not await crawler.is_allowed(url):
+            logger.warning(f"Skipping {url}: disallowed by robots.txt")
+            return None
+
+        extension = "url"
+        local_filepath = url
+        if mime := mimetypes.guess_type(url)[0]:
+            extension = mimetypes.guess_extension(mime) or "url"
+
+        content_hash = lastmod
+        # Pages are parsed straight from the web, so only their headers are needed unless
+        # the sitemap already told us they changed
+        if extension != "url" or not content_hash:
+            try:
+                result = await crawler.fetch(
+                    url,
+                    # Validators are only useful if we have nothing better from the sitemap
+                    previous_hash=None if lastmod else previous_hash,
+                    dest_dir=dest_dir if extension != "url" else None,
+                    suffix=extension,
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Failed to fetch {url}: {e!r}")
+                return None
+
+            if result.not_modified:
+                logger.debug(f"No changes detected for {url}")
+                return None
+
+            if result.status != 200:
+                message = f"Failed to obtain data from {url}: Status {result.status}"
+                if extension == "url":
+                    logger.warning(message)
+                    return None
+                logger.error(message)
+                raise HTTPException(status_code=result.status, detail=message)
+
+            if extension != "url":
+                local_filepath = result.local_filepath
+
+            if not content_hash:
+                logger.debug(f"Cannot find last modified date for {url}.")
+                # Use ETag or Last-Modified header as the content hash
+                content_hash = result.content_hash or date.today().isoformat()
+                logger.debug(f"Content hash for {url}: {content_hash}")
+
+        return LoadedDataPoint(
+            data_point_hash=content_hash,
+            data_point_uri=url,
+            data_source_fqn=data_source.fqn,
+            local_filepath=local_filepath,
+            file_extension=extension,
+        )
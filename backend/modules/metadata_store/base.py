@@ -10,6 +10,7 @@ from backend.types import (
     DataIngestionRun,
     DataIngestionRunStatus,
     DataSource,
+    DedupIndexEntry,
     MetadataStoreConfig,
     RagApplication,
     RagApplicationDto,
@@ -183,6 +184,58 @@ class BaseMetadataStore(ABC):
         """
         raise NotImplementedError()
 
+    @abstractmethod
+    async def alog_stats_for_data_ingestion_run(
+        self, data_ingestion_run_name: str, stats: Dict[str, Any]
+    ):
+        """
+        Log stats (e.g. peak workspace disk usage) for a data ingestion run in the metadata store
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def arenew_data_ingestion_run_lease(
+        self, data_ingestion_run_name: str, lease_seconds: Optional[int]
+    ):
+        """
+        Mark a data ingestion run as in progress for the next `lease_seconds`, or release
+        its lease if `lease_seconds` is None
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def aget_leased_data_ingestion_runs(
+        self, collection_name: str
+    ) -> List[DataIngestionRun]:
+        """
+        Get the data ingestion runs of a collection holding an unexpired lease
+        """
+        raise NotImplementedError()
+
+    ####
+    # CHUNK DEDUPLICATION
+    ####
+
+    @abstractmethod
+    async def aget_dedup_index(self, collection_name: str) -> List[DedupIndexEntry]:
+        """
+        Get the chunk deduplication index of a collection
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def aupdate_dedup_index(
+        self,
+        collection_name: str,
+        entries: List[DedupIndexEntry],
+        deleted_data_point_fqns: List[str],
+    ):
+        """
+        Upsert the given entries of the chunk deduplication index of a collection and delete
+        the entries of `deleted_data_point_fqns`, other entries are left untouched
+        """
+        raise NotImplementedError()
+
     ####
     # RAG APPLICATIONS
     ####
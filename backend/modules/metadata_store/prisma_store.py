@@ -2,6 +2,7 @@ import asyncio
 import json
 import random
 import string
+from datetime import datetime, timedelta, timezone
 from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 from fastapi import HTTPException
@@ -19,6 +20,7 @@ from backend.types import (
     DataIngestionRun,
     DataIngestionRunStatus,
     DataSource,
+    DedupIndexEntry,
     RagApplication,
 )
 
@@ -26,9 +28,13 @@ if TYPE_CHECKING:
     # TODO (chiragjn): Can we import these safely even if the prisma client might not be generated yet?
     from prisma.models import Collection as PrismaCollection
     from prisma.models import DataSource as PrismaDataSource
+    from prisma.models import DedupIndexEntries as PrismaDedupIndexEntry
     from prisma.models import IngestionRuns as PrismaDataIngestionRun
     from prisma.models import RagApps as PrismaRagApplication
 
+# Entries of the chunk deduplication index written per transaction
+DEDUP_INDEX_WRITE_BATCH_SIZE = 500
+
 # TODO (chiragjn):
 #   - Use transactions!
 #   - Some methods are using json.dumps - not sure if this is the right way to send data via prisma client
@@ -99,6 +105,11 @@ class PrismaStore(BaseMetadataStore):
                 )
                 logger.info(f"Deleted ingestion runs for collection {collection_name}")
 
+            # The dedup index describes the vectors of the collection
+            await transaction.dedupindexentries.delete_many(
+                where={"collection_name": collection_name}
+            )
+
             # Delete the collection
             deleted_collection = await transaction.collection.delete(
                 where={"name": collection_name}
@@ -376,6 +387,118 @@ class PrismaStore(BaseMetadataStore):
                 detail=f"Failed to update ingestion run {data_ingestion_run_name!r}. No such record found",
             )
 
+    async def alog_stats_for_data_ingestion_run(
+        self, data_ingestion_run_name: str, stats: Dict[str, Any]
+    ) -> None:
+        """Log stats for the given data ingestion run"""
+        updated_data_ingestion_run: Optional[
+            "PrismaDataIngestionRun"
+        ] = await self.db.ingestionruns.update(
+            where={"name": data_ingestion_run_name},
+            data={"stats": json.dumps(stats)},
+        )
+        if not updated_data_ingestion_run:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Failed to update ingestion run {data_ingestion_run_name!r}. No such record found",
+            )
+
+    async def arenew_data_ingestion_run_lease(
+        self, data_ingestion_run_name: str, lease_seconds: Optional[int]
+    ) -> None:
+        """Renew or release the lease of the given data ingestion run"""
+        lease_expires_at = None
+        if lease_seconds is not None:
+            lease_expires_at = datetime.now(timezone.utc) + timedelta(
+                seconds=lease_seconds
+            )
+        updated_data_ingestion_run: Optional[
+            "PrismaDataIngestionRun"
+        ] = await self.db.ingestionruns.update(
+            where={"name": data_ingestion_run_name},
+            data={"lease_expires_at": lease_expires_at},
+        )
+        if not updated_data_ingestion_run:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Failed to update ingestion run {data_ingestion_run_name!r}. No such record found",
+            )
+
+    async def aget_leased_data_ingestion_runs(
+        self, collection_name: str
+    ) -> List[DataIngestionRun]:
+        """Get the data ingestion runs of a collection holding an unexpired lease"""
+        data_ingestion_runs: List[
+            "PrismaDataIngestionRun"
+        ] = await self.db.ingestionruns.find_many(
+            where={
+                "collection_name": collection_name,
+                "lease_expires_at": {"gt": datetime.now(timezone.utc)},
+            }
+        )
+        return [
+            DataIngestionRun.model_validate(data_ir.model_dump())
+            for data_ir in data_ingestion_runs
+        ]
+
+    ######
+    # CHUNK DEDUPLICATION APIS
+    ######
+    async def aget_dedup_index(self, collection_name: str) -> List[DedupIndexEntry]:
+        """Get the chunk deduplication index of a collection"""
+        entries: List[
+            "PrismaDedupIndexEntry"
+        ] = await self.db.dedupindexentries.find_many(
+            where={"collection_name": collection_name}
+        )
+        return [DedupIndexEntry.model_validate(entry.model_dump()) for entry in entries]
+
+    async def aupdate_dedup_index(
+        self,
+        collection_name: str,
+        entries: List[DedupIndexEntry],
+        deleted_data_point_fqns: List[str],
+    ) -> None:
+        """
+        Replace and delete entries of the chunk deduplication index of a collection. Entries are
+        written in batches, each one replaced with a delete and a bulk insert in its own short
+        transaction, so large runs stay within the transaction timeout.
+        """
+        for i in range(0, len(deleted_data_point_fqns), DEDUP_INDEX_WRITE_BATCH_SIZE):
+            await self.db.dedupindexentries.delete_many(
+                where={
+                    "collection_name": collection_name,
+                    "data_point_fqn": {
+                        "in": deleted_data_point_fqns[
+                            i : i + DEDUP_INDEX_WRITE_BATCH_SIZE
+                        ]
+                    },
+                }
+            )
+        for i in range(0, len(entries), DEDUP_INDEX_WRITE_BATCH_SIZE):
+            batch_entries = entries[i : i + DEDUP_INDEX_WRITE_BATCH_SIZE]
+            data = []
+            for entry in batch_entries:
+                entry_dict = entry.model_dump(mode="json")
+                data.append(
+                    {
+                        "collection_name": collection_name,
+                        "data_point_fqn": entry.data_point_fqn,
+                        "chunks": json.dumps(entry_dict["chunks"]),
+                        "skipped_chunks": json.dumps(entry_dict["skipped_chunks"]),
+                    }
+                )
+            async with self.db.tx() as transaction:
+                await transaction.dedupindexentries.delete_many(
+                    where={
+                        "collection_name": collection_name,
+                        "data_point_fqn": {
+                            "in": [entry.data_point_fqn for entry in batch_entries]
+                        },
+                    }
+                )
+                await transaction.dedupindexentries.create_many(data=data)
+
     ######
     # RAG APPLICATION APIS
     ######
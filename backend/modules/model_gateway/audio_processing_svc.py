@@ -1,7 +1,10 @@
+import os
 from typing import AsyncIterator, Optional
 
-import aiofiles
-import aiohttp
+import httpx
+
+# Transcriptions stream for as long as the audio takes to process
+TRANSCRIPTION_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
 
 
 class AudioProcessingSvc:
@@ -10,10 +13,19 @@ class AudioProcessingSvc:
     # Github: https://github.com/fedirz/faster-whisper-server
     """
 
-    def __init__(self, *, base_url: str, model: str, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        model: str,
+        api_key: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
         self.model = model
         self.base_url = base_url
         self.api_key = api_key
+        # Pooled client shared with the other models of the provider, see `HttpClientPool`
+        self.http_client = http_client
         self.data = {
             "model": self.model,
             "temperature": 0.1,
@@ -27,26 +39,36 @@ class AudioProcessingSvc:
         """
         Get streaming audio transcription from Faster-Whisper Server
         """
-        async with aiohttp.ClientSession() as session:
-            async with aiofiles.open(audio_file_path, "rb") as f:
-                file_data = await f.read()
+        if self.http_client is None:
+            async with httpx.AsyncClient() as http_client:
+                async for line in self._stream_transcription(
+                    http_client, audio_file_path
+                ):
+                    yield line
+            return
 
-            data = aiohttp.FormData()
-            data.add_field("file", file_data, filename="audio.wav")
-            for key, value in self.data.items():
-                data.add_field(key, str(value))
+        async for line in self._stream_transcription(self.http_client, audio_file_path):
+            yield line
 
-            headers = {"accept": "application/json"}
-            if self.api_key:
-                headers["Authorization"] = f"Bearer {self.api_key}"
+    async def _stream_transcription(
+        self, http_client: httpx.AsyncClient, audio_file_path: str
+    ) -> AsyncIterator[str]:
+        headers = {"accept": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
 
-            async with session.post(
+        # The file object is streamed in chunks by httpx instead of being read into memory
+        with open(audio_file_path, "rb") as f:
+            async with http_client.stream(
+                "POST",
                 self.base_url.rstrip("/") + "/v1/audio/transcriptions",
                 headers=headers,
-                data=data,
+                files={"file": (os.path.basename(audio_file_path), f)},
+                data={key: str(value) for key, value in self.data.items()},
+                timeout=TRANSCRIPTION_TIMEOUT,
             ) as response:
                 response.raise_for_status()
-                async for line in response.content:
+                async for line in response.aiter_lines():
                     line = line.strip()
                     if line:
-                        yield line.decode("utf-8").split("data: ")[1]
+                        yield line.split("data: ")[1]
@@ -0,0 +1,335 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from backend.logger import logger
+from backend.types import ConfiguredBaseModel
+
+T = TypeVar("T")
+
+
+class EndpointRoutingConfig(ConfiguredBaseModel):
+    """
+    Routing of a provider with several `base_urls`, set under `routing` in models_config.yaml
+    hedge: Fire a second request on another endpoint if the first token has not arrived within
+        the p95 time to first token, the slower of the two is cancelled
+    """
+
+    ewma_alpha: float = 0.2
+    failure_threshold: int = 3
+    cooldown_seconds: float = 30.0
+    hedge: bool = False
+    hedge_min_samples: int = 20
+    hedge_min_delay_seconds: float = 0.05
+    latency_window: int = 200
+
+
+class _EndpointState:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.ewma_ttft: Optional[float] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+
+class EndpointRouter:
+    """
+    Picks the endpoint with the lowest expected time to first token (EWMA, scaled by the
+    requests in flight) among the endpoints whose circuit is closed. After `failure_threshold`
+    consecutive failures the circuit of an endpoint opens for `cooldown_seconds`, then a single
+    request is let through and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, base_urls: List[str], config: EndpointRoutingConfig):
+        self.config = config
+        self.endpoints = [_EndpointState(base_url) for base_url in base_urls]
+        self._ttfts: Deque[float] = deque(maxlen=config.latency_window)
+        self._lock = threading.Lock()
+
+    def _score(self, endpoint: _EndpointState) -> float:
+        # Endpoints without samples yet are tried first so that every endpoint gets measured
+        ewma_ttft = endpoint.ewma_ttft if endpoint.ewma_ttft is not None else 0.0
+        return ewma_ttft * (1 + endpoint.in_flight)
+
+    def acquire(self, exclude: Set[int] = frozenset()) -> Optional[int]:
+        """
+        Returns the index of the endpoint to send the next request to, or None if every
+        endpoint is excluded
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [i for i in range(len(self.endpoints)) if i not in exclude]
+            if not candidates:
+                return None
+            closed = [i for i in candidates if self.endpoints[i].open_until <= now]
+            if closed:
+                index = min(closed, key=lambda i: self._score(self.endpoints[i]))
+            else:
+                # Every circuit is open, try the one that closes first rather than failing outright
+                index = min(candidates, key=lambda i: self.endpoints[i].open_until)
+            endpoint = self.endpoints[index]
+            if endpoint.consecutive_failures >= self.config.failure_threshold:
+                # Half open, keep the circuit open for others while this trial request runs
+                endpoint.open_until = now + self.config.cooldown_seconds
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return index
+
+    def release(
+        self,
+        index: int,
+        ttft: Optional[float] = None,
+        failed: bool = False,
+        cancelled: bool = False,
+    ):
+        """
+        Record the outcome of a request. The `ttft` of a request cancelled by a hedge is only
+        a lower bound, it still moves the EWMA so that slow endpoints lose traffic.
+        """
+        with self._lock:
+            endpoint = self.endpoints[index]
+            endpoint.in_flight -= 1
+            if failed:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.config.failure_threshold:
+                    logger.warning(
+                        f"Opening circuit of {endpoint.base_url} for {self.config.cooldown_seconds}s "
+                        f"after {endpoint.consecutive_failures} consecutive failures"
+                    )
+                    endpoint.open_until = (
+                        time.monotonic() + self.config.cooldown_seconds
+                    )
+                return
+            if ttft is None:
+                return
+            endpoint.consecutive_failures = 0
+            endpoint.open_until = 0.0
+            alpha = self.config.ewma_alpha
+            endpoint.ewma_ttft = (
+                ttft
+                if endpoint.ewma_ttft is None
+                else alpha * ttft + (1 - alpha) * endpoint.ewma_ttft
+            )
+            if not cancelled:
+                self._ttfts.append(ttft)
+
+    def get_hedge_delay(self) -> Optional[float]:
+        """
+        p95 of the recent times to first token, None until there are enough samples
+        """
+        if not self.config.hedge or len(self.endpoints) < 2:
+            return None
+        ttfts = sorted(self._ttfts)
+        if len(ttfts) < self.config.hedge_min_samples:
+            return None
+        return max(
+            ttfts[int(0.95 * (len(ttfts) - 1))], self.config.hedge_min_delay_seconds
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            endpoint.base_url: {
+                "ewma_ttft_seconds": endpoint.ewma_ttft,
+                "in_flight": endpoint.in_flight,
+                "requests": endpoint.requests,
+                "failures": endpoint.failures,
+                "circuit_open": endpoint.open_until > now,
+            }
+            for endpoint in self.endpoints
+        }
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    Chat model spreading requests over one chat model per endpoint with an `EndpointRouter`.
+    Requests that fail before their first token fail over to the next best endpoint, async
+    requests are hedged when the router has a hedge delay.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    llms: List[BaseChatModel]
+    router: EndpointRouter
+
+    @property
+    def _llm_type(self) -> str:
+        return f"routed-{self.llms[0]._llm_type}"
+
+    def _call_with_failover(self, call: Callable[[BaseChatModel], T]) -> T:
+        tried: Set[int] = set()
+        last_error: Optional[Exception] = None
+        while True:
+            index = self.router.acquire(exclude=tried)
+            if index is None:
+                raise last_error
+            tried.add(index)
+            start = time.monotonic()
+            try:
+                result = call(self.llms[index])
+            except Exception as e:
+                self.router.release(index, failed=True)
+                logger.warning(
+                    f"Request to {self.router.endpoints[index].base_url} failed: {e}"
+                )
+                last_error = e
+                continue
+            self.router.release(index, ttft=time.monotonic() - start)
+            return result
+
+    async def _race(
+        self, attempt: Callable[[BaseChatModel], Awaitable[T]]
+    ) -> Tuple[T, List[asyncio.Task]]:
+        """
+        Run `attempt` on the best endpoint, hedge it on a second endpoint if it has not finished
+        within the hedge delay and fail over to the next endpoint when it fails.
+        Returns the first successful result and the tasks of the attempts that lost.
+        """
+        tried: Set[int] = set()
+        pending: Dict[asyncio.Task, Tuple[int, float]] = {}
+        last_error: Optional[Exception] = None
+
+        def _start() -> bool:
+            index = self.router.acquire(exclude=tried)
+            if index is None:
+                return False
+            tried.add(index)
+            task = asyncio.create_task(attempt(self.llms[index]))
+            pending[task] = (index, time.monotonic())
+            return True
+
+        _start()
+        hedge_delay = self.router.get_hedge_delay()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # Hedge once, the slower request is cancelled as soon as one succeeds
+                    hedge_delay = None
+                    if _start():
+                        logger.debug("Hedging request on a second endpoint")
+                    continue
+                for task in done:
+                    index, start = pending.pop(task)
+                    if task.exception() is not None:
+                        self.router.release(index, failed=True)
+                        last_error = task.exception()
+                        logger.warning(
+                            f"Request to {self.router.endpoints[index].base_url} failed: {last_error}"
+                        )
+                        continue
+                    self.router.release(index, ttft=time.monotonic() - start)
+                    # Everything still pending lost, including attempts that finished at the same time
+                    return task.result(), list(pending.keys())
+                if not pending:
+                    _start()
+        finally:
+            for task, (index, start) in pending.items():
+                task.cancel()
+                self.router.release(
+                    index, ttft=time.monotonic() - start, cancelled=True
+                )
+        raise last_error
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self._call_with_failover(
+            lambda llm: llm._generate(messages, stop=stop, **kwargs)
+        )
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, _ = await self._race(
+            lambda llm: llm._agenerate(messages, stop=stop, **kwargs)
+        )
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        def _first_chunk(llm: BaseChatModel):
+            iterator = llm._stream(messages, stop=stop, **kwargs)
+            return iterator, next(iterator, None)
+
+        iterator, chunk = self._call_with_failover(_first_chunk)
+        while chunk is not None:
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            chunk = next(iterator, None)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async def _first_chunk(llm: BaseChatModel):
+            iterator = llm._astream(messages, stop=stop, **kwargs)
+            try:
+                return iterator, await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, None
+
+        (iterator, chunk), losers = await self._race(_first_chunk)
+        # Close the streams of attempts that got their first token at the same time
+        for loser in losers:
+            if loser.done() and not loser.cancelled() and loser.exception() is None:
+                await loser.result()[0].aclose()
+        try:
+            while chunk is not None:
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            pass
+        finally:
+            await iterator.aclose()
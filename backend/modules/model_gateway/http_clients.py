@@ -0,0 +1,128 @@
+import importlib.util
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from backend.logger import logger
+from backend.settings import settings
+
+# httpx only speaks HTTP/2 with the optional `h2` package (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class _PooledClients:
+    """
+    One sync and one async client sharing the limits of a provider base url, with request counters
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.requests = 0
+        self.errors = 0
+        self.http_versions: Counter = Counter()
+        http2 = settings.MODEL_GATEWAY_HTTP2 and HTTP2_AVAILABLE
+        # Only https negotiates HTTP/2 (ALPN), plain http model servers stay on HTTP/1.1.
+        # Providers without a base url use the https endpoint of their SDK.
+        http2 = http2 and urlparse(base_url).scheme != "http"
+        client_kwargs = dict(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.MODEL_GATEWAY_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.MODEL_GATEWAY_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.MODEL_GATEWAY_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                settings.MODEL_GATEWAY_TIMEOUT_SECONDS,
+                connect=settings.MODEL_GATEWAY_CONNECT_TIMEOUT_SECONDS,
+            ),
+        )
+        self.client = httpx.Client(
+            event_hooks={
+                "request": [self._on_request],
+                "response": [self._on_response],
+            },
+            **client_kwargs,
+        )
+        self.async_client = httpx.AsyncClient(
+            event_hooks={
+                "request": [self._aon_request],
+                "response": [self._aon_response],
+            },
+            **client_kwargs,
+        )
+
+    def _on_request(self, request: httpx.Request):
+        self.requests += 1
+
+    def _on_response(self, response: httpx.Response):
+        self.http_versions[response.http_version] += 1
+        if response.status_code >= 500:
+            self.errors += 1
+
+    async def _aon_request(self, request: httpx.Request):
+        self._on_request(request)
+
+    async def _aon_response(self, response: httpx.Response):
+        self._on_response(response)
+
+    @staticmethod
+    def _get_connection_stats(client: Any) -> Dict[str, int]:
+        # httpx does not expose its connection pool, read it from httpcore when available
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        return {
+            "connections": len(connections),
+            "idle_connections": sum(
+                1 for connection in connections if connection.is_idle()
+            ),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "server_errors": self.errors,
+            "http_versions": dict(self.http_versions),
+            "sync_pool": self._get_connection_stats(self.client),
+            "async_pool": self._get_connection_stats(self.async_client),
+        }
+
+
+class HttpClientPool:
+    """
+    Owns the HTTP clients of the model gateway, one pooled sync and async client per provider
+    base url. All model clients of a provider share them, so connections (and TLS sessions)
+    are kept alive and reused across chat, embedding, reranking and audio requests.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, _PooledClients] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, base_url: str) -> _PooledClients:
+        if base_url not in self._clients:
+            with self._lock:
+                if base_url not in self._clients:
+                    logger.debug(f"Creating pooled HTTP clients for {base_url}")
+                    self._clients[base_url] = _PooledClients(base_url)
+        return self._clients[base_url]
+
+    def get_client(self, base_url: Optional[str]) -> httpx.Client:
+        # Providers without a base url (e.g. openai) are keyed by their default endpoint
+        return self._get(base_url or "default").client
+
+    def get_async_client(self, base_url: Optional[str]) -> httpx.AsyncClient:
+        return self._get(base_url or "default").async_client
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            base_url: clients.get_stats() for base_url, clients in self._clients.items()
+        }
+
+    async def aclose(self):
+        for clients in self._clients.values():
+            clients.client.close()
+            await clients.async_client.aclose()
+        self._clients = {}
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain.embeddings.base import Embeddings
+
+from backend.logger import logger
+from backend.types import ConfiguredBaseModel
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+
+class LocalEmbeddingsConfig(ConfiguredBaseModel):
+    """
+    Parameters of a provider with `api_format: local`, set under `parameters` in models_config.yaml
+    backend: `onnx` (ONNX Runtime) or `torch`
+    max_workers: Threads running inference batches, defaults to the number of cores
+    max_batch_tokens: Upper bound of (texts x longest text in tokens) per batch
+    """
+
+    backend: str = "onnx"
+    max_workers: Optional[int] = None
+    max_batch_size: int = 64
+    max_batch_tokens: int = 16384
+    normalize_embeddings: bool = True
+    cache_folder: Optional[str] = None
+
+
+class LocalEmbeddingsSvc(Embeddings):
+    """
+    Embeddings computed in-process on CPU with sentence-transformers (ONNX Runtime or torch).
+    Texts are sorted by token length and packed into batches of similar length, batches run
+    concurrently on a thread pool (ONNX Runtime and torch release the GIL during inference).
+    """
+
+    def __init__(self, model: str, config: Optional[Dict[str, Any]] = None):
+        if SentenceTransformer is None:
+            raise ImportError(
+                "sentence-transformers is required for local embedding models. "
+                "Install it with `pip install sentence-transformers[onnx]`"
+            )
+        self.model_name = model
+        self.config = LocalEmbeddingsConfig.model_validate(config or {})
+        self.max_workers = self.config.max_workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="local-embeddings"
+        )
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self) -> "SentenceTransformer":
+        # Loading takes seconds, do it once and only when the model is first used
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    logger.info(
+                        f"Loading local embedding model {self.model_name} with {self.config.backend} backend"
+                    )
+                    self._model = SentenceTransformer(
+                        self.model_name,
+                        device="cpu",
+                        backend=self.config.backend,
+                        cache_folder=self.config.cache_folder,
+                    )
+        return self._model
+
+    def warm_up(self):
+        """
+        Load the model and run one inference so that the first request does not pay for it
+        """
+        self.embed_query("warm up")
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=self.config.normalize_embeddings,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).tolist()
+
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Group text indices into batches of similar token length, so that padding is minimal
+        and every batch stays within `max_batch_tokens`
+        """
+        max_seq_length = self.model.max_seq_length or 512
+        token_lengths = [
+            min(len(input_ids), max_seq_length)
+            for input_ids in self.model.tokenizer(
+                texts, add_special_tokens=True, truncation=False
+            )["input_ids"]
+        ]
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        for index in sorted(range(len(texts)), key=lambda i: token_lengths[i]):
+            # Sorted ascending, so the current text is the longest of the batch
+            if batch and (
+                len(batch) >= self.config.max_batch_size
+                or (len(batch) + 1) * token_lengths[index]
+                > self.config.max_batch_tokens
+            ):
+                batches.append(batch)
+                batch = []
+            batch.append(index)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self._make_batches(texts)
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, batch_embeddings in zip(
+            batches,
+            self._executor.map(
+                lambda batch: self._encode([texts[i] for i in batch]), batches
+            ),
+        ):
+            for index, embedding in zip(batch, batch_embeddings):
+                embeddings[index] = embedding
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        # A single text needs no batching or thread hop, this is the latency critical path
+        return self._encode([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.embed_documents, texts
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.embed_query, text
+        )
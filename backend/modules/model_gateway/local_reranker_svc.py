@@ -0,0 +1,139 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain.callbacks.manager import Callbacks
+from langchain.docstore.document import Document
+from langchain.retrievers.document_compressors.base import BaseDocumentCompressor
+
+from backend.logger import logger
+from backend.types import ConfiguredBaseModel
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:
+    CrossEncoder = None
+
+
+class LocalCrossEncoderConfig(ConfiguredBaseModel):
+    """
+    Parameters of a provider with `api_format: local`, set under `parameters` in models_config.yaml
+    backend: `onnx` (ONNX Runtime) or `torch`
+    max_workers: Threads scoring batches of pairs, bounded to keep room for request handling
+    max_length: Tokens of a (query, document) pair, longer documents are truncated
+    """
+
+    backend: str = "onnx"
+    max_workers: Optional[int] = None
+    max_batch_size: int = 16
+    max_length: int = 512
+    cache_folder: Optional[str] = None
+
+
+class LocalCrossEncoder:
+    """
+    A cross-encoder loaded once per process and shared by the rerankers of every top_k.
+    Pairs are sorted by length and scored in batches of similar length on a bounded thread pool.
+    """
+
+    def __init__(self, model: str, config: Optional[Dict[str, Any]] = None):
+        if CrossEncoder is None:
+            raise ImportError(
+                "sentence-transformers is required for local reranking models. "
+                "Install it with `pip install sentence-transformers[onnx]`"
+            )
+        self.model_name = model
+        self.config = LocalCrossEncoderConfig.model_validate(config or {})
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_workers or min(4, os.cpu_count() or 1),
+            thread_name_prefix="local-reranker",
+        )
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self) -> "CrossEncoder":
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    logger.info(
+                        f"Loading local reranking model {self.model_name} with {self.config.backend} backend"
+                    )
+                    self._model = CrossEncoder(
+                        self.model_name,
+                        device="cpu",
+                        backend=self.config.backend,
+                        max_length=self.config.max_length,
+                        cache_folder=self.config.cache_folder,
+                    )
+        return self._model
+
+    def warm_up(self):
+        """
+        Load the model and score one pair so that the first request does not pay for it
+        """
+        self.score("warm up", ["warm up"])
+
+    def _predict(self, pairs: List[List[str]]) -> List[float]:
+        return self.model.predict(
+            pairs,
+            batch_size=len(pairs),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).tolist()
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        Relevance score of every text for the query, in the order of `texts`
+        """
+        if not texts:
+            return []
+        # Pairs are truncated to max_length tokens, so longer texts do not cost more past it
+        max_chars = self.config.max_length * 8
+        order = sorted(range(len(texts)), key=lambda i: min(len(texts[i]), max_chars))
+        batch_size = self.config.max_batch_size
+        batches = [
+            order[start : start + batch_size]
+            for start in range(0, len(order), batch_size)
+        ]
+        scores: List[Optional[float]] = [None] * len(texts)
+        for batch, batch_scores in zip(
+            batches,
+            self._executor.map(
+                lambda batch: self._predict([[query, texts[i]] for i in batch]),
+                batches,
+            ),
+        ):
+            for index, score in zip(batch, batch_scores):
+                scores[index] = score
+        return scores
+
+
+class LocalRerankerSvc(BaseDocumentCompressor):
+    """
+    Reranker Service that scores documents with an in-process cross-encoder
+    """
+
+    cross_encoder: Any
+    top_k: int
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        """Compress retrieved documents given the query context."""
+        scores = self.cross_encoder.score(
+            query, [doc.page_content for doc in documents]
+        )
+        ranked = sorted(zip(documents, scores), key=lambda item: item[1], reverse=True)[
+            : self.top_k
+        ]
+
+        ranked_documents = list()
+        for document, score in ranked:
+            document.metadata["relevance_score"] = score
+            ranked_documents.append(document)
+        return ranked_documents
@@ -0,0 +1,45 @@
+import math
+from typing import List
+
+from langchain.embeddings.base import Embeddings
+
+
+class MatryoshkaEmbeddings(Embeddings):
+    """
+    Wraps an embedder and keeps only the first `dimensions` components of every embedding,
+    renormalized to unit length. Used for both documents and queries, so that stored
+    vectors and query vectors always live in the same truncated space.
+    """
+
+    def __init__(self, embeddings: Embeddings, dimensions: int):
+        self.embeddings = embeddings
+        self.dimensions = dimensions
+
+    def _truncate(self, embedding: List[float]) -> List[float]:
+        if len(embedding) < self.dimensions:
+            raise ValueError(
+                f"Cannot truncate embeddings of {len(embedding)} dimensions to {self.dimensions} dimensions"
+            )
+        truncated = embedding[: self.dimensions]
+        norm = math.sqrt(math.fsum(value * value for value in truncated))
+        if norm == 0:
+            return truncated
+        return [value / norm for value in truncated]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [
+            self._truncate(embedding)
+            for embedding in self.embeddings.embed_documents(texts)
+        ]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._truncate(self.embeddings.embed_query(text))
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [
+            self._truncate(embedding)
+            for embedding in await self.embeddings.aembed_documents(texts)
+        ]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._truncate(await self.embeddings.aembed_query(text))
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Any, Dict, List, Tuple
 
 import yaml
 from cachetools import Cache
@@ -10,12 +10,26 @@ from langchain_openai.chat_models import ChatOpenAI
 
 from backend.logger import logger
 from backend.modules.model_gateway.audio_processing_svc import AudioProcessingSvc
+from backend.modules.model_gateway.endpoint_routing import (
+    EndpointRouter,
+    EndpointRoutingConfig,
+    RoutedChatModel,
+)
+from backend.modules.model_gateway.http_clients import HttpClientPool
+from backend.modules.model_gateway.local_embeddings_svc import LocalEmbeddingsSvc
+from backend.modules.model_gateway.local_reranker_svc import (
+    LocalCrossEncoder,
+    LocalRerankerSvc,
+)
+from backend.modules.model_gateway.matryoshka_embeddings import MatryoshkaEmbeddings
 from backend.modules.model_gateway.reranker_svc import InfinityRerankerSvc
 from backend.settings import settings
-from backend.types import ModelConfig, ModelProviderConfig, ModelType
+from backend.types import EmbedderConfig, ModelConfig, ModelProviderConfig, ModelType
 
 # Maximum number of model instances to cache
 MAX_CACHE_SIZE = 50
+# Models of providers with this api format run in-process instead of behind an API
+LOCAL_API_FORMAT = "local"
 
 # Helper function to create a fixed-size cache
 # Returns: Cache object with specified max size
@@ -38,11 +52,19 @@ class ModelGateway:
             _llm_cache: Stores LLM model instances
             _reranker_cache: Stores reranking model instances
             _audio_cache: Stores audio model instances
+            _cross_encoders: Stores in-process reranking models, shared by all top_k and never evicted
+
+        HTTP clients:
+            http_clients: Pooled sync and async HTTP clients per provider base url, injected into
+                every model client so that connections are reused across models and requests
         """
         self._embedder_cache = create_cache()
         self._llm_cache = create_cache()
         self._reranker_cache = create_cache()
         self._audio_cache = create_cache()
+        self._cross_encoders: Dict[str, LocalCrossEncoder] = {}
+        self._endpoint_routers: Dict[Tuple[str, bool], EndpointRouter] = {}
+        self.http_clients = HttpClientPool()
 
         # Load configs and initialize models
         logger.info(f"Loading models config from {settings.MODELS_CONFIG_PATH}")
@@ -216,15 +238,75 @@ class ModelGateway:
             api_key = self._get_api_key(provider_config)
             model_id = "/".join(model_name.split("/")[1:])
 
-            self._embedder_cache[model_name] = OpenAIEmbeddings(
-                openai_api_key=api_key,
-                model=model_id,
-                openai_api_base=provider_config.base_url,
-                check_embedding_ctx_length=(provider_config.provider_name == "openai"),
-            )
+            if provider_config.api_format == LOCAL_API_FORMAT:
+                self._embedder_cache[model_name] = LocalEmbeddingsSvc(
+                    model=model_id, config=provider_config.parameters
+                )
+            else:
+                self._embedder_cache[model_name] = OpenAIEmbeddings(
+                    openai_api_key=api_key,
+                    model=model_id,
+                    openai_api_base=provider_config.base_url,
+                    check_embedding_ctx_length=(
+                        provider_config.provider_name == "openai"
+                    ),
+                    http_client=self.http_clients.get_client(provider_config.base_url),
+                    http_async_client=self.http_clients.get_async_client(
+                        provider_config.base_url
+                    ),
+                )
 
         return self._embedder_cache[model_name]
 
+    def warm_up_local_models(self):
+        """
+        Load every in-process embedding and reranking model and run one inference, so that
+        the first requests after startup do not pay for loading the model.
+        """
+        local_models = [
+            (model_config.name, self.get_embedder_from_model_config)
+            for model_config in self.embedding_models
+        ] + [
+            (model_config.name, self._get_cross_encoder)
+            for model_config in self.reranker_models
+        ]
+        for model_name, get_model in local_models:
+            provider_config = self.model_name_to_provider_config[model_name]
+            if provider_config.api_format != LOCAL_API_FORMAT:
+                continue
+            try:
+                get_model(model_name).warm_up()
+                logger.info(f"Warmed up local model {model_name}")
+            except Exception as e:
+                logger.exception(f"Failed to warm up local model {model_name}: {e}")
+
+    def get_embedder_from_embedder_config(
+        self, embedder_config: EmbedderConfig
+    ) -> Embeddings:
+        """
+        Get the embedder of a collection. Embeddings are truncated to `embedder_config.dimensions`
+        if set, the same embedder has to be used for indexing and querying the collection.
+
+        Args:
+            embedder_config (EmbedderConfig): Embedder configuration of the collection
+
+        Returns:
+            Embeddings: A LangChain Embeddings instance configured for the collection
+
+        Cache behavior:
+            Caches truncating embedders in self._embedder_cache using (model_name, dimensions) tuple as key.
+        """
+        embeddings = self.get_embedder_from_model_config(embedder_config.name)
+        if not embedder_config.dimensions:
+            return embeddings
+
+        cache_key = (embedder_config.name, embedder_config.dimensions)
+        if cache_key not in self._embedder_cache:
+            self._embedder_cache[cache_key] = MatryoshkaEmbeddings(
+                embeddings=embeddings, dimensions=embedder_config.dimensions
+            )
+        return self._embedder_cache[cache_key]
+
     def get_llm_from_model_config(
         self, model_config: ModelConfig, stream=False
     ) -> BaseChatModel:
@@ -258,18 +340,57 @@ class ModelGateway:
             model_id = "/".join(model_config.name.split("/")[1:])
 
             parameters = model_config.parameters or {}
-            self._llm_cache[cache_key] = ChatOpenAI(
-                model=model_id,
-                temperature=parameters.get("temperature", 0.1),
-                max_tokens=parameters.get("max_tokens", 1024),
-                streaming=stream,
-                api_key=api_key,
-                base_url=provider_config.base_url,
-                default_headers=provider_config.default_headers,
-            )
+            llms = [
+                ChatOpenAI(
+                    model=model_id,
+                    temperature=parameters.get("temperature", 0.1),
+                    max_tokens=parameters.get("max_tokens", 1024),
+                    streaming=stream,
+                    api_key=api_key,
+                    base_url=base_url,
+                    default_headers=provider_config.default_headers,
+                    http_client=self.http_clients.get_client(base_url),
+                    http_async_client=self.http_clients.get_async_client(base_url),
+                )
+                for base_url in provider_config.base_urls or [provider_config.base_url]
+            ]
+            if len(llms) == 1:
+                self._llm_cache[cache_key] = llms[0]
+            else:
+                self._llm_cache[cache_key] = RoutedChatModel(
+                    llms=llms,
+                    router=self._get_endpoint_router(model_config.name, stream),
+                )
 
         return self._llm_cache[cache_key]
 
+    def _get_endpoint_router(self, model_name: str, stream: bool) -> EndpointRouter:
+        """
+        Get the router of a chat model served by several endpoints. Streaming clients record the
+        time to first token and non streaming clients the full response time, so each has its own
+        router. Routers survive eviction from the llm cache.
+        """
+        router_key = (model_name, stream)
+        if router_key not in self._endpoint_routers:
+            provider_config = self.model_name_to_provider_config[model_name]
+            self._endpoint_routers[router_key] = EndpointRouter(
+                base_urls=provider_config.base_urls,
+                config=EndpointRoutingConfig.model_validate(provider_config.routing),
+            )
+        return self._endpoint_routers[router_key]
+
+    def get_endpoint_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Latency, load and circuit state of every endpoint of the chat models served by several
+        endpoints, for the streaming and non streaming clients
+        """
+        endpoint_stats: Dict[str, Dict[str, Any]] = {}
+        for (model_name, stream), router in self._endpoint_routers.items():
+            endpoint_stats.setdefault(model_name, {})[
+                "streaming" if stream else "non_streaming"
+            ] = router.get_stats()
+        return endpoint_stats
+
     def get_reranker_from_model_config(self, model_name: str, top_k: int = 3):
         """
         Get a reranker model instance for the specified model configuration. Uses caching to avoid
@@ -280,8 +401,8 @@ class ModelGateway:
             top_k (int, optional): Number of top results to return. Defaults to 3.
 
         Returns:
-            InfinityRerankerSvc: A reranker service instance configured according to the model name
-                                and top_k parameter
+            InfinityRerankerSvc | LocalRerankerSvc: A reranker service instance configured according
+                                to the model name and top_k parameter
 
         Raises:
             ValueError: If the model name is not registered in the model gateway
@@ -301,15 +422,37 @@ class ModelGateway:
             api_key = self._get_api_key(provider_config)
             model_id = "/".join(model_name.split("/")[1:])
 
-            self._reranker_cache[cache_key] = InfinityRerankerSvc(
-                model=model_id,
-                api_key=api_key,
-                base_url=provider_config.base_url,
-                top_k=top_k,
-            )
+            if provider_config.api_format == LOCAL_API_FORMAT:
+                self._reranker_cache[cache_key] = LocalRerankerSvc(
+                    cross_encoder=self._get_cross_encoder(model_name),
+                    top_k=top_k,
+                )
+            else:
+                self._reranker_cache[cache_key] = InfinityRerankerSvc(
+                    model=model_id,
+                    api_key=api_key,
+                    base_url=provider_config.base_url,
+                    top_k=top_k,
+                    http_client=self.http_clients.get_client(provider_config.base_url),
+                    http_async_client=self.http_clients.get_async_client(
+                        provider_config.base_url
+                    ),
+                )
 
         return self._reranker_cache[cache_key]
 
+    def _get_cross_encoder(self, model_name: str) -> LocalCrossEncoder:
+        """
+        Get the in-process cross-encoder of a reranking model of a `local` provider
+        """
+        if model_name not in self._cross_encoders:
+            provider_config = self.model_name_to_provider_config[model_name]
+            self._cross_encoders[model_name] = LocalCrossEncoder(
+                model="/".join(model_name.split("/")[1:]),
+                config=provider_config.parameters,
+            )
+        return self._cross_encoders[model_name]
+
     def get_audio_model_from_model_config(self, model_name: str):
         """
         Get an audio processing model instance for the specified model configuration. Uses caching to avoid
@@ -342,6 +485,9 @@ class ModelGateway:
                 api_key=api_key,
                 base_url=provider_config.base_url,
                 model=model,
+                http_client=self.http_clients.get_async_client(
+                    provider_config.base_url
+                ),
             )
 
         return self._audio_cache[model_name]
@@ -1,9 +1,10 @@
-from typing import Optional, Sequence
+from typing import Any, Dict, Optional, Sequence, Tuple
 
-import requests
+import httpx
 from langchain.callbacks.manager import Callbacks
 from langchain.docstore.document import Document
 from langchain.retrievers.document_compressors.base import BaseDocumentCompressor
+from pydantic import ConfigDict
 
 from backend.logger import logger
 
@@ -19,14 +20,15 @@ class InfinityRerankerSvc(BaseDocumentCompressor):
     top_k: int
     base_url: str
     api_key: Optional[str] = None
+    # Pooled clients shared with the other models of the provider, see `HttpClientPool`
+    http_client: Optional[httpx.Client] = None
+    http_async_client: Optional[httpx.AsyncClient] = None
 
-    def compress_documents(
-        self,
-        documents: Sequence[Document],
-        query: str,
-        callbacks: Optional[Callbacks] = None,
-    ) -> Sequence[Document]:
-        """Compress retrieved documents given the query context."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _build_request(
+        self, documents: Sequence[Document], query: str
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         docs = [doc.page_content for doc in documents]
 
         payload = {
@@ -43,10 +45,42 @@ class InfinityRerankerSvc(BaseDocumentCompressor):
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
 
-        reranked_docs = requests.post(
-            self.base_url.rstrip("/") + "/rerank", headers=headers, json=payload
-        ).json()
+        return self.base_url.rstrip("/") + "/rerank", headers, payload
 
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        """Compress retrieved documents given the query context."""
+        url, headers, payload = self._build_request(documents, query)
+        if self.http_client is None:
+            response = httpx.post(url, headers=headers, json=payload)
+        else:
+            response = self.http_client.post(url, headers=headers, json=payload)
+        return self._rank_documents(documents, response.json())
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        """Compress retrieved documents given the query context without blocking the event loop."""
+        url, headers, payload = self._build_request(documents, query)
+        if self.http_async_client is None:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, headers=headers, json=payload)
+        else:
+            response = await self.http_async_client.post(
+                url, headers=headers, json=payload
+            )
+        return self._rank_documents(documents, response.json())
+
+    def _rank_documents(
+        self, documents: Sequence[Document], reranked_docs: Dict[str, Any]
+    ) -> Sequence[Document]:
         """
         reranked_docs =
         {
@@ -1,14 +1,21 @@
+import asyncio
 import json
-from typing import Any, Dict, List
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
 
-import aiofiles
-import aiofiles.os
 from langchain.docstore.document import Document
 
 from backend.logger import logger
 from backend.modules.model_gateway.model_gateway import model_gateway
+from backend.modules.parsers.chunking import get_chunker
+from backend.modules.parsers.ffmpeg_utils import (
+    detect_silences,
+    extract_audio_segment,
+    get_ffmpeg_binary,
+    plan_segments,
+)
 from backend.modules.parsers.parser import BaseParser
-from backend.modules.parsers.unstructured_io import UnstructuredIoParser
 from backend.types import ModelConfig
 
 
@@ -16,6 +23,10 @@ class AudioParser(BaseParser):
     """
     AudioParser is a parser class for extracting text from audio input.
 
+    Long recordings are split at silences into segments of at most `segment_duration_minutes`,
+    which are transcribed concurrently and chunked locally. Every chunk carries the
+    start / end (in seconds) of the segment it was transcribed from.
+
     {
         ".mp3": {
             "name": "AudioParser",
@@ -23,7 +34,13 @@ class AudioParser(BaseParser):
                 "model_configuration": {
                     "name" : "faster-whisper/Systran/faster-distil-whisper-large-v3"
                 },
-                "max_chunk_size": 2000
+                "max_chunk_size": 2000,
+                "segment_duration_minutes": 10,
+                "max_concurrency": 4,
+                "chunking": {
+                    "strategy": "sentence",
+                    "chunk_size": 2000
+                }
             }
         }
     }
@@ -43,7 +60,16 @@ class AudioParser(BaseParser):
     ]
 
     def __init__(
-        self, *, model_configuration: ModelConfig, max_chunk_size: int = 2000, **kwargs
+        self,
+        *,
+        model_configuration: ModelConfig,
+        max_chunk_size: int = 2000,
+        segment_duration_minutes: float = 10,
+        max_concurrency: int = 4,
+        silence_threshold_db: float = -35,
+        min_silence_duration: float = 0.5,
+        chunking: Optional[Dict[str, Any]] = None,
+        **kwargs,
     ):
         """
         Initializes the AudioParser object.
@@ -53,8 +79,43 @@ class AudioParser(BaseParser):
             model_name=self.model_configuration.name
         )
         self.max_chunk_size = max_chunk_size
+        self.segment_duration = segment_duration_minutes * 60
+        self.max_concurrency = max_concurrency
+        self.silence_threshold_db = silence_threshold_db
+        self.min_silence_duration = min_silence_duration
+        self.chunker = get_chunker(chunking, max_chunk_size=max_chunk_size)
         super().__init__(**kwargs)
 
+    async def _transcribe(self, filepath: str) -> str:
+        parsed_audio_text = []
+        async for line in self.audio_processing_svc.get_transcription(filepath):
+            try:
+                data = json.loads(line)["text"]
+                parsed_audio_text.append(data)
+            except json.JSONDecodeError as je:
+                logger.error(f"Error decoding JSON: {line}")
+                raise je
+            except KeyError as ke:
+                logger.error(f"Missing 'text' key in JSON: {line}")
+                raise ke
+        return " ".join(parsed_audio_text)
+
+    async def _get_segments(self, filepath: str) -> List[Tuple[float, float]]:
+        """
+        Plan the segments of the audio file, an empty list means the file is transcribed as a whole
+        """
+        if not get_ffmpeg_binary():
+            logger.warning("ffmpeg not found, transcribing the audio file as a whole")
+            return []
+        duration, silences = await detect_silences(
+            filepath,
+            noise_db=self.silence_threshold_db,
+            min_silence_duration=self.min_silence_duration,
+        )
+        if duration <= self.segment_duration:
+            return []
+        return plan_segments(duration, silences, self.segment_duration)
+
     async def get_chunks(
         self, filepath: str, metadata: Dict[Any, Any] | None, **kwargs
     ) -> List[Document]:
@@ -62,48 +123,55 @@ class AudioParser(BaseParser):
         Get the chunks of the audio file.
         """
         try:
-            parsed_audio_text = []
-
-            async for line in self.audio_processing_svc.get_transcription(filepath):
-                try:
-                    data = json.loads(line)["text"]
-                    parsed_audio_text.append(data)
-                except json.JSONDecodeError as je:
-                    logger.error(f"Error decoding JSON: {line}")
-                    raise je
-                except KeyError as ke:
-                    logger.error(f"Missing 'text' key in JSON: {line}")
-                    raise ke
-                except Exception as e:
-                    logger.exception(f"Error processing transcription line: {e}")
-                    raise e
-
-            combined_audio_text = " ".join(parsed_audio_text)
-            logger.info(f"Total Combined audio text: {len(combined_audio_text)}")
-
-            # Write the combined text to a '.txt' temporary file
-            async with aiofiles.tempfile.NamedTemporaryFile(
-                mode="w", suffix=".txt", delete=False
-            ) as temp_file:
-                await temp_file.write(combined_audio_text)
-                tempfile_name = temp_file.name
-
-            # Split the text into chunks
-            unstructured_io_parser = UnstructuredIoParser(
-                max_chunk_size=self.max_chunk_size
-            )
-
-            final_texts = await unstructured_io_parser.get_chunks(
-                filepath=tempfile_name, metadata=metadata
+            segments = await self._get_segments(filepath)
+
+            if not segments:
+                segment_texts = [(None, await self._transcribe(filepath))]
+            else:
+                logger.info(f"Transcribing {len(segments)} segments of {filepath}")
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+
+                with tempfile.TemporaryDirectory() as segments_dir:
+
+                    async def _transcribe_segment(index: int, start: float, end: float):
+                        async with semaphore:
+                            segment_filepath = os.path.join(
+                                segments_dir, f"segment_{index:05d}.flac"
+                            )
+                            await extract_audio_segment(
+                                filepath, start, end, segment_filepath
+                            )
+                            text = await self._transcribe(segment_filepath)
+                            os.remove(segment_filepath)
+                            return (start, end), text
+
+                    # gather keeps the results in the order of the segments
+                    segment_texts = await asyncio.gather(
+                        *[
+                            _transcribe_segment(index, start, end)
+                            for index, (start, end) in enumerate(segments)
+                        ]
+                    )
+
+            final_texts = []
+            for segment_index, (segment, text) in enumerate(segment_texts):
+                segment_metadata = {**(metadata or {})}
+                if segment is not None:
+                    segment_metadata.update(
+                        {
+                            "segment_index": segment_index,
+                            "segment_start_seconds": round(segment[0], 3),
+                            "segment_end_seconds": round(segment[1], 3),
+                        }
+                    )
+                # Split the text into chunks locally
+                final_texts.extend(
+                    self.chunker.create_documents(text, segment_metadata)
+                )
+            logger.info(
+                f"Total transcribed audio text: {sum(len(text) for _, text in segment_texts)}"
             )
 
-            # Remove the temporary file
-            try:
-                await aiofiles.os.remove(tempfile_name)
-                logger.info(f"Removed temporary file: {tempfile_name}")
-            except Exception as e:
-                logger.exception(f"Error in removing temporary file: {e}")
-
             return final_texts
 
         except Exception as e:
@@ -0,0 +1,306 @@
+import re
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+from pydantic import Field
+
+from backend.logger import logger
+from backend.types import ConfiguredBaseModel
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+MARKDOWN_HEADING_REGEX = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+SENTENCE_BOUNDARY_REGEX = re.compile(r"(?<=[.!?。！？])\s+")
+WORD_REGEX = re.compile(r"\S+")
+
+
+class ChunkingStrategy(str, Enum):
+    """
+    RECURSIVE: Split on paragraphs, then lines, sentences and words until pieces fit
+    MARKDOWN: Split on markdown headings first, chunks never span sections and carry their heading path
+    SENTENCE: Pack whole sentences into chunks
+    TOKEN: Fixed windows of `chunk_size` tokens
+    """
+
+    RECURSIVE = "recursive"
+    MARKDOWN = "markdown"
+    SENTENCE = "sentence"
+    TOKEN = "token"
+
+
+class LengthUnit(str, Enum):
+    CHARACTERS = "characters"
+    TOKENS = "tokens"
+
+
+class ChunkingConfig(ConfiguredBaseModel):
+    """
+    Configuration of the local chunker, passed as the `chunking` parameter of a parser in `ParserConfig`
+    {
+        "strategy": "markdown",
+        "chunk_size": 512,
+        "chunk_overlap": 64,
+        "length_unit": "tokens",
+        "tokenizer": "cl100k_base"
+    }
+    """
+
+    strategy: ChunkingStrategy = ChunkingStrategy.RECURSIVE
+    chunk_size: int = Field(default=2000, gt=0)
+    chunk_overlap: int = Field(default=0, ge=0)
+    length_unit: LengthUnit = LengthUnit.CHARACTERS
+    # tiktoken encoding or HuggingFace tokenizer name, used when counting tokens
+    tokenizer: str = "cl100k_base"
+
+
+@lru_cache(maxsize=8)
+def get_tokenizer(name: str) -> Optional[Any]:
+    """
+    Load a tokenizer once per process. tiktoken encodings are preferred, HuggingFace tokenizers are
+    used for names like `BAAI/bge-small-en-v1.5`. Returns None if neither is available.
+    """
+    if tiktoken is not None and "/" not in name:
+        try:
+            return tiktoken.get_encoding(name)
+        except ValueError:
+            pass
+    if Tokenizer is not None:
+        try:
+            return Tokenizer.from_pretrained(name)
+        except Exception as e:
+            logger.warning(f"Failed to load tokenizer {name}: {e}")
+    logger.warning(f"Tokenizer {name} not available, approximating tokens with words")
+    return None
+
+
+def _encode(tokenizer: Any, text: str) -> List[int]:
+    if tiktoken is not None and isinstance(tokenizer, tiktoken.Encoding):
+        return tokenizer.encode_ordinary(text)
+    return tokenizer.encode(text, add_special_tokens=False).ids
+
+
+def _decode(tokenizer: Any, token_ids: List[int]) -> str:
+    return tokenizer.decode(token_ids)
+
+
+def count_tokens(tokenizer: Optional[Any], text: str) -> int:
+    """
+    Number of tokens of text, approximated with words when no tokenizer is available
+    """
+    if tokenizer is None:
+        return len(WORD_REGEX.findall(text))
+    return len(_encode(tokenizer, text))
+
+
+class TextChunker:
+    """
+    Local, dependency free (tokenizers are optional) text chunker shared by all parsers.
+    Splitting is done with C level `str` / `re` operations and lengths are computed once per piece.
+    """
+
+    def __init__(self, config: ChunkingConfig):
+        self.config = config
+        if config.chunk_overlap >= config.chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.tokenizer = None
+        if (
+            config.length_unit == LengthUnit.TOKENS
+            or config.strategy == ChunkingStrategy.TOKEN
+        ):
+            self.tokenizer = get_tokenizer(config.tokenizer)
+        self.length_fn: Callable[[str], int] = len
+        if config.length_unit == LengthUnit.TOKENS:
+            self.length_fn = self._count_tokens
+
+    def _count_tokens(self, text: str) -> int:
+        return count_tokens(self.tokenizer, text)
+
+    def _merge(self, splits: List[str], separator: str) -> List[str]:
+        """
+        Greedily pack splits (each already within chunk_size) into chunks, keeping up to
+        chunk_overlap of the tail of each chunk at the start of the next one.
+        """
+        chunk_size, chunk_overlap = self.config.chunk_size, self.config.chunk_overlap
+        separator_length = self.length_fn(separator) if separator else 0
+        chunks = []
+        current: List[Tuple[str, int]] = []
+        current_length = 0
+        for split in splits:
+            if not split:
+                continue
+            split_length = self.length_fn(split)
+            added_length = split_length + (separator_length if current else 0)
+            if current and current_length + added_length > chunk_size:
+                chunks.append(separator.join(piece for piece, _ in current))
+                # Drop pieces from the front until what is left fits in the overlap
+                while current and (
+                    current_length > chunk_overlap
+                    or current_length + split_length + separator_length > chunk_size
+                ):
+                    _, piece_length = current.pop(0)
+                    current_length -= piece_length + (
+                        separator_length if current else 0
+                    )
+                added_length = split_length + (separator_length if current else 0)
+            current.append((split, split_length))
+            current_length += added_length
+        if current:
+            chunks.append(separator.join(piece for piece, _ in current))
+        return chunks
+
+    def _split_recursive(self, text: str, separators: List[str]) -> List[str]:
+        if self.length_fn(text) <= self.config.chunk_size:
+            return [text] if text.strip() else []
+        separator = separators[-1]
+        remaining_separators: List[str] = []
+        for i, candidate in enumerate(separators):
+            if candidate == "" or candidate in text:
+                separator, remaining_separators = candidate, separators[i + 1 :]
+                break
+
+        if separator == "":
+            return self._split_hard(text)
+
+        good_splits: List[str] = []
+        chunks: List[str] = []
+        for split in text.split(separator):
+            if self.length_fn(split) <= self.config.chunk_size:
+                good_splits.append(split)
+                continue
+            if good_splits:
+                chunks.extend(self._merge(good_splits, separator))
+                good_splits = []
+            chunks.extend(self._split_recursive(split, remaining_separators or [""]))
+        if good_splits:
+            chunks.extend(self._merge(good_splits, separator))
+        return chunks
+
+    def _window_starts(self, length: int) -> range:
+        # The last window ends at `length`, no trailing window entirely made of overlap
+        step = self.config.chunk_size - self.config.chunk_overlap
+        return range(0, max(length - self.config.chunk_overlap, 1), step)
+
+    def _split_hard(self, text: str) -> List[str]:
+        """
+        Split text without any separator into windows of chunk_size (with overlap)
+        """
+        if self.config.length_unit == LengthUnit.TOKENS:
+            return self._split_tokens(text)
+        return [
+            text[i : i + self.config.chunk_size] for i in self._window_starts(len(text))
+        ]
+
+    def _split_tokens(self, text: str) -> List[str]:
+        """
+        Split text into windows of chunk_size tokens (with overlap), tokens are words without a tokenizer
+        """
+        if self.tokenizer is None:
+            words = WORD_REGEX.findall(text)
+            return [
+                " ".join(words[i : i + self.config.chunk_size])
+                for i in self._window_starts(len(words))
+            ]
+        token_ids = _encode(self.tokenizer, text)
+        return [
+            _decode(self.tokenizer, token_ids[i : i + self.config.chunk_size])
+            for i in self._window_starts(len(token_ids))
+        ]
+
+    def _split_sentences(self, text: str) -> List[str]:
+        sentences: List[str] = []
+        for sentence in SENTENCE_BOUNDARY_REGEX.split(text):
+            if self.length_fn(sentence) <= self.config.chunk_size:
+                sentences.append(sentence)
+            else:
+                sentences.extend(
+                    self._split_recursive(sentence, DEFAULT_SEPARATORS[1:])
+                )
+        return self._merge(sentences, " ")
+
+    def _split_markdown_sections(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Split markdown into (heading path, section text) at headings
+        """
+        sections = []
+        heading_stack: List[Tuple[int, str]] = []
+        last_end = 0
+        headings = ""
+        for match in MARKDOWN_HEADING_REGEX.finditer(text):
+            sections.append((headings, text[last_end : match.start()]))
+            level = len(match.group(1))
+            while heading_stack and heading_stack[-1][0] >= level:
+                heading_stack.pop()
+            heading_stack.append((level, match.group(2)))
+            headings = " > ".join(heading for _, heading in heading_stack)
+            last_end = match.start()
+        sections.append((headings, text[last_end:]))
+        return [
+            (headings, section) for headings, section in sections if section.strip()
+        ]
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Split text into chunks according to the configured strategy
+        """
+        return [chunk for _, chunk in self._split_with_headings(text)]
+
+    def _split_with_headings(self, text: str) -> List[Tuple[Optional[str], str]]:
+        return [
+            (headings, chunk)
+            for headings, chunk in self._split_by_strategy(text)
+            if chunk.strip()
+        ]
+
+    def _split_by_strategy(self, text: str) -> List[Tuple[Optional[str], str]]:
+        strategy = self.config.strategy
+        if strategy == ChunkingStrategy.TOKEN:
+            return [(None, chunk) for chunk in self._split_tokens(text)]
+        if strategy == ChunkingStrategy.SENTENCE:
+            return [(None, chunk) for chunk in self._split_sentences(text)]
+        if strategy == ChunkingStrategy.MARKDOWN:
+            return [
+                (headings or None, chunk)
+                for headings, section in self._split_markdown_sections(text)
+                for chunk in self._split_recursive(section, DEFAULT_SEPARATORS)
+            ]
+        return [
+            (None, chunk) for chunk in self._split_recursive(text, DEFAULT_SEPARATORS)
+        ]
+
+    def create_documents(
+        self, text: str, metadata: Optional[Dict[Any, Any]] = None
+    ) -> List[Document]:
+        """
+        Split text into Documents, markdown chunks carry their heading path in `headings`
+        """
+        documents = []
+        for headings, chunk in self._split_with_headings(text):
+            chunk_metadata = {**(metadata or {})}
+            if headings:
+                chunk_metadata["headings"] = headings
+            documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+        return documents
+
+
+def get_chunker(
+    chunking: Optional[Dict[str, Any]] = None, max_chunk_size: Optional[int] = None
+) -> TextChunker:
+    """
+    Build a chunker from the `chunking` parameter of a parser. Parsers without a `chunking`
+    parameter keep their `max_chunk_size` as the chunk size of the default recursive strategy.
+    """
+    config = dict(chunking or {})
+    if max_chunk_size is not None:
+        config.setdefault("chunk_size", max_chunk_size)
+    return TextChunker(ChunkingConfig.model_validate(config))
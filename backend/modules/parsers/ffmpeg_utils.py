@@ -0,0 +1,133 @@
+import asyncio
+import re
+import shutil
+from typing import List, Optional, Tuple
+
+from backend.logger import logger
+
+DURATION_REGEX = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+SILENCE_START_REGEX = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+SILENCE_END_REGEX = re.compile(r"silence_end: (\d+(?:\.\d+)?)")
+
+
+def get_ffmpeg_binary() -> Optional[str]:
+    """
+    Locate the ffmpeg binary, preferring the one moviepy is configured with (FFMPEG_BINARY / imageio-ffmpeg)
+    """
+    try:
+        from moviepy.config import get_setting
+
+        return get_setting("FFMPEG_BINARY")
+    except Exception:
+        return shutil.which("ffmpeg")
+
+
+async def run_ffmpeg(*args: str) -> str:
+    """
+    Run ffmpeg with the given arguments and return its stderr, where ffmpeg writes all diagnostics
+    """
+    ffmpeg_binary = get_ffmpeg_binary()
+    if not ffmpeg_binary:
+        raise RuntimeError("ffmpeg is not available")
+    process = await asyncio.create_subprocess_exec(
+        ffmpeg_binary,
+        "-hide_banner",
+        "-nostdin",
+        *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    stderr = stderr.decode("utf-8", errors="replace")
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg exited with code {process.returncode}: {stderr[-1000:]}"
+        )
+    return stderr
+
+
+async def detect_silences(
+    filepath: str, noise_db: float = -35, min_silence_duration: float = 0.5
+) -> Tuple[float, List[Tuple[float, float]]]:
+    """
+    Decode the audio of `filepath` once and find the silent intervals in it.
+
+    Returns:
+        Tuple[float, List[Tuple[float, float]]]: Duration of the media in seconds and the (start, end) of every silence.
+    """
+    stderr = await run_ffmpeg(
+        "-i",
+        filepath,
+        "-vn",
+        "-af",
+        f"silencedetect=noise={noise_db}dB:d={min_silence_duration}",
+        "-f",
+        "null",
+        "-",
+    )
+    duration = 0.0
+    if match := DURATION_REGEX.search(stderr):
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    silences = []
+    silence_start = None
+    for line in stderr.splitlines():
+        if match := SILENCE_START_REGEX.search(line):
+            silence_start = max(float(match.group(1)), 0.0)
+        elif (match := SILENCE_END_REGEX.search(line)) and silence_start is not None:
+            silences.append((silence_start, float(match.group(1))))
+            silence_start = None
+    # Trailing silence that runs until the end of the media
+    if silence_start is not None:
+        silences.append((silence_start, duration))
+    return duration, silences
+
+
+def plan_segments(
+    duration: float, silences: List[Tuple[float, float]], segment_duration: float
+) -> List[Tuple[float, float]]:
+    """
+    Split [0, duration] into segments of at most `segment_duration` seconds, cutting in the middle
+    of the last silence before each limit. Falls back to a hard cut if a window has no silence.
+    """
+    silence_midpoints = [(start + end) / 2 for start, end in silences]
+    segments = []
+    segment_start = 0.0
+    while duration - segment_start > segment_duration:
+        limit = segment_start + segment_duration
+        # Only cut in the second half of the window so that segments do not get too short
+        candidates = [
+            midpoint
+            for midpoint in silence_midpoints
+            if segment_start + segment_duration / 2 <= midpoint < limit
+        ]
+        segment_end = candidates[-1] if candidates else limit
+        segments.append((segment_start, segment_end))
+        segment_start = segment_end
+    segments.append((segment_start, duration))
+    return segments
+
+
+async def extract_audio_segment(
+    filepath: str, start: float, end: float, output_filepath: str
+):
+    """
+    Extract [start, end) of the audio of `filepath` as 16kHz mono audio (what speech models expect)
+    """
+    await run_ffmpeg(
+        "-ss",
+        f"{start:.3f}",
+        "-t",
+        f"{end - start:.3f}",
+        "-i",
+        filepath,
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        "16000",
+        "-y",
+        output_filepath,
+    )
+    logger.debug(f"Extracted audio segment {start:.1f}s-{end:.1f}s of {filepath}")
@@ -4,6 +4,8 @@ from abc import ABC, abstractmethod
 from collections import defaultdict
 from typing import Any, Dict, List, Optional
 
+import aiofiles
+import aiofiles.os
 from langchain.docstore.document import Document
 
 from backend.logger import logger
@@ -53,6 +55,29 @@ class BaseParser(ABC):
             typing.List[Document]: A list of Document objects, each representing a chunk of the file.
         """
 
+    async def get_chunks_from_content(
+        self,
+        content: str,
+        file_extension: str,
+        metadata: Optional[Dict[Any, Any]],
+        *args,
+        **kwargs,
+    ) -> List[Document]:
+        """
+        Parse content that is already in memory, as if it was read from a file with `file_extension`.
+        Parsers that can consume content directly should override this, the default implementation
+        writes the content to a temporary file and calls `get_chunks`.
+        """
+        async with aiofiles.tempfile.NamedTemporaryFile(
+            mode="w", suffix=file_extension, delete=False
+        ) as temp_file:
+            await temp_file.write(content)
+            tempfile_name = temp_file.name
+        try:
+            return await self.get_chunks(tempfile_name, metadata, *args, **kwargs)
+        finally:
+            await aiofiles.os.remove(tempfile_name)
+
 
 def get_parser_for_extension_with_cache(
     extension: str,
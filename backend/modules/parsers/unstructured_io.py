@@ -1,3 +1,5 @@
+from typing import List
+
 import requests
 from langchain.docstore.document import Document
 from requests.adapters import HTTPAdapter, Retry
@@ -56,33 +58,44 @@ class UnstructuredIoParser(BaseParser):
         """
         Asynchronously extracts text from unstructured input and returns it in chunks.
         """
+        with open(filepath, "rb") as f:
+            return self._partition(f)
+
+    async def get_chunks_from_content(
+        self, content: str, file_extension: str, metadata: dict, **kwargs
+    ):
+        """
+        Extracts text from in-memory content, the content is sent without being written to disk.
+        """
+        return self._partition((f"content{file_extension}", content.encode("utf-8")))
+
+    def _partition(self, file) -> List[Document]:
         final_texts = []
         try:
-            with open(filepath, "rb") as f:
-                # Define files payload
-                files = {"files": f}
-                data = {
-                    "strategy": "auto",
-                    # applies language pack for ocr - visit https://github.com/tesseract-ocr/tessdata for more info
-                    "languages": ["eng", "hin"],
-                    "chunking_strategy": "by_title",
-                    "max_characters": self.max_chunk_size,
-                }
+            # Define files payload
+            files = {"files": file}
+            data = {
+                "strategy": "auto",
+                # applies language pack for ocr - visit https://github.com/tesseract-ocr/tessdata for more info
+                "languages": ["eng", "hin"],
+                "chunking_strategy": "by_title",
+                "max_characters": self.max_chunk_size,
+            }
 
-                headers = {
-                    "accept": "application/json",
-                }
-                if settings.UNSTRUCTURED_IO_API_KEY:
-                    headers["unstructured-api-key"] = settings.UNSTRUCTURED_IO_API_KEY
+            headers = {
+                "accept": "application/json",
+            }
+            if settings.UNSTRUCTURED_IO_API_KEY:
+                headers["unstructured-api-key"] = settings.UNSTRUCTURED_IO_API_KEY
 
-                # Send POST request
-                response = self.session.post(
-                    settings.UNSTRUCTURED_IO_URL.rstrip("/") + "/general/v0/general",
-                    headers=headers,
-                    files=files,
-                    data=data,
-                )
-                response.raise_for_status()
+            # Send POST request
+            response = self.session.post(
+                settings.UNSTRUCTURED_IO_URL.rstrip("/") + "/general/v0/general",
+                headers=headers,
+                files=files,
+                data=data,
+            )
+            response.raise_for_status()
 
             parsed_data = response.json()
             for payload in parsed_data:
@@ -1,3 +1,36 @@
+import asyncio
+import time
+
+
 def contains_text(text):
     # Check if the token contains at least one alphanumeric character
     return any(char.isalnum() for char in text)
+
+
+class AsyncRateLimiter:
+    """
+    Limits concurrent calls and spaces them to at most `requests_per_minute` (0 means no rate limit)
+
+    Usage:
+        async with rate_limiter:
+            await call()
+    """
+
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: int = 0):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.interval = 60 / requests_per_minute if requests_per_minute else 0
+        self._lock = asyncio.Lock()
+        self._next_call_at = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        if self.interval:
+            async with self._lock:
+                wait = self._next_call_at - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_call_at = time.monotonic() + self.interval
+        return self
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
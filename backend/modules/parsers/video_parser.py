@@ -1,20 +1,54 @@
+import asyncio
+import base64
 import os
 import tempfile
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
+import cv2
+import numpy as np
 from langchain.docstore.document import Document
-from moviepy.video.io.VideoFileClip import VideoFileClip
 
 from backend.logger import logger
 from backend.modules.parsers.audio_parser import AudioParser
+from backend.modules.parsers.ffmpeg_utils import run_ffmpeg
 from backend.modules.parsers.multi_modal_parser import MultiModalParser
 from backend.modules.parsers.parser import BaseParser
+from backend.modules.parsers.utils import AsyncRateLimiter, contains_text
 from backend.types import ModelConfig
 
+# Side of the grayscale thumbnail the perceptual hash is computed from
+PHASH_IMAGE_SIZE = 32
+# Side of the low frequency DCT block kept for the 64 bit perceptual hash
+PHASH_HASH_SIZE = 8
+
+
+def perceptual_hash(frame: np.ndarray) -> int:
+    """
+    64 bit DCT based perceptual hash of a BGR frame
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    resized = cv2.resize(
+        gray, (PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), interpolation=cv2.INTER_AREA
+    )
+    dct = cv2.dct(np.float32(resized))[:PHASH_HASH_SIZE, :PHASH_HASH_SIZE]
+    bits = (dct > np.median(dct)).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def color_histogram(frame: np.ndarray) -> np.ndarray:
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    histogram = cv2.calcHist([hsv], [0, 1], None, [32, 32], [0, 180, 0, 256])
+    return cv2.normalize(histogram, histogram).flatten()
+
 
 class VideoParser(BaseParser):
     """
     VideoParser is a parser class for extracting text from video input.
+
+    The video is decoded once, sampled at `fps` and near-duplicate frames are dropped
+    (perceptual hash distance <= `hash_distance_threshold` and no scene change), so slide-heavy
+    recordings only send every distinct slide to the VLM. Frames stay in memory, are described
+    concurrently (`max_concurrency`, `requests_per_minute`) and the audio is transcribed in parallel.
     {
         ".mp4": {
             "name": "VideoParser",
@@ -28,7 +62,12 @@ class VideoParser(BaseParser):
                 "max_chunk_size": 2000,
                 "prompt": "Descibe the given information present in the image - textual/charts/graphs/tables in detail.",
                 "total_frames": 15, // total images to be process from video, for testing puposes, if not provided all the images will be processed
-                "fps": 0.2 // configure this for controlling frame rate.
+                "fps": 0.2, // configure this for controlling frame rate.
+                "hash_distance_threshold": 6,
+                "scene_change_threshold": 0.3,
+                "max_concurrency": 8,
+                "requests_per_minute": 0,
+                "chunking": {"strategy": "sentence"} // local chunking of the transcript, see ChunkingConfig
             }
         }
     }
@@ -56,6 +95,11 @@ class VideoParser(BaseParser):
         prompt: str = "",
         total_frames: int = -1,
         fps: float = 0.2,
+        hash_distance_threshold: int = 6,
+        scene_change_threshold: float = 0.3,
+        max_concurrency: int = 8,
+        requests_per_minute: int = 0,
+        chunking: Optional[Dict[str, Any]] = None,
         **kwargs,
     ):
         """
@@ -74,87 +118,161 @@ class VideoParser(BaseParser):
             total_frames  # total images to be process from video, for testing puposes
         )
         self.fps = fps  # configure this for controlling frame rate.
+        self.hash_distance_threshold = hash_distance_threshold
+        self.scene_change_threshold = scene_change_threshold
+        self.rate_limiter = AsyncRateLimiter(
+            max_concurrency=max_concurrency, requests_per_minute=requests_per_minute
+        )
+
+        # Init multimodal parser for extracting text from images
+        self.multimodal_parser = MultiModalParser(
+            model_configuration=self.vlm_model_configuration, prompt=self.prompt
+        )
+        # Init audio parser for extracting text from audio
+        self.audio_parser = AudioParser(
+            model_configuration=self.audio_model_configuration,
+            max_chunk_size=self.max_chunk_size,
+            chunking=chunking,
+        )
 
         super().__init__(**kwargs)
 
-    def _get_images_from_video(self, video_filepath: str, temp_images_dir: str) -> str:
-        """
-        Extract images from video frames,
-        We extract 1 frame every 5 seconds of the video
-        Save all the images in temporary directory
-        """
-        file_name = os.path.basename(video_filepath)
-        file_name_without_extension, _ = os.path.splitext(file_name)
-        clip = VideoFileClip(video_filepath)
-        clip.write_images_sequence(
-            os.path.join(
-                temp_images_dir, file_name_without_extension + "_frame%04d.png"
-            ),
-            fps=self.fps,
+    def _is_new_scene(
+        self,
+        frame_hash: int,
+        histogram: np.ndarray,
+        last_hash: Optional[int],
+        last_histogram: Optional[np.ndarray],
+    ) -> bool:
+        if last_hash is None:
+            return True
+        if bin(frame_hash ^ last_hash).count("1") > self.hash_distance_threshold:
+            return True
+        # Bhattacharyya distance is 0 for identical and 1 for disjoint histograms
+        return (
+            cv2.compareHist(last_histogram, histogram, cv2.HISTCMP_BHATTACHARYYA)
+            > self.scene_change_threshold
         )
 
-    def _get_audio_from_video(self, video_filepath: str, temp_audio_dir: str) -> str:
+    def _get_key_frames(self, video_filepath: str) -> List[Tuple[float, str]]:
         """
-        Extract audio from video
+        Decode the video once, sample a frame every 1 / fps seconds and keep only the frames
+        that differ from the last kept one. Returns (timestamp in seconds, base64 jpeg) in order.
         """
-        file_name = os.path.basename(video_filepath)
-        clip = VideoFileClip(video_filepath)
-        clip.audio.write_audiofile(os.path.join(temp_audio_dir, file_name + ".wav"))
+        capture = cv2.VideoCapture(video_filepath)
+        if not capture.isOpened():
+            raise ValueError(f"Failed to open video {video_filepath}")
+        try:
+            video_fps = capture.get(cv2.CAP_PROP_FPS) or 25
+            frame_step = max(1, round(video_fps / self.fps))
 
-    async def get_chunks(
-        self, filepath: str, metadata: Dict[Any, Any] | None, **kwargs
+            key_frames = []
+            last_hash, last_histogram = None, None
+            sampled_frames = 0
+            frame_index = 0
+            # grab() skips retrieving (and converting) the frames in between samples
+            while capture.grab():
+                if frame_index % frame_step == 0:
+                    ok, frame = capture.retrieve()
+                    if not ok:
+                        break
+                    sampled_frames += 1
+                    frame_hash = perceptual_hash(frame)
+                    histogram = color_histogram(frame)
+                    if self._is_new_scene(
+                        frame_hash, histogram, last_hash, last_histogram
+                    ):
+                        last_hash, last_histogram = frame_hash, histogram
+                        _, buffer = cv2.imencode(".jpg", frame)
+                        key_frames.append(
+                            (
+                                frame_index / video_fps,
+                                base64.b64encode(buffer).decode("utf-8"),
+                            )
+                        )
+                        if 0 < self.total_frames <= len(key_frames):
+                            break
+                frame_index += 1
+        finally:
+            capture.release()
+
+        logger.info(
+            f"Kept {len(key_frames)} of {sampled_frames} sampled frames from {video_filepath}"
+        )
+        return key_frames
+
+    async def _get_frame_chunks(
+        self, filepath: str, metadata: Dict[Any, Any] | None
     ) -> List[Document]:
-        """
-        Get the chunks of the video file.
-        """
-        with tempfile.TemporaryDirectory(suffix="") as directory:
-            try:
-                # Extract images from video
-                temp_images_dir = os.path.join(directory, "images")
-                os.makedirs(temp_images_dir, exist_ok=True)
-                self._get_images_from_video(filepath, temp_images_dir)
-
-                # Init multimodal parser for extracting text from images
-                multimodal_parser = MultiModalParser(
-                    model_configuration=self.vlm_model_configuration, prompt=self.prompt
+        # Decoding is CPU bound, keep the event loop free for the audio transcription
+        key_frames = await asyncio.get_running_loop().run_in_executor(
+            None, self._get_key_frames, filepath
+        )
+
+        async def _describe_frame(frame_number: int, image_b64: str):
+            async with self.rate_limiter:
+                return await self.multimodal_parser.call_vlm_agent(
+                    image_b64, frame_number
                 )
 
-                # Iterate over all the images and extract text from them
-                parsed_video_text = []
-                for idx, image in enumerate(os.listdir(temp_images_dir)):
-                    image_path = os.path.join(temp_images_dir, image)
-                    image_text = await multimodal_parser.get_chunks(
-                        image_path, metadata
-                    )
-                    parsed_video_text.extend(image_text)
-                    logger.info(
-                        f"Extracted text from image: {image_text[0].page_content}"
-                    )
-                    if idx == self.total_frames:
-                        break
+        responses = await asyncio.gather(
+            *[
+                _describe_frame(frame_number, image_b64)
+                for frame_number, (_, image_b64) in enumerate(key_frames)
+            ]
+        )
 
-                # Extact audio from video
-                temp_audio_dir = os.path.join(directory, "audio")
-                os.makedirs(temp_audio_dir, exist_ok=True)
-                self._get_audio_from_video(filepath, temp_audio_dir)
+        file_name = os.path.basename(filepath)
+        final_texts = []
+        for response in responses:
+            if not response or "error" in response:
+                continue
+            frame_number, frame_content = response["response"]
+            if not contains_text(frame_content):
+                continue
+            timestamp, image_b64 = key_frames[frame_number]
+            document = self.multimodal_parser._create_document(
+                file_name, frame_number, frame_content, image_b64
+            )
+            document.metadata.update(
+                {**(metadata or {}), "frame_timestamp_seconds": round(timestamp, 3)}
+            )
+            final_texts.append(document)
+            logger.info(f"Extracted text from frame at {timestamp:.1f}s")
+        return final_texts
 
-                # Init audio parser for extracting text from audio
-                audio_parser = AudioParser(
-                    model_configuration=self.audio_model_configuration,
-                    max_chunk_size=self.max_chunk_size,
+    async def _get_audio_chunks(
+        self, filepath: str, metadata: Dict[Any, Any] | None
+    ) -> List[Document]:
+        with tempfile.TemporaryDirectory() as directory:
+            # Only the audio stream is decoded here, video frames are skipped by ffmpeg
+            audio_filepath = os.path.join(directory, "audio.flac")
+            try:
+                await run_ffmpeg(
+                    "-i", filepath, "-vn", "-ac", "1", "-ar", "16000", audio_filepath
                 )
+            except RuntimeError as e:
+                logger.warning(f"No audio extracted from {filepath}: {e}")
+                return []
+            return await self.audio_parser.get_chunks(audio_filepath, metadata)
 
-                # Extract text from audio
-                audio_text = await audio_parser.get_chunks(
-                    os.path.join(temp_audio_dir, os.listdir(temp_audio_dir)[0]),
-                    metadata,
-                )
+    async def get_chunks(
+        self, filepath: str, metadata: Dict[Any, Any] | None, **kwargs
+    ) -> List[Document]:
+        """
+        Get the chunks of the video file.
+        """
+        try:
+            frame_texts, audio_texts = await asyncio.gather(
+                self._get_frame_chunks(filepath, metadata),
+                self._get_audio_chunks(filepath, metadata),
+            )
 
-                # Combine all the extracted text
-                final_text = parsed_video_text + audio_text
+            # Combine all the extracted text
+            final_text = frame_texts + audio_texts
 
-                return final_text
+            return final_text
 
-            except Exception as e:
-                logger.exception(f"Error in getting chunks: {e}")
-                raise e
+        except Exception as e:
+            logger.exception(f"Error in getting chunks: {e}")
+            raise e
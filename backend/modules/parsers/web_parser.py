@@ -1,8 +1,9 @@
+import asyncio
 import os
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-import aiofiles
-import aiofiles.os
+from cachetools import LRUCache
 from crawl4ai import AsyncWebCrawler
 from crawl4ai.extraction_strategy import LLMExtractionStrategy
 from langchain.docstore.document import Document
@@ -10,8 +11,116 @@ from pydantic import BaseModel
 
 from backend.logger import logger
 from backend.modules.model_gateway.model_gateway import model_gateway
+from backend.modules.parsers.chunking import get_chunker
 from backend.modules.parsers.parser import PARSER_REGISTRY, BaseParser
 
+# Close the shared browser after it has been idle for this many seconds
+BROWSER_IDLE_TIMEOUT = 60
+# Number of crawled pages kept in memory, keyed by url, data point hash and parser config
+PAGE_CACHE_SIZE = 256
+
+
+class BrowserPool:
+    """
+    A headless browser shared by all WebParser instances of the process, with at most
+    `max_concurrent_pages` pages open at a time. The browser is launched on first use
+    and closed once it has been idle for `BROWSER_IDLE_TIMEOUT` seconds.
+    """
+
+    def __init__(self, max_concurrent_pages: int):
+        self.max_concurrent_pages = max_concurrent_pages
+        self._crawler: Optional[AsyncWebCrawler] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._active_pages = 0
+        self._idle_handle: Optional[asyncio.TimerHandle] = None
+
+    async def _get_crawler(self) -> AsyncWebCrawler:
+        loop = asyncio.get_running_loop()
+        # Browsers are bound to the event loop they were launched on
+        if self._loop is not loop:
+            self._discard_crawler()
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_pages)
+        async with self._lock:
+            if self._crawler is None:
+                logger.info("Launching shared browser for WebParser")
+                crawler = AsyncWebCrawler(verbose=True)
+                await crawler.__aenter__()
+                self._crawler = crawler
+            return self._crawler
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[AsyncWebCrawler]:
+        crawler = await self._get_crawler()
+        async with self._semaphore:
+            self._active_pages += 1
+            if self._idle_handle is not None:
+                self._idle_handle.cancel()
+                self._idle_handle = None
+            try:
+                yield crawler
+            finally:
+                self._active_pages -= 1
+                if self._active_pages == 0:
+                    self._idle_handle = self._loop.call_later(
+                        BROWSER_IDLE_TIMEOUT,
+                        lambda: asyncio.ensure_future(self.close()),
+                    )
+
+    def _discard_crawler(self):
+        """
+        Close the browser launched on a previous event loop, on that loop
+        """
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        crawler, self._crawler = self._crawler, None
+        self._active_pages = 0
+        if crawler is None:
+            return
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(
+                crawler.__aexit__(None, None, None), self._loop
+            )
+        else:
+            logger.warning(
+                "Shared browser of WebParser outlived its event loop, "
+                "close_browser_pools() should be awaited before the loop ends"
+            )
+
+    async def close(self):
+        if self._active_pages or self._crawler is None:
+            return
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        crawler, self._crawler = self._crawler, None
+        logger.info("Closing idle shared browser of WebParser")
+        await crawler.__aexit__(None, None, None)
+
+
+BROWSER_POOLS: Dict[int, BrowserPool] = {}
+PAGE_CACHE: LRUCache = LRUCache(maxsize=PAGE_CACHE_SIZE)
+
+
+def get_browser_pool(max_concurrent_pages: int) -> BrowserPool:
+    if max_concurrent_pages not in BROWSER_POOLS:
+        BROWSER_POOLS[max_concurrent_pages] = BrowserPool(max_concurrent_pages)
+    return BROWSER_POOLS[max_concurrent_pages]
+
+
+async def close_browser_pools():
+    """
+    Close the idle browsers launched on the running event loop, to be awaited before the loop ends
+    """
+    loop = asyncio.get_running_loop()
+    for browser_pool in BROWSER_POOLS.values():
+        if browser_pool._loop is loop:
+            await browser_pool.close()
+
 
 class WebModelConfig(BaseModel):
     name: str
@@ -37,12 +146,19 @@ class WebParserConfig(BaseModel):
     final_parser: Optional[FinalParserConfig] = FinalParserConfig(
         name="UnstructuredIoParser"
     )
+    max_concurrent_pages: int = 4
+    # Chunk the page locally (see `ChunkingConfig`) instead of using the final parser
+    chunking: Optional[Dict[str, Any]] = None
 
 
 class WebParser(BaseParser):
     """
     WebParser is a parser class for extracting text from audio input.
 
+    Pages are crawled with a browser shared across the ingestion run (see `BrowserPool`) and
+    cached by url and data point hash (ETag / Last-Modified), so re-ingesting an unchanged page
+    does not crawl it again. The crawled content is handed to the final parser in memory.
+
     {
         "url": {
             "name": "WebParser",
@@ -63,7 +179,9 @@ class WebParser(BaseParser):
                 "final_parser": {
                     "name": "UnstructuredIoParser",
                     "parameters": {}
-                }
+                },
+                "max_concurrent_pages": 4,
+                "chunking": null
             }
         }
     }
@@ -81,6 +199,18 @@ class WebParser(BaseParser):
         self.config = WebParserConfig.model_validate(kwargs)
 
         self.max_chunk_size = max_chunk_size
+
+        if self.config.final_parser.name not in PARSER_REGISTRY:
+            raise ValueError(
+                f"Final parser {self.config.final_parser} not registered in the parser registry."
+            )
+        self.final_parser: BaseParser = PARSER_REGISTRY[self.config.final_parser.name](
+            **(self.config.final_parser.parameters or {})
+        )
+        self.chunker = None
+        if self.config.chunking is not None:
+            self.chunker = get_chunker(self.config.chunking, max_chunk_size)
+        self.browser_pool = get_browser_pool(self.config.max_concurrent_pages)
         super().__init__(**kwargs)
 
     def model_config_to_extraction_strategy(
@@ -108,82 +238,72 @@ class WebParser(BaseParser):
             default_headers=model_provider_config.default_headers,
         )
 
+    async def _crawl(self, url: str) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Crawl the page and return its content, the file extension of the content and the page metadata
+        """
+        extraction_strategy = None
+        if self.config.llm_extraction_config:
+            if not self.config.prompt:
+                raise ValueError("Prompt is required for model configuration.")
+            extraction_strategy = self.model_config_to_extraction_strategy(
+                self.config.llm_extraction_config
+            )
+
+        async with self.browser_pool.page() as crawler:
+            result = await crawler.arun(
+                url=url,
+                bypass_cache=True,
+                magic=self.config.magic,
+                simulate_user=self.config.simulate_user,
+                override_navigator=self.config.override_navigator,
+                remove_overlay=self.config.remove_overlay,
+                page_timeout=self.config.page_timeout,
+                js_code=self.config.js_code,
+                wait_for=self.config.wait_for,
+                css_selector=self.config.css_selector,
+                extraction_strategy=extraction_strategy,
+            )
+        assert result.success, f"Failed to crawl the page: {url}"
+
+        if extraction_strategy:
+            return result.extracted_content, ".json", result.metadata or {}
+        elif self.config.use_markdown or self.chunker is not None:
+            return result.fit_markdown, ".md", result.metadata or {}
+        return result.fit_html, ".html", result.metadata or {}
+
     async def get_chunks(
         self, url: str, metadata: Dict[Any, Any] | None, **kwargs
     ) -> List[Document]:
         """
         Get the chunks of the audio file.
         """
-
-        if self.config.final_parser.name not in PARSER_REGISTRY:
-            raise ValueError(
-                f"Final parser {self.config.final_parser} not registered in the parser registry."
-            )
-
         try:
-            extraction_strategy = None
-            if self.config.llm_extraction_config:
-                if not self.config.prompt:
-                    raise ValueError("Prompt is required for model configuration.")
-                extraction_strategy = self.model_config_to_extraction_strategy(
-                    self.config.llm_extraction_config
-                )
+            data_point_hash = kwargs.get("data_point_hash")
+            cache_key = (url, data_point_hash, self.config.model_dump_json())
+            if data_point_hash and cache_key in PAGE_CACHE:
+                logger.info(f"Using cached page for {url}")
+                data, file_ext, page_metadata = PAGE_CACHE[cache_key]
+            else:
+                data, file_ext, page_metadata = await self._crawl(url)
+                if data_point_hash:
+                    PAGE_CACHE[cache_key] = (data, file_ext, page_metadata)
 
-            async with AsyncWebCrawler(verbose=True) as crawler:
-                result = await crawler.arun(
-                    url=url,
-                    bypass_cache=True,
-                    magic=self.config.magic,
-                    simulate_user=self.config.simulate_user,
-                    override_navigator=self.config.override_navigator,
-                    remove_overlay=self.config.remove_overlay,
-                    page_timeout=self.config.page_timeout,
-                    js_code=self.config.js_code,
-                    wait_for=self.config.wait_for,
-                    css_selector=self.config.css_selector,
-                    extraction_strategy=extraction_strategy,
+            # Split the text into chunks
+            if self.chunker is not None:
+                return self.chunker.create_documents(
+                    data, {**page_metadata, **(metadata or {})}
                 )
-                assert result.success, f"Failed to crawl the page: {url}"
-
-                if extraction_strategy:
-                    data = result.extracted_content
-                    file_ext = ".json"
-                elif self.config.use_markdown:
-                    data = result.fit_markdown
-                    file_ext = ".md"
-                else:
-                    data = result.fit_html
-                    file_ext = ".html"
-
-                tempfile_name = None
-
-                async with aiofiles.tempfile.NamedTemporaryFile(
-                    mode="w", suffix=file_ext, delete=False
-                ) as temp_file:
-                    await temp_file.write(data)
-                    tempfile_name = temp_file.name
-
-                # Split the text into chunks
-                parser: BaseParser = PARSER_REGISTRY[self.config.final_parser.name](
-                    **(self.config.final_parser.parameters or {})
-                )
-
-                final_texts = await parser.get_chunks(
-                    filepath=tempfile_name,
-                    metadata={
-                        **result.metadata,
-                        **(metadata or {}),
-                    },
-                )
-
-                # Remove the temporary file
-                try:
-                    await aiofiles.os.remove(tempfile_name)
-                    logger.info(f"Removed temporary file: {tempfile_name}")
-                except Exception as e:
-                    logger.exception(f"Error in removing temporary file: {e}")
+            final_texts = await self.final_parser.get_chunks_from_content(
+                data,
+                file_ext,
+                metadata={
+                    **page_metadata,
+                    **(metadata or {}),
+                },
+            )
 
-                return final_texts
+            return final_texts
 
         except Exception as e:
             logger.exception(f"Error in getting chunks: {e}")
@@ -3,6 +3,8 @@ from backend.modules.query_controllers.multimodal.controller import (
     MultiModalRAGQueryController,
 )
 from backend.modules.query_controllers.query_controller import register_query_controller
+from backend.modules.query_controllers.search.controller import SearchQueryController
 
 register_query_controller("basic-rag", BasicRAGQueryController)
 register_query_controller("multimodal", MultiModalRAGQueryController)
+register_query_controller("search", SearchQueryController)
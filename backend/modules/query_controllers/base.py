@@ -2,18 +2,30 @@ import asyncio
 from typing import AsyncIterator
 
 import async_timeout
-import requests
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 from langchain.prompts import PromptTemplate
 from langchain.retrievers import ContextualCompressionRetriever, MultiQueryRetriever
 from langchain.schema.vectorstore import VectorStoreRetriever
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import (
+    RunnableAssign,
+    RunnableLambda,
+    RunnableParallel,
+    RunnablePassthrough,
+)
 from pydantic import BaseModel
 
 from backend.constants import DATA_POINT_FQN_METADATA_KEY, DATA_POINT_HASH_METADATA_KEY
 from backend.logger import logger
 from backend.modules.metadata_store.client import get_client
 from backend.modules.model_gateway.model_gateway import model_gateway
+from backend.modules.query_controllers.context_assembler import assemble_context
+from backend.modules.query_controllers.internet_search import (
+    INTERNET_SEARCH_DATA_POINT_FQN,
+    brave_search_client,
+)
+from backend.modules.query_controllers.sse import SSEEncoder, accepts_gzip
 from backend.modules.query_controllers.types import *
 from backend.modules.vector_db.client import VECTOR_STORE_CLIENT
 from backend.settings import settings
@@ -42,6 +54,22 @@ class BaseQueryController:
     def _format_docs(self, docs):
         return "\n\n".join([doc.page_content for doc in docs])
 
+    def _get_context_assembly(
+        self,
+        context_assembly: ContextAssemblyConfig,
+        model_name: Optional[str] = None,
+    ) -> RunnableAssign:
+        """
+        Replace the retrieved documents (`context`) with the ones selected for the `question`,
+        see `assemble_context`. Run it before the answer so that the prompt and the returned
+        documents are the same.
+        """
+        return RunnablePassthrough.assign(
+            context=lambda x: assemble_context(
+                x["context"], x["question"], context_assembly, model_name
+            )
+        )
+
     def _get_llm(self, model_configuration: ModelConfig, stream=False) -> BaseChatModel:
         """
         Get the LLM
@@ -55,10 +83,12 @@ class BaseQueryController:
         client = await get_client()
         collection = await client.aget_collection_by_name(collection_name)
 
+        # Always search through the collection name and never a physical collection,
+        # the vector db resolves it so that blue/green swaps are picked up immediately
         return VECTOR_STORE_CLIENT.get_vector_store(
             collection_name=collection.name,
-            embeddings=model_gateway.get_embedder_from_model_config(
-                model_name=collection.embedder_config.name
+            embeddings=model_gateway.get_embedder_from_embedder_config(
+                collection.embedder_config
             ),
         )
 
@@ -182,48 +212,65 @@ class BaseQueryController:
 
         return [doc for doc in outputs["context"]]
 
-    def _intent_summary_search(self, query: str):
-        url = f"https://api.search.brave.com/res/v1/web/search?q={query}&summary=1"
-
-        payload = {}
-        headers = {
-            "Accept": "application/json",
-            "Accept-Encoding": "gzip",
-            "X-Subscription-Token": f"{settings.BRAVE_API_KEY}",
-        }
-
-        response = requests.request("GET", url, headers=headers, data=payload)
-        answer = response.json()
+    def _get_setup_and_retrieval(
+        self, retriever, internet_search_enabled: bool = False
+    ) -> RunnableParallel:
+        """
+        Retrieve the context of the question. With internet search, the search runs concurrently
+        with the retrieval, merge its result into the context with `_internet_search`.
+        """
+        steps = {"context": retriever, "question": RunnablePassthrough()}
+        if internet_search_enabled and settings.BRAVE_API_KEY:
+            steps["internet_search"] = RunnableLambda(self._asearch_internet)
+        return RunnableParallel(steps)
 
-        if "summarizer" in answer.keys():
-            summary_query = answer["summarizer"]["key"]
-            url = f"https://api.search.brave.com/res/v1/summarizer/search?key={summary_query}"
-            response = requests.request("GET", url, headers=headers, data=payload)
-            answer = response.json()["summary"][0]["data"]
-            return answer
-        return ""
+    async def _asearch_internet(self, question: str) -> str:
+        logger.info("Using Internet search...")
+        return await brave_search_client.search(question)
 
     def _internet_search(self, context):
-        if settings.BRAVE_API_KEY:
-            logger.info("Using Internet search...")
-            data_context, question = context["context"], context["question"]
-            intent_summary_results = self._intent_summary_search(question)
+        intent_summary_results = context.pop("internet_search", "")
+        if intent_summary_results:
             # insert internet search results into context at the beginning
-            data_context.insert(
+            context["context"].insert(
                 0,
                 Document(
                     page_content=intent_summary_results,
-                    metadata={"_data_point_fqn": "internet::Internet"},
+                    metadata={
+                        DATA_POINT_FQN_METADATA_KEY: INTERNET_SEARCH_DATA_POINT_FQN
+                    },
                 ),
             )
-            context["context"] = data_context
         return context
 
-    async def _sse_wrap(self, gen):
-        async for data in gen:
-            yield "event: data\n"
-            yield f"data: {data.model_dump_json()}\n\n"
-        yield "event: end\n"
+    def _sse_wrap(self, gen, gzip: bool = False) -> AsyncIterator[bytes]:
+        """
+        Encode the stream as server sent events, see `SSEEncoder`
+        """
+        encoder = SSEEncoder(
+            required_metadata=self.required_metadata,
+            coalesce_window_ms=settings.SSE_COALESCE_WINDOW_MS,
+            coalesce_max_chars=settings.SSE_COALESCE_MAX_CHARS,
+            gzip=gzip,
+        )
+        return encoder.stream(gen)
+
+    def _stream_response(
+        self, gen, accept_encoding: Optional[str] = None
+    ) -> StreamingResponse:
+        """
+        Streaming response of server sent events, gzip compressed if the client accepts it
+        """
+        gzip = settings.SSE_GZIP and accepts_gzip(accept_encoding)
+        headers = {"Cache-Control": "no-cache"}
+        if gzip:
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+        return StreamingResponse(
+            self._sse_wrap(gen, gzip=gzip),
+            media_type="text/event-stream",
+            headers=headers,
+        )
 
     async def _stream_answer(self, rag_chain, query) -> AsyncIterator[BaseModel]:
         async with async_timeout.timeout(GENERATION_TIMEOUT_SEC):
@@ -232,11 +279,9 @@ class BaseQueryController:
                 async for chunk in rag_chain.astream(query):
                     # If the chunk has the context key, enrich the context of the chunk
                     if "context" in chunk:
-                        yield Docs(
-                            content=self._enrich_context_for_stream_response(
-                                chunk["context"]
-                            )
-                        )
+                        # Not validated into `Document`s, metadata is trimmed to
+                        # `required_metadata` by the SSE encoder
+                        yield Docs.model_construct(content=chunk["context"])
                     # If the chunk has the answer key, yield the answer
                     elif "answer" in chunk:
                         yield Answer(content=chunk["answer"])
@@ -0,0 +1,135 @@
+import re
+from functools import lru_cache
+from typing import Any, List, Optional, Set
+
+from langchain.docstore.document import Document
+
+from backend.logger import logger
+from backend.modules.parsers.chunking import count_tokens, get_tokenizer
+from backend.modules.query_controllers.types import ContextAssemblyConfig
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_TOKENIZER = "cl100k_base"
+# Documents are joined with a blank line by `_format_docs`
+DOCUMENT_SEPARATOR = "\n\n"
+SHINGLE_SIZE = 3
+WORD_REGEX = re.compile(r"\w+")
+SENTENCE_BOUNDARY_REGEX = re.compile(r"(?<=[.!?。！？])\s+")
+
+
+@lru_cache(maxsize=32)
+def get_tokenizer_for_model(model_name: str) -> Optional[Any]:
+    """
+    Tokenizer of a chat model (`provider/model_id`). Models unknown to tiktoken are counted
+    with cl100k_base, close enough to budget prompts of most models.
+    """
+    model_id = model_name.split("/")[-1]
+    if tiktoken is not None:
+        try:
+            return tiktoken.encoding_for_model(model_id)
+        except KeyError:
+            pass
+    return get_tokenizer(DEFAULT_TOKENIZER)
+
+
+def _shingles(text: str) -> Set[str]:
+    words = WORD_REGEX.findall(text.lower())
+    return {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    }
+
+
+def _trim_to_sentences(
+    text: str, query: str, token_budget: int, tokenizer: Optional[Any]
+) -> str:
+    """
+    Keep the sentences sharing the most words with the query that fit in the budget, in their original order
+    """
+    sentences = [s for s in SENTENCE_BOUNDARY_REGEX.split(text) if s.strip()]
+    query_words = set(WORD_REGEX.findall(query.lower()))
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: len(query_words & set(WORD_REGEX.findall(sentences[i].lower()))),
+        reverse=True,
+    )
+    kept = []
+    used_tokens = 0
+    for index in ranked:
+        sentence_tokens = count_tokens(tokenizer, sentences[index]) + 1
+        if used_tokens + sentence_tokens > token_budget:
+            continue
+        kept.append(index)
+        used_tokens += sentence_tokens
+    return " ".join(sentences[index] for index in sorted(kept))
+
+
+def assemble_context(
+    docs: List[Document],
+    query: str,
+    config: ContextAssemblyConfig,
+    model_name: Optional[str] = None,
+) -> List[Document]:
+    """
+    Select the documents to put in the prompt context:
+    1. Order by `relevance_score` when the retriever set one, keeping the retriever order otherwise
+    2. Drop documents mostly contained in the documents already selected (overlapping chunks,
+       the same chunk returned by several queries of a multi query retriever)
+    3. Pack documents until `token_budget` is reached, optionally trimming the ones that do not
+       fit to their most relevant sentences
+
+    Returns:
+        List[Document]: The selected documents, trimmed documents are copies.
+    """
+    if config.tokenizer:
+        tokenizer = get_tokenizer(config.tokenizer)
+    else:
+        tokenizer = get_tokenizer_for_model(model_name or DEFAULT_TOKENIZER)
+
+    ranked_docs = sorted(
+        docs,
+        key=lambda doc: doc.metadata.get("relevance_score", float("-inf")),
+        reverse=True,
+    )
+    separator_tokens = count_tokens(tokenizer, DOCUMENT_SEPARATOR)
+    selected: List[Document] = []
+    selected_shingles: Set[str] = set()
+    remaining_tokens = config.token_budget
+    for doc in ranked_docs:
+        if remaining_tokens <= separator_tokens:
+            break
+        shingles = _shingles(doc.page_content)
+        if config.deduplicate and shingles:
+            overlap = len(shingles & selected_shingles) / len(shingles)
+            if overlap >= config.max_overlap:
+                continue
+
+        doc_tokens = count_tokens(tokenizer, doc.page_content) + separator_tokens
+        if doc_tokens > remaining_tokens:
+            if not config.sentence_trimming:
+                continue
+            trimmed_content = _trim_to_sentences(
+                doc.page_content,
+                query,
+                remaining_tokens - separator_tokens,
+                tokenizer,
+            )
+            if not trimmed_content:
+                continue
+            doc = Document(page_content=trimmed_content, metadata=doc.metadata)
+            shingles = _shingles(trimmed_content)
+            doc_tokens = count_tokens(tokenizer, trimmed_content) + separator_tokens
+
+        selected.append(doc)
+        selected_shingles |= shingles
+        remaining_tokens -= doc_tokens
+
+    logger.debug(
+        f"Assembled {len(selected)}/{len(docs)} documents into "
+        f"{config.token_budget - remaining_tokens}/{config.token_budget} tokens"
+    )
+    return selected
@@ -0,0 +1,82 @@
+# Answer a file of questions with the basic RAG query controller, without going through the server
+"""
+How to run:
+
+python -m backend.modules.query_controllers.example.batch \
+--config config.json \
+--queries questions.txt \
+--output answers.ndjson \
+--max_concurrency 32
+
+`config.json` holds the request of `/retrievers/basic-rag/answer` without `query`.
+`questions.txt` has one question per line, or one JSON object with a `query` key per line.
+Answers are written as NDJSON in completion order, with the `index` of the question.
+"""
+
+import argparse
+import asyncio
+import json
+from typing import List
+
+from backend.logger import logger
+from backend.modules.query_controllers.example.controller import BasicRAGQueryController
+from backend.modules.query_controllers.example.types import ExampleBatchQueryInput
+from backend.modules.query_controllers.sse import dumps
+
+
+def read_queries(path: str) -> List[str]:
+    queries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions")
+    parser.add_argument(
+        "--config", type=str, help="JSON file of the query configuration", required=True
+    )
+    parser.add_argument(
+        "--queries", type=str, help="File of questions, one per line", required=True
+    )
+    parser.add_argument(
+        "--output", type=str, help="NDJSON file of the answers", required=True
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        help="Answers generated concurrently",
+        default=16,
+    )
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    config.pop("query", None)
+    request = ExampleBatchQueryInput(
+        **config,
+        queries=read_queries(args.queries),
+        max_concurrency=args.max_concurrency,
+    )
+    logger.info(f"Answering {len(request.queries)} questions")
+
+    done = errors = 0
+    with open(args.output, "wb") as f:
+        results = await BasicRAGQueryController().abatch_answer(request)
+        async for result in results:
+            done += 1
+            errors += "error" in result
+            f.write(dumps(result) + b"\n")
+            if done % 100 == 0:
+                logger.info(f"Answered {done}/{len(request.queries)} questions")
+    logger.info(
+        f"Answered {len(request.queries)} questions with {errors} errors, wrote {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
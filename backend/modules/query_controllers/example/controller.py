@@ -1,16 +1,27 @@
-from fastapi import Body
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from fastapi import Body, Header
 from fastapi.responses import StreamingResponse
+from langchain.docstore.document import Document
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
+from langchain_core.runnables import RunnablePassthrough
 
+from backend.logger import logger
 from backend.modules.query_controllers.base import BaseQueryController
 from backend.modules.query_controllers.example.payload import (
     QUERY_WITH_CONTEXTUAL_COMPRESSION_MULTI_QUERY_RETRIEVER_SIMILARITY_PAYLOAD,
     QUERY_WITH_CONTEXTUAL_COMPRESSION_RETRIEVER_PAYLOAD,
     QUERY_WITH_VECTOR_STORE_RETRIEVER_PAYLOAD,
 )
-from backend.modules.query_controllers.example.types import ExampleQueryInput
+from backend.modules.query_controllers.example.types import (
+    ExampleBatchQueryInput,
+    ExampleQueryInput,
+)
+from backend.modules.query_controllers.sse import dumps
+from backend.modules.vector_db.client import VECTOR_STORE_CLIENT
 from backend.server.decorators import post, query_controller
+from backend.settings import settings
 
 EXAMPLES = {
     "vector-store-similarity": QUERY_WITH_VECTOR_STORE_RETRIEVER_PAYLOAD,
@@ -18,15 +29,40 @@ EXAMPLES = {
     "contextual-compression-multi-query-similarity": QUERY_WITH_CONTEXTUAL_COMPRESSION_MULTI_QUERY_RETRIEVER_SIMILARITY_PAYLOAD,
 }
 
+# Queries embedded and searched together by the batch answer endpoint
+BATCH_SEARCH_SIZE = 256
+# Retrievers whose vector search can be batched, the others run once per query
+BATCH_RETRIEVERS = ("vectorstore", "contextual-compression")
+
 
 @query_controller("/basic-rag")
 class BasicRAGQueryController(BaseQueryController):
+    def _get_rag_chain_from_docs(self, request: ExampleQueryInput, llm):
+        """
+        Chain generating the answer from the retrieved documents (`context`) and the `question`
+        """
+        # Create the QA prompt templates
+        QA_PROMPT = self._get_prompt_template(
+            input_variables=["context", "question"],
+            template=request.prompt_template,
+        )
+        return (
+            RunnablePassthrough.assign(
+                # add internet search results to context
+                context=(lambda x: self._format_docs(x["context"]))
+            )
+            | QA_PROMPT
+            | llm
+            | StrOutputParser()
+        )
+
     @post("/answer")
     async def answer(
         self,
         request: ExampleQueryInput = Body(
             openapi_examples=EXAMPLES,
         ),
+        accept_encoding: Optional[str] = Header(default=None, include_in_schema=False),
     ):
         """
         Sample answer method to answer the question using the context from the collection
@@ -34,12 +70,6 @@ class BasicRAGQueryController(BaseQueryController):
         # Get the vector store
         vector_store = await self._get_vector_store(request.collection_name)
 
-        # Create the QA prompt templates
-        QA_PROMPT = self._get_prompt_template(
-            input_variables=["context", "question"],
-            template=request.prompt_template,
-        )
-
         # Get the LLM
         llm = self._get_llm(request.model_configuration, request.stream)
 
@@ -51,39 +81,25 @@ class BasicRAGQueryController(BaseQueryController):
         )
 
         # Using LCEL
-        rag_chain_from_docs = (
-            RunnablePassthrough.assign(
-                # add internet search results to context
-                context=(
-                    lambda x: self._format_docs(
-                        x["context"],
-                    )
-                )
-            )
-            | QA_PROMPT
-            | llm
-            | StrOutputParser()
-        )
+        rag_chain_from_docs = self._get_rag_chain_from_docs(request, llm)
 
-        rag_chain_with_source = RunnableParallel(
-            {"context": retriever, "question": RunnablePassthrough()}
+        # Internet search, if enabled, runs concurrently with the retriever
+        rag_chain_with_source = self._get_setup_and_retrieval(
+            retriever, request.internet_search_enabled
         )
 
         if request.internet_search_enabled:
-            rag_chain_with_source = (
-                rag_chain_with_source | self._internet_search
-            ).assign(answer=rag_chain_from_docs)
-        else:
-            rag_chain_with_source = rag_chain_with_source.assign(
-                answer=rag_chain_from_docs
+            rag_chain_with_source = rag_chain_with_source | self._internet_search
+        if request.context_assembly is not None:
+            rag_chain_with_source = rag_chain_with_source | self._get_context_assembly(
+                request.context_assembly, request.model_configuration.name
             )
+        rag_chain_with_source = rag_chain_with_source.assign(answer=rag_chain_from_docs)
 
         if request.stream:
-            return StreamingResponse(
-                self._sse_wrap(
-                    self._stream_answer(rag_chain_with_source, request.query),
-                ),
-                media_type="text/event-stream",
+            return self._stream_response(
+                self._stream_answer(rag_chain_with_source, request.query),
+                accept_encoding=accept_encoding,
             )
 
         else:
@@ -112,6 +128,168 @@ class BasicRAGQueryController(BaseQueryController):
                 "docs": self._enrich_context_for_non_stream_response(outputs),
             }
 
+    async def _abatch_retrieve(
+        self, vector_store, request: ExampleBatchQueryInput, queries: List[str]
+    ) -> List[Optional[List[Document]]]:
+        """
+        Documents of every query, with one embedding request and one vector db request for
+        all the queries. None for the queries the retriever has to run one at a time
+        (mmr, score threshold and multi query retrievers).
+        """
+        retriever_config = request.retriever_config
+        if (
+            request.retriever_name not in BATCH_RETRIEVERS
+            or retriever_config.search_type != "similarity"
+        ):
+            return [None] * len(queries)
+
+        # The embedders of the model gateway embed queries and documents the same way
+        vectors = await vector_store.embeddings.aembed_documents(queries)
+        return await asyncio.to_thread(
+            VECTOR_STORE_CLIENT.similarity_search_batch,
+            vector_store,
+            vectors,
+            retriever_config.search_kwargs["k"],
+            retriever_config.search_kwargs.get("filter"),
+        )
+
+    async def _aanswer_batch_query(
+        self,
+        request: ExampleBatchQueryInput,
+        index: int,
+        docs: Optional[List[Document]],
+        retriever,
+        rag_chain_from_docs,
+    ) -> Dict[str, Any]:
+        query = request.queries[index]
+        try:
+            if docs is None:
+                docs = await retriever.ainvoke(query)
+            elif request.retriever_name == "contextual-compression":
+                docs = list(
+                    await retriever.base_compressor.acompress_documents(docs, query)
+                )
+            context = {"context": docs, "question": query}
+            if request.internet_search_enabled and settings.BRAVE_API_KEY:
+                context["internet_search"] = await self._asearch_internet(query)
+                context = self._internet_search(context)
+            if request.context_assembly is not None:
+                context = await self._get_context_assembly(
+                    request.context_assembly, request.model_configuration.name
+                ).ainvoke(context)
+            answer = await rag_chain_from_docs.ainvoke(context)
+        except Exception as e:
+            logger.exception(f"Error answering query {index} of the batch: {e}")
+            return {"index": index, "query": query, "error": str(e)}
+
+        return {
+            "index": index,
+            "query": query,
+            "answer": answer,
+            "docs": [
+                doc.model_dump()
+                for doc in self._enrich_context_for_stream_response(context["context"])
+            ],
+        }
+
+    async def abatch_answer(
+        self, request: ExampleBatchQueryInput
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer all the queries of the request. The collection, retriever and model are resolved
+        once, queries are embedded and searched in batches of `BATCH_SEARCH_SIZE` and answers are
+        generated `request.max_concurrency` at a time.
+        Returns an iterator of the results (`index`, `query` and `answer` and `docs` or `error`)
+        in completion order.
+        """
+        vector_store = await self._get_vector_store(request.collection_name)
+        llm = self._get_llm(request.model_configuration)
+        retriever = await self._get_retriever(
+            vector_store=vector_store,
+            retriever_name=request.retriever_name,
+            retriever_config=request.retriever_config,
+        )
+        rag_chain_from_docs = self._get_rag_chain_from_docs(request, llm)
+        return self._stream_batch_answers(
+            request, vector_store, retriever, rag_chain_from_docs
+        )
+
+    async def _stream_batch_answers(
+        self,
+        request: ExampleBatchQueryInput,
+        vector_store,
+        retriever,
+        rag_chain_from_docs,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(request.max_concurrency)
+        results: asyncio.Queue = asyncio.Queue()
+        tasks: Set[asyncio.Task] = set()
+
+        async def _answer(index: int, docs: Optional[List[Document]]):
+            async with semaphore:
+                await results.put(
+                    await self._aanswer_batch_query(
+                        request, index, docs, retriever, rag_chain_from_docs
+                    )
+                )
+
+        async def _schedule():
+            for start in range(0, len(request.queries), BATCH_SEARCH_SIZE):
+                # Retrieve at most one batch ahead of generation
+                pending = {task for task in tasks if not task.done()}
+                while len(pending) >= BATCH_SEARCH_SIZE:
+                    _, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                queries = request.queries[start : start + BATCH_SEARCH_SIZE]
+                try:
+                    docs_batch = await self._abatch_retrieve(
+                        vector_store, request, queries
+                    )
+                except Exception as e:
+                    logger.exception(f"Error retrieving queries {start}+ of the batch")
+                    for index in range(start, start + len(queries)):
+                        await results.put(
+                            {
+                                "index": index,
+                                "query": request.queries[index],
+                                "error": str(e),
+                            }
+                        )
+                    continue
+                for index, docs in enumerate(docs_batch, start=start):
+                    tasks.add(asyncio.create_task(_answer(index, docs)))
+
+        scheduler = asyncio.create_task(_schedule())
+        try:
+            for _ in range(len(request.queries)):
+                yield await results.get()
+            await scheduler
+        finally:
+            # The client went away, stop generating
+            scheduler.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def _ndjson_wrap(self, gen) -> AsyncIterator[bytes]:
+        async for result in gen:
+            yield dumps(result) + b"\n"
+
+    @post("/answer-batch")
+    async def answer_batch(
+        self,
+        request: ExampleBatchQueryInput = Body(),
+    ):
+        """
+        Answer many questions with the same configuration, for offline evaluation and bulk QA.
+        Results are streamed as NDJSON, one line per question in completion order, with the
+        `index` of the question in `queries`.
+        """
+        return StreamingResponse(
+            self._ndjson_wrap(await self.abatch_answer(request)),
+            media_type="application/x-ndjson",
+        )
+
 
 #######
 # Streaming Client
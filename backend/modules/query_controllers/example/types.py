@@ -1,5 +1,34 @@
-from backend.modules.query_controllers.types import BaseQueryInput
+from typing import List, Optional
+
+from pydantic import Field
+
+from backend.modules.query_controllers.types import (
+    BaseQueryInput,
+    ContextAssemblyConfig,
+)
 
 
 class ExampleQueryInput(BaseQueryInput):
-    pass
+    context_assembly: Optional[ContextAssemblyConfig] = Field(
+        default=None,
+        title="Pack the retrieved documents into a token budget instead of using all of them",
+    )
+
+
+class ExampleBatchQueryInput(ExampleQueryInput):
+    """
+    Many questions answered with the same collection, retriever, model and prompt configuration
+    """
+
+    query: str = Field(default="", title="Unused, see queries")
+
+    queries: List[str] = Field(
+        min_length=1,
+        title="Questions to answer",
+    )
+
+    max_concurrency: int = Field(
+        default=16,
+        ge=1,
+        title="Maximum number of answers generated concurrently",
+    )
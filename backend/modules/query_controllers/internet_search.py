@@ -0,0 +1,100 @@
+import asyncio
+import re
+from typing import Dict
+
+import httpx
+from cachetools import TTLCache
+
+from backend.logger import logger
+from backend.modules.model_gateway.model_gateway import model_gateway
+from backend.settings import settings
+
+BRAVE_API_URL = "https://api.search.brave.com/res/v1"
+INTERNET_SEARCH_DATA_POINT_FQN = "internet::Internet"
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class BraveSearchClient:
+    """
+    Async client of the Brave search summarizer.
+    - Requests go through the pooled async client of the model gateway with strict timeouts
+    - Summaries are cached by normalized query for `INTERNET_SEARCH_CACHE_TTL_SECONDS` and
+      concurrent requests for the same query share one search
+    - A search that fails or exceeds `INTERNET_SEARCH_LATENCY_BUDGET_SECONDS` returns an empty
+      summary, the answer then uses the vector store context only
+    """
+
+    def __init__(self):
+        self._cache: TTLCache = TTLCache(
+            maxsize=settings.INTERNET_SEARCH_CACHE_SIZE,
+            ttl=settings.INTERNET_SEARCH_CACHE_TTL_SECONDS,
+        )
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def _get(self, path: str, params: Dict[str, str]) -> dict:
+        http_client = model_gateway.http_clients.get_async_client(BRAVE_API_URL)
+        response = await http_client.get(
+            f"{BRAVE_API_URL}/{path}",
+            params=params,
+            headers={
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip",
+                "X-Subscription-Token": settings.BRAVE_API_KEY,
+            },
+            timeout=httpx.Timeout(
+                settings.INTERNET_SEARCH_REQUEST_TIMEOUT_SECONDS,
+                connect=min(settings.INTERNET_SEARCH_REQUEST_TIMEOUT_SECONDS, 1.0),
+            ),
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def _intent_summary_search(self, query: str) -> str:
+        answer = await self._get("web/search", {"q": query, "summary": "1"})
+        if "summarizer" not in answer:
+            return ""
+        answer = await self._get(
+            "summarizer/search", {"key": answer["summarizer"]["key"]}
+        )
+        return answer["summary"][0]["data"]
+
+    async def _search_and_cache(self, key: str, query: str) -> str:
+        try:
+            summary = await self._intent_summary_search(query)
+        except Exception as e:
+            # Failures are not cached, the next request retries
+            logger.warning(f"Internet search failed, answering without it: {e}")
+            return ""
+        finally:
+            self._in_flight.pop(key, None)
+        self._cache[key] = summary
+        return summary
+
+    async def search(self, query: str) -> str:
+        key = normalize_query(query)
+        if key in self._cache:
+            return self._cache[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._search_and_cache(key, query))
+            self._in_flight[key] = task
+        try:
+            # Shielded so that a caller giving up does not cancel the search for the others,
+            # the summary is still cached when it arrives
+            return await asyncio.wait_for(
+                asyncio.shield(task),
+                timeout=settings.INTERNET_SEARCH_LATENCY_BUDGET_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Internet search exceeded its latency budget of "
+                f"{settings.INTERNET_SEARCH_LATENCY_BUDGET_SECONDS}s, answering without it"
+            )
+            return ""
+
+
+brave_search_client = BraveSearchClient()
@@ -1,13 +1,16 @@
 import asyncio
+from typing import Optional
 
 import async_timeout
-from fastapi import Body, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import Body, Header, HTTPException
 from langchain_core.messages import HumanMessage
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
 
+from backend.constants import DATA_POINT_FQN_METADATA_KEY
 from backend.logger import logger
 from backend.modules.query_controllers.base import BaseQueryController
+from backend.modules.query_controllers.internet_search import (
+    INTERNET_SEARCH_DATA_POINT_FQN,
+)
 from backend.modules.query_controllers.multimodal.payload import (
     PROMPT,
     QUERY_WITH_CONTEXTUAL_COMPRESSION_MULTI_QUERY_RETRIEVER_SIMILARITY_PAYLOAD,
@@ -30,7 +33,9 @@ class MultiModalRAGQueryController(BaseQueryController):
     async def _stream_vlm_answer(self, llm, message_payload, docs):
         try:
             async with async_timeout.timeout(GENERATION_TIMEOUT_SEC):
-                yield Docs(content=self._enrich_context_for_stream_response(docs))
+                # Not validated into `Document`s, metadata is trimmed to
+                # `required_metadata` by the SSE encoder
+                yield Docs.model_construct(content=docs)
                 async for chunk in llm.astream(message_payload):
                     yield Answer(content=chunk.content)
         except asyncio.TimeoutError:
@@ -62,6 +67,7 @@ class MultiModalRAGQueryController(BaseQueryController):
         request: MultiModalQueryInput = Body(
             openapi_examples=EXAMPLES,
         ),
+        accept_encoding: Optional[str] = Header(default=None, include_in_schema=False),
     ):
         """
         Sample answer method to answer the question using the context from the collection
@@ -85,20 +91,25 @@ class MultiModalRAGQueryController(BaseQueryController):
                 logger.info(f"Using default prompt")
                 prompt = PROMPT.format(question=request.query)
 
-            setup_and_retrieval = RunnableParallel(
-                {"context": retriever, "question": RunnablePassthrough()}
+            # Internet search, if enabled, runs concurrently with the retriever
+            setup_and_retrieval = self._get_setup_and_retrieval(
+                retriever, request.internet_search_enabled
             )
 
             # Generate payload for VLM
             images_set = set()
-            internet_search_result = ""
             if request.internet_search_enabled:
                 outputs = await (setup_and_retrieval | self._internet_search).ainvoke(
                     request.query
                 )
-                internet_search_result = outputs["context"][0].page_content
-                if request.internet_search_enabled:
-                    prompt += f"\nContext: {internet_search_result}"
+                internet_search_results = [
+                    doc.page_content
+                    for doc in outputs["context"]
+                    if doc.metadata.get(DATA_POINT_FQN_METADATA_KEY)
+                    == INTERNET_SEARCH_DATA_POINT_FQN
+                ]
+                if internet_search_results:
+                    prompt += f"\nContext: {internet_search_results[0]}"
                     logger.info(f"Prompt: {prompt}")
             else:
                 outputs = await setup_and_retrieval.ainvoke(request.query)
@@ -117,13 +128,9 @@ class MultiModalRAGQueryController(BaseQueryController):
             )
 
             if request.stream:
-                return StreamingResponse(
-                    self._sse_wrap(
-                        self._stream_vlm_answer(
-                            llm, message_payload, outputs["context"]
-                        ),
-                    ),
-                    media_type="text/event-stream",
+                return self._stream_response(
+                    self._stream_vlm_answer(llm, message_payload, outputs["context"]),
+                    accept_encoding=accept_encoding,
                 )
 
             else:
@@ -0,0 +1,217 @@
+import asyncio
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import Body, HTTPException
+from fastapi.responses import ORJSONResponse
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from qdrant_client.models import Filter as QdrantFilter
+
+from backend.modules.metadata_store.client import get_client
+from backend.modules.model_gateway.model_gateway import model_gateway
+from backend.modules.query_controllers.base import BaseQueryController
+from backend.modules.query_controllers.search.payload import (
+    BATCH_SEARCH_PAYLOAD,
+    SEARCH_PAYLOAD,
+    SEARCH_WITH_RERANK_PAYLOAD,
+)
+from backend.modules.query_controllers.search.types import (
+    BatchSearchQueryInput,
+    SearchQueryInput,
+)
+from backend.modules.vector_db.client import VECTOR_STORE_CLIENT
+from backend.server.decorators import post, query_controller
+from backend.types import VectorSearchResult
+
+EXAMPLES = {
+    "search": SEARCH_PAYLOAD,
+    "search-with-rerank": SEARCH_WITH_RERANK_PAYLOAD,
+}
+
+# Embedders of the collections, so that a search does not read the metadata store.
+# Short lived so that a collection deleted and recreated with another embedder is picked up.
+COLLECTION_EMBEDDER_CACHE: TTLCache = TTLCache(maxsize=256, ttl=60)
+
+
+def _encode_cursor(offset: int, score: float) -> str:
+    return base64.urlsafe_b64encode(
+        json.dumps({"offset": offset, "score": score}).encode()
+    ).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, float]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(data["offset"]), float(data["score"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@query_controller("/search")
+class SearchQueryController(BaseQueryController):
+    """
+    Retrieval only search: ranked chunks of a collection, without prompts or LLMs. The vector
+    db is queried directly, not through langchain vector stores and retrievers.
+    """
+
+    async def _get_embedder(self, collection_name: str) -> Embeddings:
+        if collection_name not in COLLECTION_EMBEDDER_CACHE:
+            client = await get_client()
+            collection = await client.aget_collection_by_name(collection_name)
+            if collection is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Collection {collection_name} not found",
+                )
+            embedder = model_gateway.get_embedder_from_embedder_config(
+                collection.embedder_config
+            )
+            COLLECTION_EMBEDDER_CACHE[collection_name] = embedder
+        return COLLECTION_EMBEDDER_CACHE[collection_name]
+
+    async def _rerank(
+        self,
+        request: SearchQueryInput,
+        query: str,
+        results: List[VectorSearchResult],
+        top_k: int,
+    ) -> List[VectorSearchResult]:
+        reranker = model_gateway.get_reranker_from_model_config(
+            model_name=request.rerank.model_name, top_k=top_k
+        )
+        docs = [
+            Document(page_content=result.page_content or "", metadata={})
+            for result in results
+        ]
+        result_by_doc = {id(doc): result for doc, result in zip(docs, results)}
+        reranked = []
+        for doc in await reranker.acompress_documents(docs, query):
+            result = result_by_doc[id(doc)]
+            result.score = doc.metadata["relevance_score"]
+            reranked.append(result)
+        return reranked
+
+    def _to_response(
+        self, request: SearchQueryInput, results: List[VectorSearchResult]
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": result.id,
+                "score": result.score,
+                "page_content": result.page_content if request.with_content else None,
+                "metadata": result.metadata,
+            }
+            for result in results
+        ]
+
+    async def _search(
+        self, request: SearchQueryInput, queries: List[str]
+    ) -> List[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """
+        Returns the page of results and the cursor of the next page of every query
+        """
+        offset, cursor_score = request.offset, None
+        if request.cursor:
+            offset, cursor_score = _decode_cursor(request.cursor)
+
+        embedder = await self._get_embedder(request.collection_name)
+        if len(queries) == 1:
+            vectors = [await embedder.aembed_query(queries[0])]
+        else:
+            # The embedders of the model gateway embed queries and documents the same way
+            vectors = await embedder.aembed_documents(queries)
+
+        # With a cursor some results are dropped before the page is cut, fetch more to fill it
+        fetch_size = request.top_k * (2 if cursor_score is not None else 1)
+        if request.rerank:
+            # Pages are cut from the reranked candidates, not from the vector search
+            limit = max(request.rerank.candidates, offset + fetch_size)
+            search_offset = 0
+        else:
+            limit = fetch_size
+            search_offset = offset
+        try:
+            results_per_query = await asyncio.to_thread(
+                VECTOR_STORE_CLIENT.search,
+                collection_name=request.collection_name,
+                vectors=vectors,
+                limit=limit,
+                offset=search_offset,
+                filter=(
+                    QdrantFilter.model_validate(request.filter)
+                    if request.filter
+                    else None
+                ),
+                score_threshold=request.score_threshold,
+                # The reranker needs the content even if it is not returned
+                with_content=request.with_content or request.rerank is not None,
+                metadata_keys=request.metadata_keys,
+            )
+        except NotImplementedError as e:
+            raise HTTPException(status_code=501, detail=str(e))
+
+        if request.rerank:
+            results_per_query = await asyncio.gather(
+                *(
+                    self._rerank(request, query, results, offset + fetch_size)
+                    for query, results in zip(queries, results_per_query)
+                )
+            )
+            results_per_query = [results[offset:] for results in results_per_query]
+
+        pages = []
+        for results in results_per_query:
+            page: List[VectorSearchResult] = []
+            consumed = 0
+            for result in results:
+                if len(page) == request.top_k:
+                    break
+                consumed += 1
+                # Chunks ranked above the end of the previous page were already returned,
+                # they show up again when chunks are added to the collection between pages
+                if cursor_score is not None and result.score > cursor_score:
+                    continue
+                page.append(result)
+            next_cursor = None
+            if len(page) == request.top_k:
+                next_cursor = _encode_cursor(offset + consumed, page[-1].score)
+            pages.append((self._to_response(request, page), next_cursor))
+        return pages
+
+    @post("/query")
+    async def search(
+        self,
+        request: SearchQueryInput = Body(
+            openapi_examples=EXAMPLES,
+        ),
+    ):
+        """
+        Ranked chunks of the collection for the query. Page with `offset`, or with the
+        `next_cursor` of the previous page.
+        """
+        [(results, next_cursor)] = await self._search(request, [request.query])
+        # Plain dicts serialized with orjson, a response model would revalidate every chunk
+        return ORJSONResponse({"results": results, "next_cursor": next_cursor})
+
+    @post("/query-batch")
+    async def search_batch(
+        self,
+        request: BatchSearchQueryInput = Body(
+            openapi_examples={"batch-search": BATCH_SEARCH_PAYLOAD},
+        ),
+    ):
+        """
+        Ranked chunks of the collection for every query, embedded and searched together
+        """
+        pages = await self._search(request, request.queries)
+        return ORJSONResponse(
+            {
+                "results": [
+                    {"query": query, "results": results, "next_cursor": next_cursor}
+                    for query, (results, next_cursor) in zip(request.queries, pages)
+                ]
+            }
+        )
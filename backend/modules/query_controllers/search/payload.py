@@ -0,0 +1,51 @@
+SEARCH = {
+    "collection_name": "creditcard",
+    "query": "Explain in detail different categories of credit cards",
+    "top_k": 10,
+    "metadata_keys": ["_data_point_fqn", "filename", "page_number"],
+}
+
+SEARCH_PAYLOAD = {
+    "summary": "search",
+    "description": """
+        Ranked chunks of the collection, only the listed metadata keys are returned.
+        Use `next_cursor` of the response as `cursor` to get the next page.""",
+    "value": SEARCH,
+}
+
+#######
+
+SEARCH_WITH_RERANK = {
+    "collection_name": "creditcard",
+    "query": "Explain in detail different categories of credit cards",
+    "top_k": 5,
+    "rerank": {
+        "model_name": "local-infinity/mixedbread-ai/mxbai-rerank-xsmall-v1",
+        "candidates": 50,
+    },
+}
+
+SEARCH_WITH_RERANK_PAYLOAD = {
+    "summary": "search with rerank",
+    "description": """
+        The top `candidates` chunks of the vector search are reranked and the top_k are returned.""",
+    "value": SEARCH_WITH_RERANK,
+}
+
+#######
+
+BATCH_SEARCH = {
+    "collection_name": "creditcard",
+    "queries": [
+        "Explain in detail different categories of credit cards",
+        "What are the features of Diners club black metal edition?",
+    ],
+    "top_k": 5,
+}
+
+BATCH_SEARCH_PAYLOAD = {
+    "summary": "batch search",
+    "description": """
+        Queries are embedded and searched together, results are returned in the order of the queries.""",
+    "value": BATCH_SEARCH,
+}
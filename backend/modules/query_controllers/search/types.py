@@ -0,0 +1,81 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import Field, model_validator
+
+from backend.types import ConfiguredBaseModel
+
+MAX_SEARCH_TOP_K = 1000
+MAX_SEARCH_BATCH_SIZE = 256
+
+
+class SearchRerankConfig(ConfiguredBaseModel):
+    """
+    Rerank the candidates of the vector search with a reranking model of the model gateway
+    """
+
+    model_name: str = Field(title="Name of the reranking model")
+
+    candidates: int = Field(
+        default=50,
+        ge=1,
+        le=MAX_SEARCH_TOP_K,
+        title="Number of chunks fetched from the vector db and reranked",
+    )
+
+
+class SearchQueryInput(ConfiguredBaseModel):
+    """
+    Retrieval only search of a collection
+    """
+
+    collection_name: str = Field(title="Collection name on which to search")
+
+    query: str = Field(title="Query to search for")
+
+    top_k: int = Field(
+        default=10, ge=1, le=MAX_SEARCH_TOP_K, title="Number of chunks to return"
+    )
+
+    offset: int = Field(default=0, ge=0, title="Number of chunks to skip")
+
+    cursor: Optional[str] = Field(
+        default=None,
+        title="`next_cursor` of the previous page, continues after it instead of `offset`",
+    )
+
+    filter: Optional[Dict[str, Any]] = Field(
+        default=None, title="Filter by document metadata"
+    )
+
+    score_threshold: Optional[float] = Field(
+        default=None, title="Minimum similarity score of the returned chunks"
+    )
+
+    rerank: Optional[SearchRerankConfig] = Field(
+        default=None, title="Rerank the chunks before returning them"
+    )
+
+    with_content: bool = Field(default=True, title="Return the content of the chunks")
+
+    metadata_keys: Optional[List[str]] = Field(
+        default=None,
+        title="Metadata keys to return, all if not set and none if empty",
+    )
+
+
+class BatchSearchQueryInput(SearchQueryInput):
+    """
+    Several retrieval only searches with the same configuration
+    """
+
+    query: str = Field(default="", title="Unused, see queries")
+
+    queries: List[str] = Field(
+        min_length=1, max_length=MAX_SEARCH_BATCH_SIZE, title="Queries to search for"
+    )
+
+    @model_validator(mode="after")
+    def validate_cursor(self) -> "BatchSearchQueryInput":
+        if self.cursor is not None:
+            raise ValueError("cursor is not supported by batch search, use offset")
+        return self
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from langchain.docstore.document import Document
+from pydantic import BaseModel
+
+from backend.modules.query_controllers.types import Answer, Docs
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DATA_EVENT_PREFIX = b"event: data\ndata: "
+EVENT_SUFFIX = b"\n\n"
+END_EVENT = b"event: end\n"
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode(
+        "utf-8"
+    )
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    if not accept_encoding:
+        return False
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class SSEEncoder:
+    """
+    Encodes the stream of a query controller (`Docs` and `Answer` models) as server sent events.
+    - Every event is written as one pre-framed bytes chunk, serialized with orjson when installed
+    - Answer tokens are coalesced into a single event until `coalesce_max_chars` characters are
+      buffered or `coalesce_window_ms` passed since the first buffered token (0 sends every token)
+    - The docs event is sent once, with only the `required_metadata` of the documents
+    - With `gzip`, the stream is compressed and flushed after every event
+    """
+
+    def __init__(
+        self,
+        required_metadata: Sequence[str],
+        coalesce_window_ms: float = 0,
+        coalesce_max_chars: int = 0,
+        gzip: bool = False,
+    ):
+        self.required_metadata = required_metadata
+        self.coalesce_window = coalesce_window_ms / 1000
+        self.coalesce_max_chars = coalesce_max_chars
+        self._compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if gzip else None
+        self._docs_sent = False
+
+    def _frame(self, payload: Dict[str, Any]) -> bytes:
+        return DATA_EVENT_PREFIX + dumps(payload) + EVENT_SUFFIX
+
+    def _serialize_doc(self, doc: Document) -> Dict[str, Any]:
+        return {
+            "page_content": doc.page_content,
+            "metadata": {
+                key: doc.metadata[key]
+                for key in self.required_metadata
+                if key in doc.metadata
+            },
+        }
+
+    def encode(self, data: BaseModel) -> Optional[bytes]:
+        """
+        Event of one model of the stream, None if it must not be sent
+        """
+        if isinstance(data, Answer):
+            return self._frame({"type": data.type, "content": data.content})
+        if isinstance(data, Docs):
+            if self._docs_sent:
+                return None
+            self._docs_sent = True
+            return self._frame(
+                {
+                    "type": data.type,
+                    "content": [self._serialize_doc(doc) for doc in data.content],
+                }
+            )
+        return self._frame(data.model_dump(mode="json"))
+
+    def _write(self, chunk: bytes) -> bytes:
+        if self._compressor is None:
+            return chunk
+        # Sync flush so that the client can decode every event as soon as it arrives
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def _end(self) -> bytes:
+        if self._compressor is None:
+            return END_EVENT
+        return self._compressor.compress(END_EVENT) + self._compressor.flush()
+
+    def _flush_answer(self, tokens: List[str]) -> bytes:
+        return self._write(self._frame({"type": "answer", "content": "".join(tokens)}))
+
+    def _keep_buffering(self, buffered_chars: int, buffered_since: float) -> bool:
+        if not self.coalesce_window and not self.coalesce_max_chars:
+            return False
+        if self.coalesce_max_chars and buffered_chars >= self.coalesce_max_chars:
+            return False
+        if (
+            self.coalesce_window
+            and time.monotonic() - buffered_since >= self.coalesce_window
+        ):
+            return False
+        return True
+
+    async def stream(self, gen: AsyncIterator[BaseModel]) -> AsyncIterator[bytes]:
+        """
+        Encode the stream. While tokens are buffered, the next item is awaited at most for the
+        rest of the window, buffered tokens are sent when the window ends even if the model
+        pauses. Outside of a window items are awaited directly, without a task per item.
+        """
+        iterator = gen.__aiter__()
+        next_item: Optional[asyncio.Future] = None
+        tokens: List[str] = []
+        buffered_chars = 0
+        buffered_since = 0.0
+        try:
+            while True:
+                if tokens and self.coalesce_window:
+                    if next_item is None:
+                        next_item = asyncio.ensure_future(iterator.__anext__())
+                    remaining = buffered_since + self.coalesce_window - time.monotonic()
+                    done, _ = await asyncio.wait({next_item}, timeout=max(remaining, 0))
+                    if not done:
+                        yield self._flush_answer(tokens)
+                        tokens, buffered_chars = [], 0
+                        continue
+                try:
+                    if next_item is not None:
+                        item, next_item = next_item, None
+                        data = await item
+                    else:
+                        data = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+
+                if isinstance(data, Answer):
+                    if not tokens:
+                        buffered_since = time.monotonic()
+                    tokens.append(data.content)
+                    buffered_chars += len(data.content)
+                    if self._keep_buffering(buffered_chars, buffered_since):
+                        continue
+                    yield self._flush_answer(tokens)
+                    tokens, buffered_chars = [], 0
+                    continue
+
+                # Keep the order of events, buffered tokens go out first
+                if tokens:
+                    yield self._flush_answer(tokens)
+                    tokens, buffered_chars = [], 0
+                chunk = self.encode(data)
+                if chunk is not None:
+                    yield self._write(chunk)
+        finally:
+            # The client went away while the next item was awaited
+            if next_item is not None:
+                next_item.cancel()
+
+        if tokens:
+            yield self._flush_answer(tokens)
+        yield self._end()
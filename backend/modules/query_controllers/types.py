@@ -115,6 +115,40 @@ class ContextualCompressionMultiQueryRetrieverConfig(
     pass
 
 
+class ContextAssemblyConfig(ConfiguredBaseModel):
+    """
+    Configuration to assemble the retrieved documents into a prompt context of bounded size
+    """
+
+    token_budget: int = Field(
+        default=4000,
+        gt=0,
+        title="Maximum number of tokens of the context",
+    )
+
+    tokenizer: Optional[str] = Field(
+        default=None,
+        title="tiktoken encoding or HuggingFace tokenizer to count tokens with, defaults to the one of the model",
+    )
+
+    deduplicate: bool = Field(
+        default=True,
+        title="Drop documents whose content is mostly contained in documents already in the context",
+    )
+
+    max_overlap: float = Field(
+        default=0.8,
+        ge=0,
+        le=1,
+        title="Fraction of shingles a document may share with the context before it is dropped as a duplicate",
+    )
+
+    sentence_trimming: bool = Field(
+        default=False,
+        title="Keep the sentences most relevant to the question of documents that do not fit the remaining budget",
+    )
+
+
 class BaseQueryInput(ConfiguredBaseModel):
     """
     Model for Query input.
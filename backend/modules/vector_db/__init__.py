@@ -1,22 +1,53 @@
+from backend.logger import logger
 from backend.modules.vector_db.base import BaseVectorDB
-
-# from backend.modules.vector_db.mongo import MongoVectorDB
+from backend.modules.vector_db.numpy_db import NumpyVectorDB
 from backend.modules.vector_db.qdrant import QdrantVectorDB
 
 # from backend.modules.vector_db.singlestore import SingleStoreVectorDB
 # from backend.modules.vector_db.weaviate import WeaviateVectorDB
 from backend.types import VectorDBConfig
 
+# Providers whose optional dependencies failed to import, with the import error
+UNAVAILABLE_VECTOR_DBS = {}
+
+try:
+    # pymongo and langchain-mongodb are installed with vectordb.requirements.txt
+    from backend.modules.vector_db.mongo import MongoVectorDB
+except ImportError as e:
+    logger.warning(f"mongo vector db is not available: {e}")
+    UNAVAILABLE_VECTOR_DBS["mongo"] = str(e)
+    MongoVectorDB = None
+
+try:
+    # pymilvus and langchain-milvus are installed with vectordb.requirements.txt
+    from backend.modules.vector_db.milvus import MilvusVectorDB
+except ImportError as e:
+    logger.warning(f"milvus vector db is not available: {e}")
+    UNAVAILABLE_VECTOR_DBS["milvus"] = str(e)
+    MilvusVectorDB = None
+
 SUPPORTED_VECTOR_DBS = {
     "qdrant": QdrantVectorDB,
-    # "mongo": MongoVectorDB,
+    "numpy": NumpyVectorDB,
     # "weaviate": WeaviateVectorDB,
     # "singlestore": SingleStoreVectorDB,
 }
 
+if MongoVectorDB is not None:
+    SUPPORTED_VECTOR_DBS["mongo"] = MongoVectorDB
+
+if MilvusVectorDB is not None:
+    SUPPORTED_VECTOR_DBS["milvus"] = MilvusVectorDB
+
 
 def get_vector_db_client(config: VectorDBConfig) -> BaseVectorDB:
     if config.provider in SUPPORTED_VECTOR_DBS:
         return SUPPORTED_VECTOR_DBS[config.provider](config=config)
+    elif config.provider in UNAVAILABLE_VECTOR_DBS:
+        raise ValueError(
+            f"Vector db provider {config.provider} could not be imported: "
+            f"{UNAVAILABLE_VECTOR_DBS[config.provider]}. "
+            "Install backend/vectordb.requirements.txt to use it"
+        )
     else:
         raise ValueError(f"Unknown vector db provider: {config.provider}")
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Any, List, Optional
 
 from langchain.docstore.document import Document
 from langchain.embeddings.base import Embeddings
@@ -7,17 +7,29 @@ from langchain.schema.vectorstore import VectorStore
 
 from backend.constants import DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE
 from backend.logger import logger
-from backend.types import DataPointVector
+from backend.types import DataPointVector, VectorDataType, VectorSearchResult
 
 
 class BaseVectorDB(ABC):
     @abstractmethod
-    def create_collection(self, collection_name: str, embeddings: Embeddings):
+    def create_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ):
         """
         Create a collection in the vector database
         """
         raise NotImplementedError()
 
+    async def await_collection_ready(self, collection_name: str):
+        """
+        Wait until a newly created collection can be searched. Vector dbs building their
+        search index in the background after `create_collection` override this.
+        """
+        return
+
     @abstractmethod
     def upsert_documents(
         self,
@@ -85,6 +97,124 @@ class BaseVectorDB(ABC):
         """
         raise NotImplementedError()
 
+    def supports_filtered_deletes(self) -> bool:
+        """
+        Whether the vector db can delete all vectors of a data source with a single filter
+        """
+        return False
+
+    def delete_data_source_vectors(
+        self,
+        collection_name: str,
+        data_source_fqn: str,
+        exclude_data_ingestion_run_name: Optional[str] = None,
+    ):
+        """
+        Delete all vectors of a data source from the collection, except the ones written by
+        `exclude_data_ingestion_run_name`. The deletion is pushed down to the vector db as a filter.
+        """
+        raise NotImplementedError()
+
+    def supports_blue_green_reindex(self, collection_name: str) -> bool:
+        """
+        Whether the vector db can build a shadow collection and atomically swap it in
+        place of `collection_name`
+        """
+        return False
+
+    def create_shadow_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ) -> str:
+        """
+        Create a new physical collection that will replace `collection_name` once it is
+        swapped in. Returns the name of the shadow collection.
+        """
+        raise NotImplementedError()
+
+    def copy_data_point_vectors(
+        self,
+        source_collection_name: str,
+        target_collection_name: str,
+        exclude_data_source_fqn: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE,
+    ) -> int:
+        """
+        Copy vectors of all data sources except `exclude_data_source_fqn` (if given) from the
+        source collection to the target collection. Returns the number of copied vectors.
+        """
+        raise NotImplementedError()
+
+    def swap_collection(
+        self, collection_name: str, shadow_collection_name: str
+    ) -> Optional[str]:
+        """
+        Atomically point `collection_name` to `shadow_collection_name`.
+        Returns the name of the physical collection that was swapped out, if any.
+        """
+        raise NotImplementedError()
+
+    def drop_physical_collection(self, physical_collection_name: str):
+        """
+        Drop a physical collection that is no longer served under any collection name
+        """
+        raise NotImplementedError()
+
+    def warn_if_vector_dtype_unsupported(
+        self,
+        vector_dtype: VectorDataType,
+        supported: tuple = (VectorDataType.FLOAT32,),
+    ):
+        """
+        Vector dbs store float32 vectors unless they support the requested datatype
+        """
+        # Configs validated with `use_enum_values` hold the plain string
+        vector_dtype = VectorDataType(vector_dtype)
+        if vector_dtype not in supported:
+            logger.warning(
+                f"{self.__class__.__name__} does not support {vector_dtype.value} vectors, storing float32 vectors"
+            )
+
+    def similarity_search_batch(
+        self,
+        vector_store: VectorStore,
+        vectors: List[List[float]],
+        k: int,
+        filter: Optional[Any] = None,
+    ) -> List[List[Document]]:
+        """
+        Top k documents of every query vector. Vector dbs able to run several searches in
+        one request override this, the default runs one search per vector.
+        """
+        return [
+            vector_store.similarity_search_by_vector(vector, k=k, filter=filter)
+            for vector in vectors
+        ]
+
+    def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        limit: int,
+        offset: int = 0,
+        filter: Optional[Any] = None,
+        score_threshold: Optional[float] = None,
+        with_content: bool = True,
+        metadata_keys: Optional[List[str]] = None,
+    ) -> List[List[VectorSearchResult]]:
+        """
+        Search the collection directly, without a langchain vector store, once per query vector.
+        Only the content (`with_content`) and the metadata keys (`metadata_keys`, all if None)
+        that are requested are fetched from the vector db.
+        Raises NotImplementedError for vector dbs without direct search, or for a `filter` the
+        vector db cannot apply.
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support direct search"
+        )
+
     def get_embedding_dimensions(self, embeddings: Embeddings) -> int:
         """
         Fetch embedding dimensions
@@ -1,4 +1,6 @@
-from typing import List
+import json
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from langchain.docstore.document import Document
 from langchain.embeddings.base import Embeddings
@@ -6,16 +8,51 @@ from langchain_milvus import Milvus
 from pymilvus import CollectionSchema, DataType, FieldSchema, MilvusClient
 
 from backend.constants import (
+    DATA_INGESTION_RUN_NAME_METADATA_KEY,
     DATA_POINT_FQN_METADATA_KEY,
     DATA_POINT_HASH_METADATA_KEY,
+    DATA_SOURCE_FQN_METADATA_KEY,
     DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE,
 )
 from backend.logger import logger
 from backend.modules.vector_db.base import BaseVectorDB
-from backend.types import DataPointVector, VectorDBConfig
+from backend.types import (
+    DataPointVector,
+    MilvusClientConfig,
+    VectorDataType,
+    VectorDBConfig,
+    VectorSearchResult,
+)
 
 MAX_SCROLL_LIMIT = int(1e6)
 BATCH_SIZE = 1000
+# Clauses of one delete expression
+DELETE_BATCH_SIZE = 100
+
+# Build parameters of the supported ANN indexes, `m` of IVF_PQ depends on the dimension
+DEFAULT_INDEX_PARAMS = {
+    "FLAT": {},
+    "HNSW": {"M": 16, "efConstruction": 200},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "nbits": 8},
+}
+# Query time parameters of the supported ANN indexes, more recall than the langchain defaults
+DEFAULT_SEARCH_PARAMS = {
+    "FLAT": {},
+    "HNSW": {"ef": 64},
+    "IVF_FLAT": {"nprobe": 16},
+    "IVF_PQ": {"nprobe": 16},
+}
+MILVUS_LITE_INDEX_TYPES = ("FLAT", "IVF_FLAT")
+# Metrics where a larger distance means a closer match
+SIMILARITY_METRIC_TYPES = ("COSINE", "IP")
+
+
+def _get_pq_subquantizers(dimension: int) -> int:
+    """
+    Number of sub-vectors of IVF_PQ: it has to divide the dimension, sub-vectors of 4 dimensions at least
+    """
+    return max(m for m in range(1, max(dimension // 4, 1) + 1) if dimension % m == 0)
 
 
 class MilvusVectorDB(BaseVectorDB):
@@ -43,41 +80,81 @@ class MilvusVectorDB(BaseVectorDB):
             -   api_key: str
                 Token for authentication with the Milvus server.
         """
-        # TODO: create an extended config for Milvus like done in Qdrant
         logger.debug(f"Connecting to Milvus using config: {config.model_dump()}")
         self.config = config
-        self.metric_type = config.config.get("metric_type", "COSINE")
+        self.milvus_config = MilvusClientConfig.model_validate(config.config or {})
+        self.metric_type = self.milvus_config.metric_type
         # Milvus-lite is used for local == True
         if config.local is True:
             # TODO: make this path customizable
             self.url = "./cognita_milvus.db"
             self.api_key = ""
-            self.milvus_client = MilvusClient(
-                uri=self.url,
-                db_name=config.config.get("db_name", "milvus_default_db"),
-            )
         else:
             self.url = config.url
-            self.api_key = config.api_key
-            if not self.api_key:
-                api_key = None
-
-            self.milvus_client = MilvusClient(
-                uri=self.url,
-                token=api_key,
-                db_name=config.config.get("db_name", "milvus_default_db"),
+            self.api_key = config.api_key or ""
+        # Milvus Lite also serves uris pointing to a local file
+        self.is_milvus_lite = config.local is True or self.url.endswith(".db")
+        self.milvus_client = MilvusClient(
+            uri=self.url,
+            token=self.api_key,
+            db_name=self.milvus_config.db_name,
+        )
+        # Index type of the vectors of every collection, to pick the query time parameters
+        self._index_types: Dict[str, str] = {}
+
+    def _get_index_type(self) -> str:
+        index_type = self.milvus_config.index_type or (
+            "IVF_FLAT" if self.is_milvus_lite else "HNSW"
+        )
+        if self.is_milvus_lite and index_type not in MILVUS_LITE_INDEX_TYPES:
+            logger.warning(
+                f"[Milvus] Milvus Lite does not support {index_type} indexes, using IVF_FLAT"
             )
+            index_type = "IVF_FLAT"
+        return index_type
+
+    def _get_index_params(self, index_type: str, dimension: int) -> Dict[str, Any]:
+        index_params = {
+            **DEFAULT_INDEX_PARAMS[index_type],
+            **self.milvus_config.index_params,
+        }
+        if index_type == "IVF_PQ" and "m" not in index_params:
+            index_params["m"] = _get_pq_subquantizers(dimension)
+        return index_params
+
+    def _get_search_params(self, collection_name: str) -> Dict[str, Any]:
+        """
+        Query time profile of the collection: the defaults of its index type and the
+        configured `search_params`
+        """
+        if collection_name not in self._index_types:
+            index = self.milvus_client.describe_index(
+                collection_name=collection_name, index_name="vector"
+            )
+            self._index_types[collection_name] = index.get("index_type", "FLAT")
+        return {
+            "metric_type": self.metric_type,
+            "params": {
+                **DEFAULT_SEARCH_PARAMS.get(self._index_types[collection_name], {}),
+                **self.milvus_config.search_params,
+            },
+        }
 
-    def create_collection(self, collection_name: str, embeddings: Embeddings):
+    def create_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ):
         """
         Create a collection in the vector database
         Args:
         :param collection_name: str - Name of the collection
         :param embeddings: Embeddings - Embeddings object to be used for creating embeddings of the documents
-        Current implementation includes Quick setup in which the collection is created, indexed and loaded into the memory.
+        The vectors are indexed with the configured `index_type` and `index_params`.
 
         """
-        # TODO: Add customized setup with indexed params
+        self.warn_if_vector_dtype_unsupported(vector_dtype)
         logger.debug(f"[Milvus] Creating new collection {collection_name}")
 
         vector_size = self.get_embedding_dimensions(embeddings)
@@ -102,41 +179,62 @@ class MilvusVectorDB(BaseVectorDB):
         )
 
         # Can use this to create custom multiple indices
+        index_type = self._get_index_type()
+        params = self._get_index_params(index_type, vector_size)
         index_params = self.milvus_client.prepare_index_params()
         index_params.add_index(
-            field_name="vector", index_type="FLAT", metric_type=self.metric_type
+            field_name="vector",
+            index_type=index_type,
+            metric_type=self.metric_type,
+            params=params,
         )
         self.milvus_client.create_index(
             collection_name=collection_name, index_params=index_params
         )
+        self._index_types[collection_name] = index_type
 
-        logger.debug(f"[Milvus] Created new collection {collection_name}")
+        logger.debug(
+            f"[Milvus] Created new collection {collection_name} with a {index_type} index {params}"
+        )
 
-    def _delete_existing_documents(
+    def _delete_outdated_documents(
         self, collection_name: str, documents: List[Document]
     ):
         """
-        Delete existing documents from the collection
+        Delete the previous versions of the data points being upserted, with one expression
+        delete per `DELETE_BATCH_SIZE` hashes
         """
-        # Instead of using document IDs, we'll delete based on metadata matching
-        for doc in documents:
-            if (
-                DATA_POINT_FQN_METADATA_KEY in doc.metadata
-                and DATA_POINT_HASH_METADATA_KEY in doc.metadata
-            ):
-                delete_expr = (
-                    f'metadata["{DATA_POINT_FQN_METADATA_KEY}"] == "{doc.metadata[DATA_POINT_FQN_METADATA_KEY]}" && '
-                    f'metadata["{DATA_POINT_HASH_METADATA_KEY}"] == "{doc.metadata[DATA_POINT_HASH_METADATA_KEY]}"'
-                )
-
-                logger.debug(
-                    f"[Milvus] Deleting records matching expression: {delete_expr}"
-                )
+        # Data point fqns grouped by their new hash, a clause deletes the chunks of these
+        # data points with any other hash
+        data_point_fqns_by_hash: Dict[str, List[str]] = defaultdict(list)
+        for data_point_fqn, data_point_hash in {
+            doc.metadata[DATA_POINT_FQN_METADATA_KEY]: doc.metadata[
+                DATA_POINT_HASH_METADATA_KEY
+            ]
+            for doc in documents
+            if doc.metadata.get(DATA_POINT_FQN_METADATA_KEY)
+            and doc.metadata.get(DATA_POINT_HASH_METADATA_KEY)
+        }.items():
+            data_point_fqns_by_hash[data_point_hash].append(data_point_fqn)
+        if not data_point_fqns_by_hash:
+            return
 
-                self.milvus_client.delete(
-                    collection_name=collection_name,
-                    filter=delete_expr,
-                )
+        logger.debug(
+            f"[Milvus] Incremental Ingestion: Deleting outdated documents for {sum(map(len, data_point_fqns_by_hash.values()))} data point fqns from collection {collection_name}"
+        )
+        clauses = [
+            f'(metadata["{DATA_POINT_FQN_METADATA_KEY}"] in {json.dumps(data_point_fqns)} && '
+            f'metadata["{DATA_POINT_HASH_METADATA_KEY}"] != {json.dumps(data_point_hash)})'
+            for data_point_hash, data_point_fqns in data_point_fqns_by_hash.items()
+        ]
+        for i in range(0, len(clauses), DELETE_BATCH_SIZE):
+            self.milvus_client.delete(
+                collection_name=collection_name,
+                filter=" || ".join(clauses[i : i + DELETE_BATCH_SIZE]),
+            )
+        logger.debug(
+            f"[Milvus] Incremental Ingestion: Deleted outdated documents from collection {collection_name}"
+        )
 
     def upsert_documents(
         self,
@@ -149,9 +247,8 @@ class MilvusVectorDB(BaseVectorDB):
         Upsert documents in the database.
         Upsert =  Insert / update
         - Check if collection exists or not
-        - Check if collection is empty or not
-        - If collection is empty, insert all documents
-        - If collection is not empty, delete existing documents and insert new documents
+        - Insert all documents
+        - If incremental, delete the previous versions of the upserted data points
         """
         if len(documents) == 0:
             logger.warning("No documents to index")
@@ -166,21 +263,26 @@ class MilvusVectorDB(BaseVectorDB):
                 f"Collection {collection_name} does not exist. Please create it first using `create_collection`."
             )
 
-        stats = self.milvus_client.get_collection_stats(collection_name=collection_name)
-        if stats["row_count"] == 0:
-            logger.warning(
-                f"[Milvus] Collection {collection_name} is empty. Inserting all documents."
-            )
-            self.get_vector_store(collection_name, embeddings).add_documents(
-                documents=documents
+        # Same rows as the langchain vector store writes, inserted with the client directly
+        vectors = embeddings.embed_documents([doc.page_content for doc in documents])
+        for i in range(0, len(documents), BATCH_SIZE):
+            self.milvus_client.insert(
+                collection_name=collection_name,
+                data=[
+                    {
+                        "vector": vector,
+                        "text": doc.page_content,
+                        "metadata": doc.metadata,
+                    }
+                    for doc, vector in zip(
+                        documents[i : i + BATCH_SIZE], vectors[i : i + BATCH_SIZE]
+                    )
+                ],
             )
 
-        if incremental and len(documents) > 0:
-            self._delete_existing_documents(collection_name, documents)
-
-        self.get_vector_store(collection_name, embeddings).add_documents(
-            documents=documents
-        )
+        # Delete the previous versions of the upserted data points
+        if incremental:
+            self._delete_outdated_documents(collection_name, documents)
 
         logger.debug(
             f"[Milvus] Upserted {len(documents)} documents to collection {collection_name}"
@@ -195,6 +297,7 @@ class MilvusVectorDB(BaseVectorDB):
     def delete_collection(self, collection_name: str):
         logger.debug(f"[Milvus] Deleting {collection_name} collection")
         self.milvus_client.drop_collection(collection_name)
+        self._index_types.pop(collection_name, None)
         logger.debug(f"[Milvus] Deleted {collection_name} collection")
 
     def get_vector_store(self, collection_name: str, embeddings: Embeddings):
@@ -206,6 +309,7 @@ class MilvusVectorDB(BaseVectorDB):
                 "token": self.api_key,
             },
             embedding_function=embeddings,
+            search_params=self._get_search_params(collection_name),
             auto_id=True,
             primary_field="id",
             text_field="text",
@@ -216,6 +320,89 @@ class MilvusVectorDB(BaseVectorDB):
         logger.debug("[Milvus] Getting Milvus client")
         return self.milvus_client
 
+    def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        limit: int,
+        offset: int = 0,
+        filter: Optional[Any] = None,
+        score_threshold: Optional[float] = None,
+        with_content: bool = True,
+        metadata_keys: Optional[List[str]] = None,
+    ) -> List[List[VectorSearchResult]]:
+        if filter is not None:
+            raise NotImplementedError(
+                "[Milvus] Search filters are Qdrant filters, they are not supported by Milvus"
+            )
+        search_params = self._get_search_params(collection_name)
+        results = self.milvus_client.search(
+            collection_name=collection_name,
+            data=vectors,
+            limit=limit,
+            offset=offset,
+            output_fields=["metadata", "text"] if with_content else ["metadata"],
+            search_params=search_params,
+        )
+        is_similarity = search_params["metric_type"] in SIMILARITY_METRIC_TYPES
+        search_results = []
+        for hits in results:
+            query_results = []
+            for hit in hits:
+                score = hit["distance"]
+                if score_threshold is not None and (
+                    score < score_threshold
+                    if is_similarity
+                    else score > score_threshold
+                ):
+                    break
+                entity = hit["entity"]
+                metadata = entity.get("metadata") or {}
+                if metadata_keys is not None:
+                    metadata = {
+                        key: metadata[key] for key in metadata_keys if key in metadata
+                    }
+                query_results.append(
+                    VectorSearchResult(
+                        id=str(hit["id"]),
+                        score=score,
+                        page_content=entity.get("text") if with_content else None,
+                        metadata=metadata,
+                    )
+                )
+            search_results.append(query_results)
+        return search_results
+
+    def _scan(
+        self,
+        collection_name: str,
+        filter_expr: str,
+        batch_size: int,
+        output_fields: Tuple[str, ...] = ("id", "metadata"),
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield pages of the entities matching `filter_expr`, by default their ids and metadata
+        """
+        # Pages of increasing primary keys: queries return entities in primary key order and
+        # unlike offsets the page size does not count against the query window of Milvus
+        last_id = None
+        while True:
+            search_result = self.milvus_client.query(
+                collection_name=collection_name,
+                filter=(
+                    filter_expr
+                    if last_id is None
+                    else f"{filter_expr} && id > {last_id}"
+                ),
+                output_fields=list(output_fields),
+                limit=batch_size,
+            )
+            if search_result:
+                yield search_result
+            if len(search_result) < batch_size:
+                break
+            last_id = search_result[-1]["id"]
+
     def list_data_point_vectors(
         self,
         collection_name: str,
@@ -228,25 +415,11 @@ class MilvusVectorDB(BaseVectorDB):
         logger.debug(
             f"[Milvus] Listing data point vectors for collection {collection_name}"
         )
-        filter_expr = (
-            f'metadata["{DATA_POINT_FQN_METADATA_KEY}"] == "{data_source_fqn}"'
-        )
+        filter_expr = f'metadata["{DATA_SOURCE_FQN_METADATA_KEY}"] == {json.dumps(data_source_fqn)}'
 
         data_point_vectors: List[DataPointVector] = []
 
-        offset = 0
-
-        while True:
-            search_result = self.milvus_client.query(
-                collection_name=collection_name,
-                filter=filter_expr,
-                output_fields=[
-                    "*"
-                ],  # returning all the fields of the entity / data point
-                limit=batch_size,
-                offset=offset,
-            )
-
+        for search_result in self._scan(collection_name, filter_expr, batch_size):
             for result in search_result:
                 if result.get("metadata", {}).get(
                     DATA_POINT_FQN_METADATA_KEY
@@ -263,14 +436,9 @@ class MilvusVectorDB(BaseVectorDB):
                         )
                     )
 
-            if (
-                len(search_result) < batch_size
-                or len(data_point_vectors) >= MAX_SCROLL_LIMIT
-            ):
+            if len(data_point_vectors) >= MAX_SCROLL_LIMIT:
                 break
 
-            offset += batch_size
-
         logger.debug(f"[Milvus] Listed {len(data_point_vectors)} data point vectors")
 
         return data_point_vectors
@@ -289,12 +457,90 @@ class MilvusVectorDB(BaseVectorDB):
         for i in range(0, len(data_point_vectors), batch_size):
             batch_vectors = data_point_vectors[i : i + batch_size]
 
-            delete_expr = " or ".join(
-                [f"id == {vector.data_point_vector_id}" for vector in batch_vectors]
-            )
+            delete_expr = f"id in {json.dumps([int(vector.data_point_vector_id) for vector in batch_vectors])}"
 
             self.milvus_client.delete(
                 collection_name=collection_name, filter=delete_expr
             )
 
         logger.debug(f"[Milvus] Deleted {len(data_point_vectors)} data point vectors")
+
+    def supports_filtered_deletes(self) -> bool:
+        return True
+
+    def delete_data_source_vectors(
+        self,
+        collection_name: str,
+        data_source_fqn: str,
+        exclude_data_ingestion_run_name: Optional[str] = None,
+    ):
+        """
+        Delete all vectors of a data source with an expression delete. Milvus versions whose
+        comparisons never match missing json keys keep the vectors written before run names were
+        recorded in the metadata, until their run names are backfilled with
+        `backfill_data_ingestion_run_names`.
+        """
+        logger.debug(
+            f"[Milvus] Deleting vectors of data source {data_source_fqn} from collection {collection_name}"
+        )
+        delete_expr = f'metadata["{DATA_SOURCE_FQN_METADATA_KEY}"] == {json.dumps(data_source_fqn)}'
+        if exclude_data_ingestion_run_name:
+            delete_expr = (
+                f'{delete_expr} && metadata["{DATA_INGESTION_RUN_NAME_METADATA_KEY}"] != '
+                f"{json.dumps(exclude_data_ingestion_run_name)}"
+            )
+        self.milvus_client.delete(collection_name=collection_name, filter=delete_expr)
+        logger.debug(
+            f"[Milvus] Deleted vectors of data source {data_source_fqn} from collection {collection_name}"
+        )
+
+    def backfill_data_ingestion_run_names(
+        self,
+        collection_name: str,
+        data_ingestion_run_name: str,
+        batch_size: int = BATCH_SIZE,
+    ) -> int:
+        """
+        Set `data_ingestion_run_name` on the vectors of data sources written before run names
+        were recorded in the metadata, so that FULL ingestion cleans them up with its filtered
+        delete. Milvus has no partial updates, the vectors are re-inserted and the old ones are
+        deleted by id. Returns the number of backfilled vectors.
+        """
+        backfilled_count = 0
+        for search_result in self._scan(
+            collection_name,
+            f'metadata["{DATA_SOURCE_FQN_METADATA_KEY}"] != ""',
+            batch_size,
+            output_fields=("id", "vector", "text", "metadata"),
+        ):
+            entities = [
+                entity
+                for entity in search_result
+                if DATA_INGESTION_RUN_NAME_METADATA_KEY not in entity["metadata"]
+            ]
+            if not entities:
+                continue
+            # Inserted first, an interrupted backfill leaves duplicates rather than losing vectors
+            self.milvus_client.insert(
+                collection_name=collection_name,
+                data=[
+                    {
+                        "vector": entity["vector"],
+                        "text": entity["text"],
+                        "metadata": {
+                            **entity["metadata"],
+                            DATA_INGESTION_RUN_NAME_METADATA_KEY: data_ingestion_run_name,
+                        },
+                    }
+                    for entity in entities
+                ],
+            )
+            self.milvus_client.delete(
+                collection_name=collection_name,
+                filter=f"id in {json.dumps([entity['id'] for entity in entities])}",
+            )
+            backfilled_count += len(entities)
+        logger.debug(
+            f"[Milvus] Backfilled run names of {backfilled_count} vectors of collection {collection_name}"
+        )
+        return backfilled_count
@@ -1,25 +1,55 @@
-import time
-from typing import List
+import asyncio
+import re
+from typing import Any, Dict, Iterator, List, Optional
 
+from bson import ObjectId
 from langchain.docstore.document import Document
 from langchain.embeddings.base import Embeddings
 from langchain.schema.vectorstore import VectorStore
 from langchain_mongodb import MongoDBAtlasVectorSearch
-from pymongo import MongoClient
+from pymongo import ASCENDING, DeleteMany, IndexModel, InsertOne, MongoClient
 from pymongo.operations import SearchIndexModel
 
 from backend.constants import (
+    DATA_INGESTION_RUN_NAME_METADATA_KEY,
     DATA_POINT_FQN_METADATA_KEY,
     DATA_POINT_HASH_METADATA_KEY,
+    DATA_SOURCE_FQN_METADATA_KEY,
     DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE,
+    FQN_SEPARATOR,
 )
 from backend.logger import logger
 from backend.modules.vector_db.base import BaseVectorDB
-from backend.types import DataPointVector, VectorDBConfig
+from backend.types import (
+    DataPointVector,
+    VectorDataType,
+    VectorDBConfig,
+    VectorSearchResult,
+)
 
 MAX_SCROLL_LIMIT = int(1e6)
 BATCH_SIZE = 1000
 
+SEARCH_INDEX_NAME = "vector_search_index"
+SEARCH_INDEX_READY_TIMEOUT_SECONDS = 120
+SEARCH_INDEX_POLL_MIN_INTERVAL_SECONDS = 1
+SEARCH_INDEX_POLL_MAX_INTERVAL_SECONDS = 10
+
+# Document layout of `MongoDBAtlasVectorSearch`: content and embedding fields, with the
+# metadata keys at the top level of the document (not under a `metadata` field)
+TEXT_KEY = "text"
+EMBEDDING_KEY = "embedding"
+# Field the vector search score is projected to, out of the way of metadata keys
+SEARCH_SCORE_KEY = "_search_score"
+# Candidates of the approximate search per result, the server caps them at MAX_NUM_CANDIDATES
+SEARCH_OVERSAMPLING_FACTOR = 10
+MAX_NUM_CANDIDATES = 10000
+
+
+def _to_object_id(id: str):
+    # Documents inserted by the driver have ObjectId ids, listed as strings
+    return ObjectId(id) if ObjectId.is_valid(id) else id
+
 
 class MongoVectorDB(BaseVectorDB):
     def __init__(self, config: VectorDBConfig):
@@ -27,59 +57,114 @@ class MongoVectorDB(BaseVectorDB):
         self.config = config
         self.client = MongoClient(config.url)
         self.db = self.client[config.config.get("database_name")]
+        # Collections whose filter indexes were ensured by this process
+        self._indexed_collections = set()
 
-    def create_collection(self, collection_name: str, embeddings: Embeddings) -> None:
+    def create_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ) -> None:
         """Create a collection with vector search index"""
+        self.warn_if_vector_dtype_unsupported(
+            vector_dtype, supported=(VectorDataType.FLOAT32, VectorDataType.UINT8)
+        )
         if collection_name in self.db.list_collection_names():
             raise ValueError(f"Collection {collection_name} already exists in MongoDB")
 
         # Create the collection first
         self.db.create_collection(collection_name)
+        self._create_indexes(collection_name)
 
         # Define the search index model
-        self._create_search_index(collection_name, embeddings)
+        self._create_search_index(collection_name, embeddings, vector_dtype)
+
+    def _create_indexes(self, collection_name: str):
+        """
+        Regular indexes behind the data point and data source filters: listing, incremental
+        deletes and data source deletes are index range scans. Listing pages on the
+        (fqn, _id) index, which serves both its fqn filter and its sort. Idempotent.
+        """
+        self.db[collection_name].create_indexes(
+            [
+                IndexModel(
+                    [
+                        (DATA_POINT_FQN_METADATA_KEY, ASCENDING),
+                        (DATA_POINT_HASH_METADATA_KEY, ASCENDING),
+                    ]
+                ),
+                IndexModel(
+                    [
+                        (DATA_POINT_FQN_METADATA_KEY, ASCENDING),
+                        ("_id", ASCENDING),
+                    ]
+                ),
+                IndexModel(
+                    [
+                        (DATA_SOURCE_FQN_METADATA_KEY, ASCENDING),
+                        (DATA_INGESTION_RUN_NAME_METADATA_KEY, ASCENDING),
+                    ]
+                ),
+            ]
+        )
+        self._indexed_collections.add(collection_name)
 
-    def _create_search_index(self, collection_name: str, embeddings: Embeddings):
+    def _create_search_index(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ):
         # Mongo DB requires a vector search index to be created with a specific configuration
         # Number of dimensions are calculated based on the embedding model. We use a sample text to get the number of dimensions
         # Similarity is set to cosine as we are using cosine similarity for the vector search. This can be changed to euclidean, dotproduct etc as per the requirements.
         # Path is set to "embedding" as embeddings are stored in the "embedding" field in the collection by default in MongoDB.
         # Reference: https://www.mongodb.com/docs/atlas/atlas-vector-search/vector-search-type/
+        vector_field = {
+            "type": "vector",
+            "path": EMBEDDING_KEY,
+            "numDimensions": self.get_embedding_dimensions(embeddings),
+            "similarity": "cosine",
+        }
+        if vector_dtype == VectorDataType.UINT8:
+            # The index holds int8 scalar quantized vectors, documents keep full precision vectors
+            vector_field["quantization"] = "scalar"
         search_index_model = SearchIndexModel(
-            definition={
-                "fields": [
-                    {
-                        "type": "vector",
-                        "path": "embedding",
-                        "numDimensions": self.get_embedding_dimensions(embeddings),
-                        "similarity": "cosine",
-                    }
-                ]
-            },
-            name="vector_search_index",
+            definition={"fields": [vector_field]},
+            name=SEARCH_INDEX_NAME,
             type="vectorSearch",
         )
 
-        # Create the search index
+        # Create the search index. It builds in the background, see `await_collection_ready`
         result = self.db[collection_name].create_search_index(model=search_index_model)
         logger.debug(f"New search index named {result} is building.")
 
+    def _is_search_index_ready(self, collection_name: str) -> bool:
+        indices = list(self.db[collection_name].list_search_indexes(SEARCH_INDEX_NAME))
+        return bool(indices) and indices[0].get("queryable") is True
+
+    async def await_collection_ready(self, collection_name: str):
         # Immediate availability of the index is not guaranteed upon creation.
         # MongoDB documentation recommends polling for the index to be ready.
-        # Ensure this check to provide a seamless experience.
         # TODO (mnvsk97): We might want to introduce a new status in the ingestion runs to reflex this.
         logger.debug(
             "Polling to check if the index is ready. This may take up to a minute."
         )
-        predicate = lambda index: index.get("queryable") is True  # noqa: E731
-        while True:
-            indices = list(
-                self.db[collection_name].list_search_indexes("vector_search_index")
-            )
-            if len(indices) and predicate(indices[0]):
-                break
-            time.sleep(5)
-        logger.debug(f"{result} is ready for querying.")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SEARCH_INDEX_READY_TIMEOUT_SECONDS
+        delay = SEARCH_INDEX_POLL_MIN_INTERVAL_SECONDS
+        while not await asyncio.to_thread(self._is_search_index_ready, collection_name):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.warning(
+                    f"[Mongo] Search index of collection {collection_name} is not ready after "
+                    f"{SEARCH_INDEX_READY_TIMEOUT_SECONDS}s, searches return nothing until it is"
+                )
+                return
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, SEARCH_INDEX_POLL_MAX_INTERVAL_SECONDS)
+        logger.debug(f"{SEARCH_INDEX_NAME} of {collection_name} is ready for querying.")
 
     def upsert_documents(
         self,
@@ -91,89 +176,174 @@ class MongoVectorDB(BaseVectorDB):
         if len(documents) == 0:
             logger.warning("No documents to index")
             return
-        # get record IDs to be upserted
         logger.debug(
             f"[Mongo] Adding {len(documents)} documents to collection {collection_name}"
         )
 
         """Upsert documents with their embeddings"""
         collection = self.db[collection_name]
-
-        data_point_fqns = []
-        for document in documents:
-            if document.metadata.get(DATA_POINT_FQN_METADATA_KEY):
-                data_point_fqns.append(
-                    document.metadata.get(DATA_POINT_FQN_METADATA_KEY)
+        if collection_name not in self._indexed_collections:
+            # Collections created before the indexes were introduced get them on first write
+            self._create_indexes(collection_name)
+
+        # Add Documents, in the layout of `MongoDBAtlasVectorSearch` (metadata at the top level)
+        vectors = embeddings.embed_documents([doc.page_content for doc in documents])
+        result = collection.bulk_write(
+            [
+                InsertOne(
+                    {TEXT_KEY: doc.page_content, EMBEDDING_KEY: vector, **doc.metadata}
                 )
-
-        logger.debug(f"[Mongo] documents: {documents}")
-
-        record_ids_to_be_upserted: List[str] = self._get_records_to_be_upserted(
-            collection_name=collection_name,
-            data_point_fqns=data_point_fqns,
-            incremental=incremental,
+                for doc, vector in zip(documents, vectors)
+            ],
+            ordered=False,
         )
-
-        # Add Documents
-        MongoDBAtlasVectorSearch(
-            collection=collection,
-            embedding=embeddings,
-        ).add_documents(documents=documents)
         logger.debug(
-            f"[Mongo] Added {len(documents)} documents to collection {collection_name}"
+            f"[Mongo] Added {result.inserted_count} documents to collection {collection_name}"
         )
 
-        if len(record_ids_to_be_upserted) > 0:
-            logger.debug(
-                f"[Mongo] Deleting {len(record_ids_to_be_upserted)} outdated documents from collection {collection_name}"
-            )
-            for i in range(
-                0, len(record_ids_to_be_upserted), DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE
-            ):
-                record_ids_to_be_processed = record_ids_to_be_upserted[
-                    i : i + DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE
-                ]
-                collection.delete_many({"_id": {"$in": record_ids_to_be_processed}})
-            logger.debug(
-                f"[Mongo] Deleted {len(record_ids_to_be_upserted)} outdated documents from collection {collection_name}"
+        # Delete the previous versions of the upserted data points
+        if incremental:
+            self._delete_outdated_documents(
+                collection_name=collection_name, documents=documents
             )
 
-    def _get_records_to_be_upserted(
-        self, collection_name: str, data_point_fqns: List[str], incremental: bool = True
-    ) -> List[str]:
-        """Get record IDs to be upserted"""
-        if not incremental:
-            return []
+    def _delete_outdated_documents(
+        self, collection_name: str, documents: List[Document]
+    ):
+        """
+        Delete the previous versions of the data points being upserted.
+        The deletion is pushed down to mongo as a filter, so no record ids are fetched to the client.
+        """
+        data_point_fqn_to_hash: Dict[str, str] = {}
+        for document in documents:
+            data_point_fqn = document.metadata.get(DATA_POINT_FQN_METADATA_KEY)
+            data_point_hash = document.metadata.get(DATA_POINT_HASH_METADATA_KEY)
+            if data_point_fqn and data_point_hash:
+                data_point_fqn_to_hash[data_point_fqn] = data_point_hash
+        if not data_point_fqn_to_hash:
+            return
 
-        # For incremental deletion, we delete the documents with the same document_id
         logger.debug(
-            f"[Mongo] Incremental Ingestion: Fetching documents for {len(data_point_fqns)} data point fqns for collection {collection_name}"
+            f"[Mongo] Incremental Ingestion: Deleting outdated documents for {len(data_point_fqn_to_hash)} data point fqns from collection {collection_name}"
+        )
+        # One delete per data point, each one a range scan of the (fqn, hash) index
+        operations = [
+            DeleteMany(
+                {
+                    DATA_POINT_FQN_METADATA_KEY: data_point_fqn,
+                    DATA_POINT_HASH_METADATA_KEY: {"$ne": data_point_hash},
+                }
+            )
+            for data_point_fqn, data_point_hash in data_point_fqn_to_hash.items()
+        ]
+        deleted_count = self._bulk_delete(collection_name, operations)
+        logger.debug(
+            f"[Mongo] Incremental Ingestion: collection={collection_name} Addition={len(data_point_fqn_to_hash)}, Deleted={deleted_count}"
         )
 
+    def _bulk_delete(
+        self,
+        collection_name: str,
+        operations: List[DeleteMany],
+        batch_size: int = DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE,
+    ) -> int:
+        """
+        Run deletes as unordered bulk writes of `batch_size` operations, returns the deleted count
+        """
         collection = self.db[collection_name]
-        record_ids_to_be_upserted = []
-
-        # Query in batches to avoid memory issues
-        for i in range(0, len(data_point_fqns), DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE):
-            batch_fqns = data_point_fqns[i : i + DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE]
-
-            cursor = collection.find(
-                {f"metadata.{DATA_POINT_FQN_METADATA_KEY}": {"$in": batch_fqns}},
-                {"_id": 1},
+        deleted_count = 0
+        for i in range(0, len(operations), batch_size):
+            result = collection.bulk_write(
+                operations[i : i + batch_size], ordered=False
             )
+            deleted_count += result.deleted_count
+        return deleted_count
 
-            for doc in cursor:
-                record_ids_to_be_upserted.append(doc["_id"])
-                if len(record_ids_to_be_upserted) > MAX_SCROLL_LIMIT:
-                    break
+    def _scan(
+        self,
+        collection_name: str,
+        query: Dict[str, Any],
+        projection: Dict[str, int],
+        batch_size: int = BATCH_SIZE,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Documents matching `query`, fetched one key range at a time. Every batch starts after
+        the last key of the previous one, unlike `skip` which rescans all the skipped documents.
+        Queries on the data point fqn are keyed by (fqn, _id), other queries by `_id`.
+        """
+        if DATA_POINT_FQN_METADATA_KEY in query:
+            return self._scan_by_data_point_fqn(
+                collection_name, query, projection, batch_size
+            )
+        return self._scan_by_id(collection_name, query, projection, batch_size)
 
-            if len(record_ids_to_be_upserted) > MAX_SCROLL_LIMIT:
-                break
+    def _scan_by_id(
+        self,
+        collection_name: str,
+        query: Dict[str, Any],
+        projection: Dict[str, int],
+        batch_size: int,
+    ) -> Iterator[Dict[str, Any]]:
+        collection = self.db[collection_name]
+        last_id = None
+        while True:
+            batch_query = (
+                query if last_id is None else {**query, "_id": {"$gt": last_id}}
+            )
+            batch = list(
+                collection.find(batch_query, projection)
+                .sort("_id", ASCENDING)
+                .limit(batch_size)
+            )
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            last_id = batch[-1]["_id"]
 
-        logger.debug(
-            f"[Mongo] Incremental Ingestion: collection={collection_name} Addition={len(data_point_fqns)}, Updates={len(record_ids_to_be_upserted)}"
-        )
-        return record_ids_to_be_upserted
+    def _scan_by_data_point_fqn(
+        self,
+        collection_name: str,
+        query: Dict[str, Any],
+        projection: Dict[str, int],
+        batch_size: int,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Batches after (last fqn, last _id) are the rest of the last fqn followed by the fqns
+        after it, both range scans of the (fqn, _id) index in sort order, so neither the
+        filter nor the sort reads documents outside the batch.
+        """
+        collection = self.db[collection_name]
+        sort = [(DATA_POINT_FQN_METADATA_KEY, ASCENDING), ("_id", ASCENDING)]
+        projection = {**projection, DATA_POINT_FQN_METADATA_KEY: 1}
+        batch = list(collection.find(query, projection).sort(sort).limit(batch_size))
+        while True:
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            last_fqn = batch[-1][DATA_POINT_FQN_METADATA_KEY]
+            rest_of_fqn_query = {
+                "$and": [
+                    query,
+                    {
+                        DATA_POINT_FQN_METADATA_KEY: last_fqn,
+                        "_id": {"$gt": batch[-1]["_id"]},
+                    },
+                ]
+            }
+            batch = list(
+                collection.find(rest_of_fqn_query, projection)
+                .sort(sort)
+                .limit(batch_size)
+            )
+            if len(batch) < batch_size:
+                next_fqns_query = {
+                    "$and": [query, {DATA_POINT_FQN_METADATA_KEY: {"$gt": last_fqn}}]
+                }
+                batch += list(
+                    collection.find(next_fqns_query, projection)
+                    .sort(sort)
+                    .limit(batch_size - len(batch))
+                )
 
     def get_collections(self) -> List[str]:
         """Get all collection names"""
@@ -182,6 +352,7 @@ class MongoVectorDB(BaseVectorDB):
     def delete_collection(self, collection_name: str):
         """Delete a collection"""
         self.db.drop_collection(collection_name)
+        self._indexed_collections.discard(collection_name)
 
     def get_vector_store(
         self, collection_name: str, embeddings: Embeddings
@@ -190,13 +361,99 @@ class MongoVectorDB(BaseVectorDB):
         return MongoDBAtlasVectorSearch(
             collection=self.db[collection_name],
             embedding=embeddings,
-            index_name="vector_search_index",
+            index_name=SEARCH_INDEX_NAME,
+            text_key=TEXT_KEY,
+            embedding_key=EMBEDDING_KEY,
         )
 
     def get_vector_client(self):
         """Get MongoDB client"""
         return self.client
 
+    def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        limit: int,
+        offset: int = 0,
+        filter: Optional[Any] = None,
+        score_threshold: Optional[float] = None,
+        with_content: bool = True,
+        metadata_keys: Optional[List[str]] = None,
+    ) -> List[List[VectorSearchResult]]:
+        if filter is not None:
+            raise NotImplementedError(
+                "[MongoDB] Search filters are Qdrant filters, they are not supported by MongoDB"
+            )
+        if metadata_keys is None:
+            projection = {EMBEDDING_KEY: 0}
+            if not with_content:
+                projection[TEXT_KEY] = 0
+        else:
+            projection = {SEARCH_SCORE_KEY: 1, **{key: 1 for key in metadata_keys}}
+            if with_content:
+                projection[TEXT_KEY] = 1
+        search_results = []
+        for vector in vectors:
+            pipeline = [
+                {
+                    "$vectorSearch": {
+                        "index": SEARCH_INDEX_NAME,
+                        "path": EMBEDDING_KEY,
+                        "queryVector": vector,
+                        "numCandidates": min(
+                            (offset + limit) * SEARCH_OVERSAMPLING_FACTOR,
+                            MAX_NUM_CANDIDATES,
+                        ),
+                        "limit": offset + limit,
+                    }
+                },
+                {"$addFields": {SEARCH_SCORE_KEY: {"$meta": "vectorSearchScore"}}},
+            ]
+            if offset:
+                pipeline.append({"$skip": offset})
+            if score_threshold is not None:
+                pipeline.append(
+                    {"$match": {SEARCH_SCORE_KEY: {"$gte": score_threshold}}}
+                )
+            pipeline.append({"$project": projection})
+            query_results = []
+            for doc in self.db[collection_name].aggregate(pipeline):
+                query_results.append(
+                    VectorSearchResult(
+                        id=str(doc.pop("_id")),
+                        score=doc.pop(SEARCH_SCORE_KEY),
+                        page_content=doc.pop(TEXT_KEY, None) if with_content else None,
+                        metadata=doc,
+                    )
+                )
+            search_results.append(query_results)
+        return search_results
+
+    def _list_data_point_vectors(
+        self, collection_name: str, query: Dict[str, Any], batch_size: int
+    ) -> List[DataPointVector]:
+        data_point_vectors: List[DataPointVector] = []
+        for doc in self._scan(
+            collection_name,
+            query,
+            {DATA_POINT_FQN_METADATA_KEY: 1, DATA_POINT_HASH_METADATA_KEY: 1},
+            batch_size=batch_size,
+        ):
+            if doc.get(DATA_POINT_FQN_METADATA_KEY) and doc.get(
+                DATA_POINT_HASH_METADATA_KEY
+            ):
+                data_point_vectors.append(
+                    DataPointVector(
+                        data_point_vector_id=str(doc["_id"]),
+                        data_point_fqn=doc[DATA_POINT_FQN_METADATA_KEY],
+                        data_point_hash=doc[DATA_POINT_HASH_METADATA_KEY],
+                    )
+                )
+            if len(data_point_vectors) > MAX_SCROLL_LIMIT:
+                break
+        return data_point_vectors
+
     def list_data_point_vectors(
         self,
         collection_name: str,
@@ -206,52 +463,17 @@ class MongoVectorDB(BaseVectorDB):
         logger.debug(
             f"[Mongo] Listing all data point vectors for collection {collection_name}"
         )
-        stop = False
-        offset = None
-        data_point_vectors: List[DataPointVector] = []
-        collection = self.db[collection_name]
-
-        while stop is not True:
-            batch_cursor = (
-                collection.find(
-                    {f"metadata.{DATA_POINT_FQN_METADATA_KEY}": data_source_fqn},
-                    {
-                        "_id": 1,
-                        f"metadata.{DATA_POINT_FQN_METADATA_KEY}": 1,
-                        f"metadata.{DATA_POINT_HASH_METADATA_KEY}": 1,
-                    },
-                )
-                .skip(offset if offset else 0)
-                .limit(batch_size)
-            )
-
-            # Convert cursor to list to check if we got any results
-            batch_results = list(batch_cursor)
-            if not batch_results:
-                stop = True
-                break
-
-            for doc in batch_results:
-                metadata = doc.get("metadata", {})
-                if metadata.get(DATA_POINT_FQN_METADATA_KEY) and metadata.get(
-                    DATA_POINT_HASH_METADATA_KEY
-                ):
-                    data_point_vectors.append(
-                        DataPointVector(
-                            data_point_vector_id=str(doc["_id"]),
-                            data_point_fqn=metadata.get(DATA_POINT_FQN_METADATA_KEY),
-                            data_point_hash=metadata.get(DATA_POINT_HASH_METADATA_KEY),
-                        )
-                    )
-                if len(data_point_vectors) > MAX_SCROLL_LIMIT:
-                    stop = True
-                    break
-
-            if len(batch_results) < batch_size:
-                stop = True
-            else:
-                offset = (offset if offset else 0) + batch_size
-
+        # Data point fqns are `<data source fqn>::<uri>`, an anchored regex is a range scan
+        # of the (fqn, _id) index
+        data_point_vectors = self._list_data_point_vectors(
+            collection_name,
+            {
+                DATA_POINT_FQN_METADATA_KEY: {
+                    "$regex": f"^{re.escape(data_source_fqn + FQN_SEPARATOR)}"
+                }
+            },
+            batch_size=batch_size,
+        )
         logger.debug(
             f"[Mongo] Listing {len(data_point_vectors)} data point vectors for collection {collection_name}"
         )
@@ -264,13 +486,42 @@ class MongoVectorDB(BaseVectorDB):
         batch_size: int = DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE,
     ):
         """Delete vectors by their IDs"""
-        collection = self.db[collection_name]
-        vector_ids = [vector.id for vector in data_point_vectors]
+        logger.debug(f"[Mongo] Deleting {len(data_point_vectors)} data point vectors")
+        vector_ids = [
+            _to_object_id(vector.data_point_vector_id) for vector in data_point_vectors
+        ]
+        deleted_count = self._bulk_delete(
+            collection_name,
+            [
+                DeleteMany({"_id": {"$in": vector_ids[i : i + batch_size]}})
+                for i in range(0, len(vector_ids), batch_size)
+            ],
+        )
+        logger.debug(
+            f"[Mongo] Deleted {deleted_count} data point vectors from collection {collection_name}"
+        )
 
-        # Delete in batches
-        for i in range(0, len(vector_ids), batch_size):
-            batch = vector_ids[i : i + batch_size]
-            collection.delete_many({"_id": {"$in": batch}})
+    def supports_filtered_deletes(self) -> bool:
+        return True
+
+    def delete_data_source_vectors(
+        self,
+        collection_name: str,
+        data_source_fqn: str,
+        exclude_data_ingestion_run_name: Optional[str] = None,
+    ):
+        logger.debug(
+            f"[Mongo] Deleting vectors of data source {data_source_fqn} from collection {collection_name}"
+        )
+        query = {DATA_SOURCE_FQN_METADATA_KEY: data_source_fqn}
+        if exclude_data_ingestion_run_name:
+            query[DATA_INGESTION_RUN_NAME_METADATA_KEY] = {
+                "$ne": exclude_data_ingestion_run_name
+            }
+        result = self.db[collection_name].delete_many(query)
+        logger.debug(
+            f"[Mongo] Deleted {result.deleted_count} vectors of data source {data_source_fqn} from collection {collection_name}"
+        )
 
     def list_documents_in_collection(
         self, collection_name: str, base_document_id: str = None
@@ -281,45 +532,21 @@ class MongoVectorDB(BaseVectorDB):
         logger.debug(
             f"[Mongo] Listing all documents with base document id {base_document_id} for collection {collection_name}"
         )
-        stop = False
-        offset = None
         document_ids_set = set()
-        collection = self.db[collection_name]
-
-        while stop is not True:
-            batch_cursor = (
-                collection.find(
-                    {f"metadata.{DATA_POINT_FQN_METADATA_KEY}": base_document_id}
-                    if base_document_id
-                    else {},
-                    {f"metadata.{DATA_POINT_FQN_METADATA_KEY}": 1},
-                )
-                .skip(offset if offset else 0)
-                .limit(BATCH_SIZE)
-            )
-
-            # Convert cursor to list to check if we got any results
-            batch_results = list(batch_cursor)
-            if not batch_results:
-                stop = True
+        for doc in self._scan(
+            collection_name,
+            (
+                {DATA_POINT_FQN_METADATA_KEY: base_document_id}
+                if base_document_id
+                else {}
+            ),
+            {DATA_POINT_FQN_METADATA_KEY: 1},
+        ):
+            if doc.get(DATA_POINT_FQN_METADATA_KEY):
+                document_ids_set.add(doc[DATA_POINT_FQN_METADATA_KEY])
+            if len(document_ids_set) > MAX_SCROLL_LIMIT:
                 break
 
-            for doc in batch_results:
-                if doc.get("metadata") and doc.get("metadata").get(
-                    DATA_POINT_FQN_METADATA_KEY
-                ):
-                    document_ids_set.add(
-                        doc.get("metadata").get(DATA_POINT_FQN_METADATA_KEY)
-                    )
-                if len(document_ids_set) > MAX_SCROLL_LIMIT:
-                    stop = True
-                    break
-
-            if len(batch_results) < BATCH_SIZE:
-                stop = True
-            else:
-                offset = (offset if offset else 0) + BATCH_SIZE
-
         logger.debug(
             f"[Mongo] Found {len(document_ids_set)} documents with base document id {base_document_id} for collection {collection_name}"
         )
@@ -332,24 +559,21 @@ class MongoVectorDB(BaseVectorDB):
         logger.debug(
             f"[Mongo] Deleting {len(document_ids)} documents from collection {collection_name}"
         )
-        try:
-            collection = self.db[collection_name]
-        except Exception as exp:
-            logger.debug(exp)
-            return
-
-        for i in range(0, len(document_ids), BATCH_SIZE):
-            document_ids_to_be_processed = document_ids[i : i + BATCH_SIZE]
-            collection.delete_many(
-                {
-                    f"metadata.{DATA_POINT_FQN_METADATA_KEY}": {
-                        "$in": document_ids_to_be_processed
+        deleted_count = self._bulk_delete(
+            collection_name,
+            [
+                DeleteMany(
+                    {
+                        DATA_POINT_FQN_METADATA_KEY: {
+                            "$in": document_ids[i : i + BATCH_SIZE]
+                        }
                     }
-                }
-            )
-
+                )
+                for i in range(0, len(document_ids), BATCH_SIZE)
+            ],
+        )
         logger.debug(
-            f"[Mongo] Deleted {len(document_ids)} documents from collection {collection_name}"
+            f"[Mongo] Deleted {deleted_count} chunks of {len(document_ids)} documents from collection {collection_name}"
         )
 
     def list_document_vector_points(
@@ -361,52 +585,9 @@ class MongoVectorDB(BaseVectorDB):
         logger.debug(
             f"[Mongo] Listing all document vector points for collection {collection_name}"
         )
-        stop = False
-        offset = None
-        document_vector_points: List[DataPointVector] = []
-        collection = self.db[collection_name]
-
-        while stop is not True:
-            batch_cursor = (
-                collection.find(
-                    {},
-                    {
-                        "_id": 1,
-                        f"metadata.{DATA_POINT_FQN_METADATA_KEY}": 1,
-                        f"metadata.{DATA_POINT_HASH_METADATA_KEY}": 1,
-                    },
-                )
-                .skip(offset if offset else 0)
-                .limit(BATCH_SIZE)
-            )
-
-            # Convert cursor to list to check if we got any results
-            batch_results = list(batch_cursor)
-            if not batch_results:
-                stop = True
-                break
-
-            for doc in batch_results:
-                metadata = doc.get("metadata", {})
-                if metadata.get(DATA_POINT_FQN_METADATA_KEY) and metadata.get(
-                    DATA_POINT_HASH_METADATA_KEY
-                ):
-                    document_vector_points.append(
-                        DataPointVector(
-                            point_id=str(doc["_id"]),
-                            document_id=metadata.get(DATA_POINT_FQN_METADATA_KEY),
-                            document_hash=metadata.get(DATA_POINT_HASH_METADATA_KEY),
-                        )
-                    )
-                if len(document_vector_points) > MAX_SCROLL_LIMIT:
-                    stop = True
-                    break
-
-            if len(batch_results) < BATCH_SIZE:
-                stop = True
-            else:
-                offset = (offset if offset else 0) + BATCH_SIZE
-
+        document_vector_points = self._list_data_point_vectors(
+            collection_name, {}, batch_size=BATCH_SIZE
+        )
         logger.debug(
             f"[Mongo] Listed {len(document_vector_points)} document vector points for collection {collection_name}"
         )
@@ -0,0 +1,1168 @@
+import fcntl
+import json
+import math
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain.schema.vectorstore import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from backend.constants import (
+    DATA_INGESTION_RUN_NAME_METADATA_KEY,
+    DATA_POINT_FQN_METADATA_KEY,
+    DATA_POINT_HASH_METADATA_KEY,
+    DATA_SOURCE_FQN_METADATA_KEY,
+    DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE,
+    FQN_SEPARATOR,
+)
+from backend.logger import logger
+from backend.modules.vector_db.base import BaseVectorDB
+from backend.types import (
+    DataPointVector,
+    NumpyVectorDBConfig,
+    VectorDataType,
+    VectorDBConfig,
+    VectorSearchResult,
+)
+
+META_FILE = "meta.json"
+LOCK_FILE = "write.lock"
+
+# Metadata keys indexed in memory, filters can only match these keys
+INDEXED_METADATA_KEYS = (
+    DATA_POINT_FQN_METADATA_KEY,
+    DATA_POINT_HASH_METADATA_KEY,
+    DATA_SOURCE_FQN_METADATA_KEY,
+    DATA_INGESTION_RUN_NAME_METADATA_KEY,
+)
+
+SUPPORTED_VECTOR_DTYPES = (VectorDataType.FLOAT32, VectorDataType.FLOAT16)
+
+# Rows the vector file grows by at least, it doubles in size after that
+MIN_CAPACITY = 1024
+
+# Deleted rows are compacted away once there are this many and more than live rows
+COMPACTION_MIN_DELETED_ROWS = 10_000
+
+IVF_MAX_LISTS = 4096
+IVF_TRAINING_POINTS_PER_LIST = 64
+IVF_TRAINING_ITERATIONS = 10
+# Rows assigned to the centroids per matrix product while training the IVF index
+IVF_ASSIGNMENT_CHUNK_SIZE = 4096
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Unit length vectors, the dot product of two of them is their cosine similarity
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _dumps(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _merge_top_k(
+    best_scores: np.ndarray,
+    best_rows: np.ndarray,
+    scores: np.ndarray,
+    rows: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the k best (unordered) scores of every query among the previous best and a new chunk
+    """
+    scores = np.concatenate([best_scores, scores], axis=1)
+    rows = np.concatenate([best_rows, rows], axis=1)
+    if scores.shape[1] > k:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, top, axis=1)
+        rows = np.take_along_axis(rows, top, axis=1)
+    return scores, rows
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Nearest centroid of every vector
+    """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), IVF_ASSIGNMENT_CHUNK_SIZE):
+        chunk = np.asarray(
+            vectors[start : start + IVF_ASSIGNMENT_CHUNK_SIZE], dtype=np.float32
+        )
+        assignments[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _train_centroids(sample: np.ndarray, num_lists: int) -> np.ndarray:
+    """
+    Spherical k-means: centroids are renormalized after every update
+    """
+    rng = np.random.default_rng(0)
+    centroids = sample[rng.choice(len(sample), num_lists, replace=False)].copy()
+    for _ in range(IVF_TRAINING_ITERATIONS):
+        assignments = _assign(sample, centroids)
+        order = np.argsort(assignments, kind="stable")
+        lists, starts = np.unique(assignments[order], return_index=True)
+        # Empty lists keep their previous centroid
+        centroids[lists] = np.add.reduceat(sample[order], starts, axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class _Snapshot(NamedTuple):
+    """
+    Consistent view of a collection for one search. Compaction replaces the files and indexes
+    of a collection instead of mutating them, so a snapshot stays valid while it is used.
+    """
+
+    count: int
+    vectors: Optional[np.ndarray]
+    ids: List[str]
+    payload_offsets: List[Tuple[int, int]]
+    payload_file: Any
+    centroids: Optional[np.ndarray]
+    assignments: Optional[np.ndarray]
+
+
+class _Collection:
+    """
+    One collection stored in its own directory:
+    - `vectors.<generation>.bin`: unit length vectors, memory-mapped, one row per chunk
+    - `payload.<generation>.jsonl`: append only log of added chunks (id, content, metadata)
+      and of deleted ids. The row of a chunk is the position of its record in the log.
+    - `ivf-<version>-*.<generation>.*`: centroids and row assignments of the IVF index, once
+      the collection is large enough
+    - `meta.json`: dimension, dtype and current generation/IVF version, replaced atomically
+
+    Vectors are written before the log records that reference them, so readers in other
+    processes (the ingestion job and the server) pick up changes by replaying the new records
+    of the log. Writers are serialized across processes with a file lock.
+    """
+
+    def __init__(self, path: str, config: NumpyVectorDBConfig):
+        self.path = path
+        self.config = config
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._meta: Dict[str, Any] = {}
+        self._reset()
+
+    @classmethod
+    def create(cls, path: str, dimension: int, dtype: VectorDataType):
+        os.makedirs(path)
+        generation = uuid.uuid4().hex
+        open(os.path.join(path, f"payload.{generation}.jsonl"), "wb").close()
+        open(os.path.join(path, f"vectors.{generation}.bin"), "wb").close()
+        cls._write_meta(
+            path,
+            {
+                "dimension": dimension,
+                "dtype": dtype.value,
+                "generation": generation,
+                "ivf_version": None,
+                "ivf_trained_count": 0,
+            },
+        )
+
+    @staticmethod
+    def _write_meta(path: str, meta: Dict[str, Any]):
+        tmp_path = os.path.join(path, f"{META_FILE}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(path, META_FILE))
+
+    def _reset(self):
+        self._count = 0
+        self._num_alive = 0
+        self._log_offset = 0
+        self._ids: List[str] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._payload_offsets: List[Tuple[int, int]] = []
+        self._alive = np.zeros(0, dtype=bool)
+        # Metadata value of every row and rows of every metadata value, per indexed key
+        self._row_values: Dict[str, List[Optional[str]]] = {
+            key: [] for key in INDEXED_METADATA_KEYS
+        }
+        self._index: Dict[str, Dict[str, Set[int]]] = {
+            key: {} for key in INDEXED_METADATA_KEYS
+        }
+        # Files are not closed here, searches running on a snapshot may still read them
+        self._payload_file = None
+        self._vectors: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+
+    @property
+    def dimension(self) -> int:
+        return self._meta["dimension"]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self._meta["dtype"])
+
+    def _file(self, name: str, extension: str, generation: Optional[str] = None) -> str:
+        generation = generation or self._meta["generation"]
+        return os.path.join(self.path, f"{name}.{generation}.{extension}")
+
+    def _ivf_file(
+        self,
+        name: str,
+        extension: str,
+        version: Optional[str] = None,
+        generation: Optional[str] = None,
+    ) -> str:
+        version = version or self._meta["ivf_version"]
+        return self._file(f"ivf-{version}-{name}", extension, generation)
+
+    # Reading
+
+    def _refresh(self):
+        """
+        Load the changes made since the last refresh, by this process or another one
+        """
+        with self._lock:
+            try:
+                self._load()
+            except FileNotFoundError:
+                # Files of a generation are removed right after a compaction,
+                # the next meta points to the new ones
+                self._load()
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"Collection {os.path.basename(self.path)} does not exist")
+        generation_changed = meta["generation"] != self._meta.get("generation")
+        if generation_changed:
+            self._reset()
+            self._meta = meta
+            self._payload_file = open(self._file("payload", "jsonl"), "rb")
+        if generation_changed or meta["ivf_version"] != self._meta["ivf_version"]:
+            self._meta = meta
+            self._centroids = None
+            self._assignments = None
+            if meta["ivf_version"]:
+                self._centroids = np.load(self._ivf_file("centroids", "npy"))
+        self._meta = meta
+        self._replay()
+        self._map()
+
+    def _replay(self):
+        size = os.fstat(self._payload_file.fileno()).st_size
+        if size <= self._log_offset:
+            return
+        data = os.pread(
+            self._payload_file.fileno(), size - self._log_offset, self._log_offset
+        )
+        # A record being appended by a writer is replayed once it is complete
+        end = data.rfind(b"\n") + 1
+        position = 0
+        while position < end:
+            line_end = data.index(b"\n", position)
+            record = json.loads(data[position:line_end])
+            if record["op"] == "add":
+                self._add_row(record, self._log_offset + position, line_end - position)
+            else:
+                for id in record["ids"]:
+                    self._delete_row(id)
+            position = line_end + 1
+        self._log_offset += end
+
+    def _add_row(self, record: Dict[str, Any], offset: int, length: int):
+        row = self._count
+        if row >= len(self._alive):
+            alive = np.zeros(max(MIN_CAPACITY, 2 * len(self._alive)), dtype=bool)
+            alive[: len(self._alive)] = self._alive
+            self._alive = alive
+        self._alive[row] = True
+        self._ids.append(record["id"])
+        self._row_by_id[record["id"]] = row
+        self._payload_offsets.append((offset, length))
+        metadata = record.get("metadata") or {}
+        for key in INDEXED_METADATA_KEYS:
+            value = metadata.get(key)
+            self._row_values[key].append(value)
+            if value is not None:
+                self._index[key].setdefault(value, set()).add(row)
+        self._count += 1
+        self._num_alive += 1
+
+    def _delete_row(self, id: str):
+        row = self._row_by_id.pop(id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._num_alive -= 1
+        for key in INDEXED_METADATA_KEYS:
+            value = self._row_values[key][row]
+            if value is not None:
+                rows = self._index[key][value]
+                rows.discard(row)
+                if not rows:
+                    del self._index[key][value]
+
+    def _map(self):
+        """
+        Memory-map the whole vector file, again once it outgrew the current mapping
+        """
+        if self._count == 0:
+            return
+        if self._vectors is None or len(self._vectors) < self._count:
+            self._vectors = np.memmap(
+                self._file("vectors", "bin"),
+                dtype=self.dtype,
+                mode="r",
+            ).reshape(-1, self.dimension)
+        if self._centroids is not None and (
+            self._assignments is None or len(self._assignments) < self._count
+        ):
+            self._assignments = np.memmap(
+                self._ivf_file("assignments", "bin"), dtype=np.int32, mode="r"
+            )
+
+    def _snapshot(self) -> _Snapshot:
+        return _Snapshot(
+            count=self._count,
+            vectors=self._vectors,
+            ids=self._ids,
+            payload_offsets=self._payload_offsets,
+            payload_file=self._payload_file,
+            centroids=self._centroids,
+            assignments=self._assignments,
+        )
+
+    def _rows_mask(self, rows: Iterable[int]) -> np.ndarray:
+        mask = np.zeros(self._count, dtype=bool)
+        rows = list(rows)
+        if rows:
+            mask[np.asarray(rows, dtype=np.int64)] = True
+        return mask
+
+    def _condition_mask(self, condition: Dict[str, Any]) -> np.ndarray:
+        if any(key in condition for key in ("must", "should", "must_not")):
+            return self._filter_mask(condition)
+        key = condition.get("key") or ""
+        metadata_key = key[len("metadata.") :] if key.startswith("metadata.") else key
+        match = condition.get("match")
+        if metadata_key not in INDEXED_METADATA_KEYS or not match:
+            raise ValueError(
+                f"Numpy vector db filters can only match the metadata keys {INDEXED_METADATA_KEYS}, got {condition}"
+            )
+        index = self._index[metadata_key]
+        if "value" in match:
+            return self._rows_mask(index.get(match["value"], ()))
+        if "any" in match:
+            return self._rows_mask(
+                row for value in match["any"] for row in index.get(value, ())
+            )
+        if "except" in match:
+            excluded = set(match["except"])
+            return self._rows_mask(
+                row
+                for value, rows in index.items()
+                if value not in excluded
+                for row in rows
+            )
+        if "text" in match:
+            return self._rows_mask(
+                row
+                for value, rows in index.items()
+                if match["text"] in value
+                for row in rows
+            )
+        raise ValueError(f"Unsupported match in numpy vector db filter: {match}")
+
+    def _filter_mask(self, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        """
+        Rows matching a qdrant style filter (must/should/must_not of field conditions), as a dict
+        """
+        mask = self._alive[: self._count].copy()
+        if not filter:
+            return mask
+
+        def as_list(conditions) -> List[Dict[str, Any]]:
+            if not conditions:
+                return []
+            return conditions if isinstance(conditions, list) else [conditions]
+
+        for condition in as_list(filter.get("must")):
+            mask &= self._condition_mask(condition)
+        should = as_list(filter.get("should"))
+        if should:
+            any_mask = np.zeros(self._count, dtype=bool)
+            for condition in should:
+                any_mask |= self._condition_mask(condition)
+            mask &= any_mask
+        for condition in as_list(filter.get("must_not")):
+            mask &= ~self._condition_mask(condition)
+        return mask
+
+    def _exhaustive_search(
+        self, snapshot: _Snapshot, mask: np.ndarray, queries: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        chunk_size = self.config.search_chunk_size
+        for start in range(0, snapshot.count, chunk_size):
+            end = min(start + chunk_size, snapshot.count)
+            chunk_mask = mask[start:end]
+            if chunk_mask.all():
+                rows = np.arange(start, end)
+                vectors = snapshot.vectors[start:end]
+            elif chunk_mask.any():
+                rows = start + np.flatnonzero(chunk_mask)
+                vectors = snapshot.vectors[rows]
+            else:
+                continue
+            scores = queries @ np.asarray(vectors, dtype=np.float32).T
+            best_scores, best_rows = _merge_top_k(
+                best_scores,
+                best_rows,
+                scores,
+                np.broadcast_to(rows, scores.shape),
+                k,
+            )
+        return best_scores, best_rows
+
+    def _ivf_search(
+        self, snapshot: _Snapshot, mask: np.ndarray, queries: np.ndarray, k: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        centroid_scores = queries @ snapshot.centroids.T
+        nprobe = min(self.config.ivf_nprobe, len(snapshot.centroids))
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        assignments = snapshot.assignments[: snapshot.count]
+        results = []
+        for query, query_probes in zip(queries, probes):
+            rows = np.flatnonzero(mask & np.isin(assignments, query_probes))
+            scores = np.asarray(snapshot.vectors[rows], dtype=np.float32) @ query
+            if len(rows) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            results.append((scores, rows))
+        return results
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[_Snapshot, List[List[Tuple[int, float]]]]:
+        """
+        Rows and cosine similarities of the top k chunks of every query, best first. Collections
+        with more than `ivf_min_vectors` candidates are searched with the IVF index when it is
+        trained, smaller ones (or heavily filtered ones) are searched exhaustively.
+        """
+        with self._lock:
+            self._refresh()
+            snapshot = self._snapshot()
+            mask = self._filter_mask(filter)
+        if snapshot.count == 0 or k <= 0 or not mask.any():
+            return snapshot, [[] for _ in queries]
+
+        queries = _normalize(np.asarray(queries, dtype=np.float32))
+        if (
+            snapshot.centroids is not None
+            and np.count_nonzero(mask) >= self.config.ivf_min_vectors
+        ):
+            per_query = self._ivf_search(snapshot, mask, queries, k)
+        else:
+            scores, rows = self._exhaustive_search(snapshot, mask, queries, k)
+            per_query = list(zip(scores, rows))
+
+        results = []
+        for scores, rows in per_query:
+            order = np.argsort(-scores, kind="stable")
+            results.append([(int(rows[i]), float(scores[i])) for i in order])
+        return snapshot, results
+
+    def read_payload(self, snapshot: _Snapshot, row: int) -> Dict[str, Any]:
+        offset, length = snapshot.payload_offsets[row]
+        return json.loads(os.pread(snapshot.payload_file.fileno(), length, offset))
+
+    def data_point_vectors(self, data_source_fqn: str) -> List[DataPointVector]:
+        """
+        Live chunks of the data points of the data source
+        """
+        prefix = f"{data_source_fqn}{FQN_SEPARATOR}"
+        with self._lock:
+            self._refresh()
+            return [
+                DataPointVector(
+                    data_point_vector_id=self._ids[row],
+                    data_point_fqn=data_point_fqn,
+                    data_point_hash=self._row_values[DATA_POINT_HASH_METADATA_KEY][row],
+                )
+                for data_point_fqn, rows in self._index[
+                    DATA_POINT_FQN_METADATA_KEY
+                ].items()
+                if data_point_fqn.startswith(prefix)
+                for row in rows
+                if self._row_values[DATA_POINT_HASH_METADATA_KEY][row]
+            ]
+
+    def outdated_ids(self, data_point_fqn_to_hash: Dict[str, str]) -> List[str]:
+        """
+        Ids of the chunks of the data points with another hash than the given one
+        """
+        with self._lock:
+            self._refresh()
+            hashes = self._row_values[DATA_POINT_HASH_METADATA_KEY]
+            return [
+                self._ids[row]
+                for data_point_fqn, data_point_hash in data_point_fqn_to_hash.items()
+                for row in self._index[DATA_POINT_FQN_METADATA_KEY].get(
+                    data_point_fqn, ()
+                )
+                if hashes[row] != data_point_hash
+            ]
+
+    def data_source_ids(
+        self, data_source_fqn: str, exclude_data_ingestion_run_name: Optional[str]
+    ) -> List[str]:
+        with self._lock:
+            self._refresh()
+            run_names = self._row_values[DATA_INGESTION_RUN_NAME_METADATA_KEY]
+            return [
+                self._ids[row]
+                for row in self._index[DATA_SOURCE_FQN_METADATA_KEY].get(
+                    data_source_fqn, ()
+                )
+                if exclude_data_ingestion_run_name is None
+                or run_names[row] != exclude_data_ingestion_run_name
+            ]
+
+    # Writing
+
+    @contextmanager
+    def _writing(self):
+        with self._write_lock:
+            with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_rows(self, path: str, rows: np.ndarray, start: int, capacity: int):
+        """
+        Write rows at `start` of a file of rows, growing it to `capacity` rows if needed
+        """
+        row_size = rows.dtype.itemsize * int(np.prod(rows.shape[1:], dtype=np.int64))
+        if os.path.getsize(path) < capacity * row_size:
+            # Sparse until written
+            os.truncate(path, capacity * row_size)
+        target = np.memmap(
+            path,
+            dtype=rows.dtype,
+            mode="r+",
+            offset=start * row_size,
+            shape=rows.shape,
+        )
+        target[:] = rows
+        target.flush()
+        del target
+
+    def _capacity(self, path: str, row_size: int, count: int) -> int:
+        capacity = os.path.getsize(path) // row_size
+        if capacity >= count:
+            return capacity
+        return max(count, 2 * capacity, MIN_CAPACITY)
+
+    def _append_log(self, records: List[Dict[str, Any]]):
+        with open(self._file("payload", "jsonl"), "ab") as f:
+            f.write(b"".join(_dumps(record) + b"\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add(self, vectors: np.ndarray, records: List[Dict[str, Any]]):
+        """
+        Append chunks, `records` hold their id, page_content and metadata
+        """
+        if not records:
+            return
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self._writing():
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Vectors of dimension {vectors.shape[1]} cannot be added to a collection of dimension {self.dimension}"
+                )
+            start = self._count
+            vectors_path = self._file("vectors", "bin")
+            row_size = self.dtype.itemsize * self.dimension
+            capacity = self._capacity(vectors_path, row_size, start + len(vectors))
+            self._write_rows(vectors_path, vectors.astype(self.dtype), start, capacity)
+            if self._centroids is not None:
+                self._write_rows(
+                    self._ivf_file("assignments", "bin"),
+                    _assign(vectors, self._centroids),
+                    start,
+                    capacity,
+                )
+            self._append_log([{"op": "add", **record} for record in records])
+            self._refresh()
+            self._maybe_train_ivf()
+
+    def delete(self, ids: List[str]) -> int:
+        with self._writing():
+            ids = [id for id in ids if id in self._row_by_id]
+            if ids:
+                self._append_log([{"op": "delete", "ids": ids}])
+                self._refresh()
+                self._maybe_compact()
+            return len(ids)
+
+    def _maybe_train_ivf(self):
+        if self._num_alive < self.config.ivf_min_vectors:
+            return
+        trained_count = self._meta["ivf_trained_count"]
+        if trained_count and self._num_alive < 2 * trained_count:
+            return
+        self._train_ivf()
+
+    def _train_ivf(self):
+        """
+        Train the IVF centroids on a sample of the live vectors and assign every row to its
+        nearest centroid. Retrained every time the collection doubles in size.
+        """
+        rows = np.flatnonzero(self._alive[: self._count])
+        num_lists = int(min(max(4 * math.sqrt(len(rows)), 1), IVF_MAX_LISTS))
+        logger.debug(
+            f"[Numpy] Training an IVF index of {num_lists} lists on {len(rows)} vectors of {self.path}"
+        )
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(
+            rng.choice(
+                rows,
+                size=min(len(rows), num_lists * IVF_TRAINING_POINTS_PER_LIST),
+                replace=False,
+            )
+        )
+        centroids = _train_centroids(
+            np.asarray(self._vectors[sample_rows], dtype=np.float32), num_lists
+        )
+
+        previous_version = self._meta["ivf_version"]
+        version = uuid.uuid4().hex
+        np.save(self._ivf_file("centroids", "npy", version), centroids)
+        assignments_path = self._ivf_file("assignments", "bin", version)
+        open(assignments_path, "wb").close()
+        capacity = len(self._vectors)
+        for start in range(0, self._count, self.config.search_chunk_size):
+            self._write_rows(
+                assignments_path,
+                _assign(
+                    self._vectors[start : start + self.config.search_chunk_size],
+                    centroids,
+                ),
+                start,
+                capacity,
+            )
+        self._write_meta(
+            self.path,
+            {
+                **self._meta,
+                "ivf_version": version,
+                "ivf_trained_count": len(rows),
+            },
+        )
+        self._refresh()
+        if previous_version:
+            os.remove(self._ivf_file("centroids", "npy", previous_version))
+            os.remove(self._ivf_file("assignments", "bin", previous_version))
+        logger.debug(f"[Numpy] Trained the IVF index of {self.path}")
+
+    def _maybe_compact(self):
+        num_deleted = self._count - self._num_alive
+        if num_deleted >= COMPACTION_MIN_DELETED_ROWS and num_deleted > self._num_alive:
+            self._compact()
+
+    def _compact(self):
+        """
+        Rewrite the live rows into a new generation of files and switch to it
+        """
+        logger.debug(
+            f"[Numpy] Compacting {self.path}: {self._num_alive} live rows of {self._count}"
+        )
+        previous_generation = self._meta["generation"]
+        generation = uuid.uuid4().hex
+        rows = np.flatnonzero(self._alive[: self._count])
+        vectors_path = self._file("vectors", "bin", generation)
+        payload_path = self._file("payload", "jsonl", generation)
+        open(vectors_path, "wb").close()
+        assignments_path = None
+        if self._meta["ivf_version"]:
+            shutil.copyfile(
+                self._ivf_file("centroids", "npy"),
+                self._ivf_file("centroids", "npy", generation=generation),
+            )
+            assignments_path = self._ivf_file(
+                "assignments", "bin", generation=generation
+            )
+            open(assignments_path, "wb").close()
+
+        snapshot = self._snapshot()
+        chunk_size = self.config.search_chunk_size
+        with open(payload_path, "wb") as payload_file:
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start : start + chunk_size]
+                self._write_rows(
+                    vectors_path, np.asarray(self._vectors[chunk]), start, len(rows)
+                )
+                if assignments_path:
+                    self._write_rows(
+                        assignments_path,
+                        np.asarray(self._assignments[chunk]),
+                        start,
+                        len(rows),
+                    )
+                payload_file.write(
+                    b"".join(
+                        os.pread(
+                            snapshot.payload_file.fileno(),
+                            snapshot.payload_offsets[row][1] + 1,
+                            snapshot.payload_offsets[row][0],
+                        )
+                        for row in chunk
+                    )
+                )
+            payload_file.flush()
+            os.fsync(payload_file.fileno())
+
+        self._write_meta(self.path, {**self._meta, "generation": generation})
+        self._refresh()
+        for name in os.listdir(self.path):
+            if f".{previous_generation}." in name:
+                os.remove(os.path.join(self.path, name))
+        logger.debug(f"[Numpy] Compacted {self.path}")
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Langchain vector store over a collection of the numpy vector db, scores are cosine similarities
+    """
+
+    def __init__(
+        self, client: "NumpyVectorDB", collection_name: str, embeddings: Embeddings
+    ):
+        self.client = client
+        self.collection_name = collection_name
+        self._embeddings = embeddings
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        return self.client._add_documents(
+            self.collection_name,
+            [
+                Document(page_content=text, metadata=metadata)
+                for text, metadata in zip(texts, metadatas)
+            ],
+            self._embeddings,
+        )
+
+    @classmethod
+    def from_texts(cls, *args, **kwargs):
+        raise NotImplementedError(
+            "Create the collection with NumpyVectorDB.create_collection"
+        )
+
+    def _select_relevance_score_fn(self):
+        # Scores already are cosine similarities
+        return lambda score: score
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Any] = None
+    ) -> List[Tuple[Document, float]]:
+        return self.client._search_documents(
+            self.collection_name, [embedding], k=k, filter=filter
+        )[0]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Any] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self._embeddings.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter
+            )
+        ]
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Any] = None, **kwargs: Any
+    ) -> List[Document]:
+        return self.similarity_search_by_vector(
+            self._embeddings.embed_query(query), k=k, filter=filter
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        [results] = self.client._search_documents(
+            self.collection_name,
+            [embedding],
+            k=fetch_k,
+            filter=filter,
+            with_vectors=True,
+        )
+        if not results:
+            return []
+        docs = [doc for doc, _ in results]
+        selected = maximal_marginal_relevance(
+            np.asarray(embedding, dtype=np.float32),
+            [doc.metadata.pop("_vector") for doc in docs],
+            k=k,
+            lambda_mult=lambda_mult,
+        )
+        return [docs[i] for i in selected]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embeddings.embed_query(query),
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            filter=filter,
+        )
+
+
+class NumpyVectorDB(BaseVectorDB):
+    """
+    Vector db storing every collection as memory-mapped float32/float16 vectors with a JSON
+    payload sidecar, searched with NumPy. Meant for single node deployments and CI, it needs no
+    server. Filters can only match the fqn, hash, data source and ingestion run metadata.
+    """
+
+    def __init__(self, config: VectorDBConfig):
+        logger.debug(f"Opening numpy vector db using config: {config.model_dump()}")
+        self.config = NumpyVectorDBConfig.model_validate(config.config or {})
+        os.makedirs(self.config.path, exist_ok=True)
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.Lock()
+
+    def _collection_path(self, collection_name: str) -> str:
+        return os.path.join(self.config.path, collection_name)
+
+    def _get_collection(self, collection_name: str) -> _Collection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                path = self._collection_path(collection_name)
+                if not os.path.exists(os.path.join(path, META_FILE)):
+                    raise ValueError(f"Collection {collection_name} does not exist")
+                collection = _Collection(path, self.config)
+                self._collections[collection_name] = collection
+            return collection
+
+    def create_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ):
+        logger.debug(f"[Numpy] Creating new collection {collection_name}")
+        # Configs validated with `use_enum_values` hold the plain string
+        vector_dtype = VectorDataType(vector_dtype)
+        self.warn_if_vector_dtype_unsupported(
+            vector_dtype, supported=SUPPORTED_VECTOR_DTYPES
+        )
+        if vector_dtype not in SUPPORTED_VECTOR_DTYPES:
+            vector_dtype = VectorDataType.FLOAT32
+        path = self._collection_path(collection_name)
+        if os.path.exists(path):
+            raise ValueError(f"Collection {collection_name} already exists")
+        _Collection.create(
+            path,
+            dimension=self.get_embedding_dimensions(embeddings),
+            dtype=vector_dtype,
+        )
+        logger.debug(f"[Numpy] Created new collection {collection_name}")
+
+    def _add_documents(
+        self, collection_name: str, documents: List[Document], embeddings: Embeddings
+    ) -> List[str]:
+        ids = [str(uuid.uuid4()) for _ in documents]
+        self._get_collection(collection_name).add(
+            np.asarray(
+                embeddings.embed_documents([doc.page_content for doc in documents]),
+                dtype=np.float32,
+            ),
+            [
+                {"id": id, "page_content": doc.page_content, "metadata": doc.metadata}
+                for id, doc in zip(ids, documents)
+            ],
+        )
+        return ids
+
+    def upsert_documents(
+        self,
+        collection_name: str,
+        documents: List[Document],
+        embeddings: Embeddings,
+        incremental: bool = True,
+    ):
+        if len(documents) == 0:
+            logger.warning("No documents to index")
+            return
+        logger.debug(
+            f"[Numpy] Adding {len(documents)} documents to collection {collection_name}"
+        )
+        self._add_documents(collection_name, documents, embeddings)
+        logger.debug(
+            f"[Numpy] Added {len(documents)} documents to collection {collection_name}"
+        )
+
+        # Delete the previous versions of the upserted data points
+        if incremental:
+            data_point_fqn_to_hash = {
+                document.metadata[DATA_POINT_FQN_METADATA_KEY]: document.metadata[
+                    DATA_POINT_HASH_METADATA_KEY
+                ]
+                for document in documents
+                if document.metadata.get(DATA_POINT_FQN_METADATA_KEY)
+                and document.metadata.get(DATA_POINT_HASH_METADATA_KEY)
+            }
+            collection = self._get_collection(collection_name)
+            num_deleted = collection.delete(
+                collection.outdated_ids(data_point_fqn_to_hash)
+            )
+            logger.debug(
+                f"[Numpy] Incremental Ingestion: Deleted {num_deleted} outdated documents from collection {collection_name}"
+            )
+
+    def get_collections(self) -> List[str]:
+        logger.debug("[Numpy] Fetching collections")
+        collection_names = [
+            name
+            for name in sorted(os.listdir(self.config.path))
+            if os.path.exists(os.path.join(self._collection_path(name), META_FILE))
+        ]
+        logger.debug(f"[Numpy] Fetched {len(collection_names)} collections")
+        return collection_names
+
+    def delete_collection(self, collection_name: str):
+        logger.debug(f"[Numpy] Deleting {collection_name} collection")
+        with self._lock:
+            self._collections.pop(collection_name, None)
+        shutil.rmtree(self._collection_path(collection_name), ignore_errors=True)
+        logger.debug(f"[Numpy] Deleted {collection_name} collection")
+
+    def get_vector_store(self, collection_name: str, embeddings: Embeddings):
+        logger.debug(f"[Numpy] Getting vector store for collection {collection_name}")
+        return NumpyVectorStore(
+            client=self, collection_name=collection_name, embeddings=embeddings
+        )
+
+    def get_vector_client(self):
+        logger.debug("[Numpy] Getting numpy vector db")
+        return self
+
+    def _search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        k: int,
+        filter: Optional[Any] = None,
+    ) -> Tuple[_Collection, _Snapshot, List[List[Tuple[int, float]]]]:
+        if filter is not None and not isinstance(filter, dict):
+            # Qdrant filter models are accepted as well
+            filter = filter.model_dump(exclude_none=True, by_alias=True)
+        collection = self._get_collection(collection_name)
+        snapshot, results = collection.search(
+            np.asarray(vectors, dtype=np.float32), k=k, filter=filter
+        )
+        return collection, snapshot, results
+
+    def _search_documents(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        k: int,
+        filter: Optional[Any] = None,
+        with_vectors: bool = False,
+    ) -> List[List[Tuple[Document, float]]]:
+        collection, snapshot, results = self._search(
+            collection_name, vectors, k, filter
+        )
+        docs_per_query = []
+        for hits in results:
+            docs = []
+            for row, score in hits:
+                record = collection.read_payload(snapshot, row)
+                metadata = {
+                    **(record.get("metadata") or {}),
+                    "_id": record["id"],
+                    "_collection_name": collection_name,
+                }
+                if with_vectors:
+                    metadata["_vector"] = np.asarray(
+                        snapshot.vectors[row], dtype=np.float32
+                    )
+                docs.append(
+                    (
+                        Document(
+                            page_content=record["page_content"], metadata=metadata
+                        ),
+                        score,
+                    )
+                )
+            docs_per_query.append(docs)
+        return docs_per_query
+
+    def similarity_search_batch(
+        self,
+        vector_store: NumpyVectorStore,
+        vectors: List[List[float]],
+        k: int,
+        filter: Optional[Any] = None,
+    ) -> List[List[Document]]:
+        logger.debug(
+            f"[Numpy] Searching {len(vectors)} vectors in collection {vector_store.collection_name}"
+        )
+        return [
+            [doc for doc, _ in docs]
+            for docs in self._search_documents(
+                vector_store.collection_name, vectors, k=k, filter=filter
+            )
+        ]
+
+    def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        limit: int,
+        offset: int = 0,
+        filter: Optional[Any] = None,
+        score_threshold: Optional[float] = None,
+        with_content: bool = True,
+        metadata_keys: Optional[List[str]] = None,
+    ) -> List[List[VectorSearchResult]]:
+        collection, snapshot, results = self._search(
+            collection_name, vectors, offset + limit, filter
+        )
+        search_results = []
+        for hits in results:
+            query_results = []
+            for row, score in hits[offset:]:
+                if score_threshold is not None and score < score_threshold:
+                    break
+                record = collection.read_payload(snapshot, row)
+                metadata = record.get("metadata") or {}
+                if metadata_keys is not None:
+                    metadata = {
+                        key: metadata[key] for key in metadata_keys if key in metadata
+                    }
+                query_results.append(
+                    VectorSearchResult(
+                        id=record["id"],
+                        score=score,
+                        page_content=record["page_content"] if with_content else None,
+                        metadata=metadata,
+                    )
+                )
+            search_results.append(query_results)
+        return search_results
+
+    def list_data_point_vectors(
+        self,
+        collection_name: str,
+        data_source_fqn: str,
+        batch_size: int = DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE,
+    ) -> List[DataPointVector]:
+        logger.debug(
+            f"[Numpy] Listing all data point vectors for collection {collection_name}"
+        )
+        # Served from the in memory index, no payload is read
+        data_point_vectors = self._get_collection(collection_name).data_point_vectors(
+            data_source_fqn
+        )
+        logger.debug(
+            f"[Numpy] Listing {len(data_point_vectors)} data point vectors for collection {collection_name}"
+        )
+        return data_point_vectors
+
+    def delete_data_point_vectors(
+        self,
+        collection_name: str,
+        data_point_vectors: List[DataPointVector],
+        batch_size: int = DEFAULT_BATCH_SIZE_FOR_VECTOR_STORE,
+    ):
+        logger.debug(f"[Numpy] Deleting {len(data_point_vectors)} data point vectors")
+        collection = self._get_collection(collection_name)
+        num_deleted = 0
+        for i in range(0, len(data_point_vectors), batch_size):
+            num_deleted += collection.delete(
+                [
+                    data_point_vector.data_point_vector_id
+                    for data_point_vector in data_point_vectors[i : i + batch_size]
+                ]
+            )
+        logger.debug(
+            f"[Numpy] Deleted {num_deleted} data point vectors from collection {collection_name}"
+        )
+
+    def supports_filtered_deletes(self) -> bool:
+        return True
+
+    def delete_data_source_vectors(
+        self,
+        collection_name: str,
+        data_source_fqn: str,
+        exclude_data_ingestion_run_name: Optional[str] = None,
+    ):
+        logger.debug(
+            f"[Numpy] Deleting vectors of data source {data_source_fqn} from collection {collection_name}"
+        )
+        collection = self._get_collection(collection_name)
+        collection.delete(
+            collection.data_source_ids(data_source_fqn, exclude_data_ingestion_run_name)
+        )
+        logger.debug(
+            f"[Numpy] Deleted vectors of data source {data_source_fqn} from collection {collection_name}"
+        )
@@ -1,15 +1,29 @@
-from typing import List
+import uuid
+from typing import Dict, List, Optional
 from urllib.parse import urlparse
 
+from langchain.docstore.document import Document
 from langchain.embeddings.base import Embeddings
 from langchain_community.vectorstores.qdrant import Qdrant
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import Distance, VectorParams
 
-from backend.constants import DATA_POINT_FQN_METADATA_KEY, DATA_POINT_HASH_METADATA_KEY
+from backend.constants import (
+    DATA_INGESTION_RUN_NAME_METADATA_KEY,
+    DATA_POINT_FQN_METADATA_KEY,
+    DATA_POINT_HASH_METADATA_KEY,
+    DATA_SOURCE_FQN_METADATA_KEY,
+    SHADOW_COLLECTION_SEPARATOR,
+)
 from backend.logger import logger
 from backend.modules.vector_db.base import BaseVectorDB
-from backend.types import DataPointVector, QdrantClientConfig, VectorDBConfig
+from backend.types import (
+    DataPointVector,
+    QdrantClientConfig,
+    VectorDataType,
+    VectorDBConfig,
+    VectorSearchResult,
+)
 
 MAX_SCROLL_LIMIT = int(1e6)
 BATCH_SIZE = 1000
@@ -40,21 +54,65 @@ class QdrantVectorDB(BaseVectorDB):
                 url=url, api_key=api_key, **qdrant_kwargs.model_dump()
             )
 
-    def create_collection(self, collection_name: str, embeddings: Embeddings):
+    def create_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ):
         logger.debug(f"[Qdrant] Creating new collection {collection_name}")
+        # Every collection is served through an alias pointing at a physical collection,
+        # this lets blue/green reindexing swap the physical collection atomically
+        physical_collection_name = self.create_shadow_collection(
+            collection_name=collection_name,
+            embeddings=embeddings,
+            vector_dtype=vector_dtype,
+        )
+        self.qdrant_client.update_collection_aliases(
+            change_aliases_operations=[
+                models.CreateAliasOperation(
+                    create_alias=models.CreateAlias(
+                        collection_name=physical_collection_name,
+                        alias_name=collection_name,
+                    )
+                )
+            ]
+        )
+        logger.debug(
+            f"[Qdrant] Created new collection {collection_name} -> {physical_collection_name}"
+        )
 
-        # Calculate embedding size
-        partial_embeddings = embeddings.embed_documents(["Initial document"])
-        vector_size = len(partial_embeddings[0])
-        logger.debug(f"Vector size: {vector_size}")
-
+    def _create_physical_collection(
+        self, collection_name: str, vector_size: int, vector_dtype: VectorDataType
+    ):
+        vector_params = {}
+        quantization_config = None
+        if vector_dtype == VectorDataType.FLOAT16:
+            # Half precision storage needs a qdrant client and server that know the datatype
+            datatype = getattr(getattr(models, "Datatype", None), "FLOAT16", None)
+            if datatype is None:
+                self.warn_if_vector_dtype_unsupported(vector_dtype)
+            else:
+                vector_params["datatype"] = datatype
+        elif vector_dtype == VectorDataType.UINT8:
+            # Search runs on int8 quantized vectors kept in RAM, the float32 originals
+            # stay on disk and are only read to rescore the top candidates
+            quantization_config = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True,
+                )
+            )
         self.qdrant_client.create_collection(
             collection_name=collection_name,
             vectors_config=VectorParams(
                 size=vector_size,  # embedding dimension
                 distance=Distance.COSINE,
                 on_disk=True,
+                **vector_params,
             ),
+            quantization_config=quantization_config,
             replication_factor=3,
         )
         self.qdrant_client.create_payload_index(
@@ -62,52 +120,261 @@ class QdrantVectorDB(BaseVectorDB):
             field_name=f"metadata.{DATA_POINT_FQN_METADATA_KEY}",
             field_schema=models.PayloadSchemaType.KEYWORD,
         )
-        logger.debug(f"[Qdrant] Created new collection {collection_name}")
+        self.qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name=f"metadata.{DATA_SOURCE_FQN_METADATA_KEY}",
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
 
-    def _get_records_to_be_upserted(
-        self, collection_name: str, data_point_fqns: List[str], incremental: bool
-    ):
-        if not incremental:
-            return []
-        # For incremental deletion, we delete the documents with the same document_id
+    def _get_aliases(self) -> Dict[str, str]:
+        """
+        Returns a map of alias name to the physical collection name it points to
+        """
+        return {
+            alias.alias_name: alias.collection_name
+            for alias in self.qdrant_client.get_aliases().aliases
+        }
+
+    def supports_blue_green_reindex(self, collection_name: str) -> bool:
+        # Collections created before aliasing was introduced are physical collections, they
+        # have to be migrated with `migrate_to_alias` before they can be swapped
+        return collection_name in self._get_aliases()
+
+    def migrate_to_alias(self, collection_name: str) -> str:
+        """
+        Convert a physical collection created before aliasing was introduced into an alias
+        pointing at a copy of it. Returns the name of the new physical collection.
+
+        An alias cannot shadow a collection, so the collection is not served between the
+        drop of the old collection and the creation of the alias. Run it when no ingestion
+        runs are writing to the collection.
+        """
+        if collection_name in self._get_aliases():
+            logger.debug(f"[Qdrant] {collection_name} is already an alias")
+            return self._get_aliases()[collection_name]
+
+        collection_info = self.qdrant_client.get_collection(
+            collection_name=collection_name
+        )
+        physical_collection_name = (
+            f"{collection_name}{SHADOW_COLLECTION_SEPARATOR}{uuid.uuid4().hex[:8]}"
+        )
         logger.debug(
-            f"[Qdrant] Incremental Ingestion: Fetching documents for {len(data_point_fqns)} data point fqns for collection {collection_name}"
+            f"[Qdrant] Migrating {collection_name} to an alias of {physical_collection_name}"
+        )
+        self.qdrant_client.create_collection(
+            collection_name=physical_collection_name,
+            vectors_config=collection_info.config.params.vectors,
+            quantization_config=collection_info.config.quantization_config,
+            replication_factor=collection_info.config.params.replication_factor,
+        )
+        for field_name, field_schema in (collection_info.payload_schema or {}).items():
+            self.qdrant_client.create_payload_index(
+                collection_name=physical_collection_name,
+                field_name=field_name,
+                field_schema=field_schema.data_type,
+            )
+        try:
+            copied_vectors_count = self.copy_data_point_vectors(
+                source_collection_name=collection_name,
+                target_collection_name=physical_collection_name,
+            )
+            # Writes during the copy would be lost with the old collection
+            vectors_count = self.qdrant_client.count(
+                collection_name=collection_name, exact=True
+            ).count
+            if copied_vectors_count != vectors_count:
+                raise Exception(
+                    f"{collection_name} changed during the migration, copied {copied_vectors_count} of {vectors_count} vectors"
+                )
+        except Exception:
+            self.drop_physical_collection(physical_collection_name)
+            raise
+
+        self.qdrant_client.delete_collection(collection_name=collection_name)
+        self.qdrant_client.update_collection_aliases(
+            change_aliases_operations=[
+                models.CreateAliasOperation(
+                    create_alias=models.CreateAlias(
+                        collection_name=physical_collection_name,
+                        alias_name=collection_name,
+                    )
+                )
+            ]
+        )
+        logger.debug(
+            f"[Qdrant] Migrated {collection_name} to an alias of {physical_collection_name}"
+        )
+        return physical_collection_name
+
+    def create_shadow_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ) -> str:
+        shadow_collection_name = (
+            f"{collection_name}{SHADOW_COLLECTION_SEPARATOR}{uuid.uuid4().hex[:8]}"
+        )
+        logger.debug(
+            f"[Qdrant] Creating physical collection {shadow_collection_name} for {collection_name}"
+        )
+        vector_size = self.get_embedding_dimensions(embeddings)
+        self._create_physical_collection(
+            collection_name=shadow_collection_name,
+            vector_size=vector_size,
+            vector_dtype=vector_dtype,
+        )
+        return shadow_collection_name
+
+    def copy_data_point_vectors(
+        self,
+        source_collection_name: str,
+        target_collection_name: str,
+        exclude_data_source_fqn: Optional[str] = None,
+        batch_size: int = BATCH_SIZE,
+    ) -> int:
+        logger.debug(
+            f"[Qdrant] Copying vectors from {source_collection_name} to {target_collection_name} "
+            f"excluding data source {exclude_data_source_fqn}"
         )
-        stop = False
         offset = None
-        record_ids_to_be_upserted = []
-        while stop is not True:
+        copied_vectors_count = 0
+        while True:
             records, next_offset = self.qdrant_client.scroll(
-                collection_name=collection_name,
-                scroll_filter=models.Filter(
-                    should=[
-                        models.FieldCondition(
-                            key=f"metadata.{DATA_POINT_FQN_METADATA_KEY}",
-                            match=models.MatchAny(
-                                any=data_point_fqns,
+                collection_name=source_collection_name,
+                scroll_filter=(
+                    models.Filter(
+                        must_not=[
+                            models.FieldCondition(
+                                key=f"metadata.{DATA_SOURCE_FQN_METADATA_KEY}",
+                                match=models.MatchValue(value=exclude_data_source_fqn),
                             ),
-                        ),
-                    ]
+                        ]
+                    )
+                    if exclude_data_source_fqn
+                    else None
                 ),
-                limit=BATCH_SIZE,
+                limit=batch_size,
                 offset=offset,
-                with_payload=False,
-                with_vectors=False,
+                with_payload=True,
+                with_vectors=True,
             )
-            for record in records:
-                record_ids_to_be_upserted.append(record.id)
-                if len(record_ids_to_be_upserted) > MAX_SCROLL_LIMIT:
-                    stop = True
-                    break
+            if records:
+                self.qdrant_client.upsert(
+                    collection_name=target_collection_name,
+                    points=[
+                        models.PointStruct(
+                            id=record.id, vector=record.vector, payload=record.payload
+                        )
+                        for record in records
+                    ],
+                )
+                copied_vectors_count = copied_vectors_count + len(records)
             if next_offset is None:
-                stop = True
-            else:
-                offset = next_offset
+                break
+            offset = next_offset
+        logger.debug(
+            f"[Qdrant] Copied {copied_vectors_count} vectors to {target_collection_name}"
+        )
+        return copied_vectors_count
+
+    def swap_collection(
+        self, collection_name: str, shadow_collection_name: str
+    ) -> Optional[str]:
+        logger.debug(
+            f"[Qdrant] Swapping collection {collection_name} -> {shadow_collection_name}"
+        )
+        previous_collection_name = self._get_aliases().get(collection_name)
+        if not previous_collection_name:
+            # Never drop a physical collection here, it would not be served until the alias exists
+            raise Exception(
+                f"{collection_name} is not an alias, migrate it with `migrate_to_alias` before swapping"
+            )
+        # Both operations are applied atomically by qdrant
+        self.qdrant_client.update_collection_aliases(
+            change_aliases_operations=[
+                models.DeleteAliasOperation(
+                    delete_alias=models.DeleteAlias(alias_name=collection_name)
+                ),
+                models.CreateAliasOperation(
+                    create_alias=models.CreateAlias(
+                        collection_name=shadow_collection_name,
+                        alias_name=collection_name,
+                    )
+                ),
+            ]
+        )
+        logger.debug(
+            f"[Qdrant] Swapped collection {collection_name}: {previous_collection_name} -> {shadow_collection_name}"
+        )
+        return previous_collection_name
 
+    def drop_physical_collection(self, physical_collection_name: str):
         logger.debug(
-            f"[Qdrant] Incremental Ingestion: collection={collection_name} Addition={len(data_point_fqns)}, Updates={len(record_ids_to_be_upserted)}"
+            f"[Qdrant] Dropping physical collection {physical_collection_name}"
+        )
+        self.qdrant_client.delete_collection(collection_name=physical_collection_name)
+        logger.debug(f"[Qdrant] Dropped physical collection {physical_collection_name}")
+
+    def _get_outdated_documents_filter(
+        self, data_point_fqn_to_hash: Dict[str, str]
+    ) -> models.Filter:
+        """
+        Filter matching every vector of the given data points that was not written with their current hash
+        """
+        return models.Filter(
+            should=[
+                models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key=f"metadata.{DATA_POINT_FQN_METADATA_KEY}",
+                            match=models.MatchValue(value=data_point_fqn),
+                        ),
+                    ],
+                    must_not=[
+                        models.FieldCondition(
+                            key=f"metadata.{DATA_POINT_HASH_METADATA_KEY}",
+                            match=models.MatchValue(value=data_point_hash),
+                        ),
+                    ],
+                )
+                for data_point_fqn, data_point_hash in data_point_fqn_to_hash.items()
+            ]
+        )
+
+    def _delete_outdated_documents(self, collection_name: str, documents):
+        """
+        Delete the previous versions of the data points being upserted.
+        The deletion is pushed down to qdrant as a filter, so no point ids are fetched to the client.
+        """
+        data_point_fqn_to_hash: Dict[str, str] = {}
+        for document in documents:
+            data_point_fqn = document.metadata.get(DATA_POINT_FQN_METADATA_KEY)
+            data_point_hash = document.metadata.get(DATA_POINT_HASH_METADATA_KEY)
+            if data_point_fqn and data_point_hash:
+                data_point_fqn_to_hash[data_point_fqn] = data_point_hash
+        if not data_point_fqn_to_hash:
+            return
+        logger.debug(
+            f"[Qdrant] Incremental Ingestion: Deleting outdated documents for {len(data_point_fqn_to_hash)} data point fqns from collection {collection_name}"
+        )
+        data_point_fqns = list(data_point_fqn_to_hash.keys())
+        for i in range(0, len(data_point_fqns), BATCH_SIZE):
+            self.qdrant_client.delete(
+                collection_name=collection_name,
+                points_selector=models.FilterSelector(
+                    filter=self._get_outdated_documents_filter(
+                        {
+                            data_point_fqn: data_point_fqn_to_hash[data_point_fqn]
+                            for data_point_fqn in data_point_fqns[i : i + BATCH_SIZE]
+                        }
+                    )
+                ),
+            )
+        logger.debug(
+            f"[Qdrant] Incremental Ingestion: Deleted outdated documents for {len(data_point_fqn_to_hash)} data point fqns from collection {collection_name}"
         )
-        return record_ids_to_be_upserted
 
     def upsert_documents(
         self,
@@ -119,21 +386,9 @@ class QdrantVectorDB(BaseVectorDB):
         if len(documents) == 0:
             logger.warning("No documents to index")
             return
-        # get record IDs to be upserted
         logger.debug(
             f"[Qdrant] Adding {len(documents)} documents to collection {collection_name}"
         )
-        data_point_fqns = []
-        for document in documents:
-            if document.metadata.get(DATA_POINT_FQN_METADATA_KEY):
-                data_point_fqns.append(
-                    document.metadata.get(DATA_POINT_FQN_METADATA_KEY)
-                )
-        record_ids_to_be_upserted: List[str] = self._get_records_to_be_upserted(
-            collection_name=collection_name,
-            data_point_fqns=data_point_fqns,
-            incremental=incremental,
-        )
 
         # Add Documents
         Qdrant(
@@ -145,34 +400,42 @@ class QdrantVectorDB(BaseVectorDB):
             f"[Qdrant] Added {len(documents)} documents to collection {collection_name}"
         )
 
-        # Delete Documents
-        if len(record_ids_to_be_upserted):
-            logger.debug(
-                f"[Qdrant] Deleting {len(documents)} outdated documents from collection {collection_name}"
-            )
-            for i in range(0, len(record_ids_to_be_upserted), BATCH_SIZE):
-                record_ids_to_be_processed = record_ids_to_be_upserted[
-                    i : i + BATCH_SIZE
-                ]
-                self.qdrant_client.delete(
-                    collection_name=collection_name,
-                    points_selector=models.PointIdsList(
-                        points=record_ids_to_be_processed,
-                    ),
-                )
-            logger.debug(
-                f"[Qdrant] Deleted {len(documents)} outdated documents from collection {collection_name}"
+        # Delete the previous versions of the upserted data points
+        if incremental:
+            self._delete_outdated_documents(
+                collection_name=collection_name, documents=documents
             )
 
     def get_collections(self) -> List[str]:
         logger.debug("[Qdrant] Fetching collections")
         collections = self.qdrant_client.get_collections().collections
-        logger.debug(f"[Qdrant] Fetched {len(collections)} collections")
-        return [collection.name for collection in collections]
+        aliases = self._get_aliases()
+        aliased_collection_names = set(aliases.values())
+        collection_names = list(aliases.keys()) + [
+            collection.name
+            for collection in collections
+            if collection.name not in aliased_collection_names
+            and SHADOW_COLLECTION_SEPARATOR not in collection.name
+        ]
+        logger.debug(f"[Qdrant] Fetched {len(collection_names)} collections")
+        return collection_names
 
     def delete_collection(self, collection_name: str):
         logger.debug(f"[Qdrant] Deleting {collection_name} collection")
-        self.qdrant_client.delete_collection(collection_name=collection_name)
+        physical_collection_name = self._get_aliases().get(collection_name)
+        if physical_collection_name:
+            self.qdrant_client.update_collection_aliases(
+                change_aliases_operations=[
+                    models.DeleteAliasOperation(
+                        delete_alias=models.DeleteAlias(alias_name=collection_name)
+                    )
+                ]
+            )
+            self.qdrant_client.delete_collection(
+                collection_name=physical_collection_name
+            )
+        else:
+            self.qdrant_client.delete_collection(collection_name=collection_name)
         logger.debug(f"[Qdrant] Deleted {collection_name} collection")
 
     def get_vector_store(self, collection_name: str, embeddings: Embeddings):
@@ -183,6 +446,94 @@ class QdrantVectorDB(BaseVectorDB):
             collection_name=collection_name,
         )
 
+    def similarity_search_batch(
+        self,
+        vector_store: Qdrant,
+        vectors: List[List[float]],
+        k: int,
+        filter: Optional[models.Filter] = None,
+    ) -> List[List[Document]]:
+        logger.debug(
+            f"[Qdrant] Searching {len(vectors)} vectors in collection {vector_store.collection_name}"
+        )
+        results = self.qdrant_client.search_batch(
+            collection_name=vector_store.collection_name,
+            requests=[
+                models.SearchRequest(
+                    vector=(
+                        models.NamedVector(name=vector_store.vector_name, vector=vector)
+                        if vector_store.vector_name
+                        else vector
+                    ),
+                    filter=filter,
+                    limit=k,
+                    with_payload=True,
+                )
+                for vector in vectors
+            ],
+        )
+        # Same documents as the langchain vector store returns for a single search
+        return [
+            [
+                Document(
+                    page_content=point.payload.get(vector_store.content_payload_key)
+                    or "",
+                    metadata={
+                        **(point.payload.get(vector_store.metadata_payload_key) or {}),
+                        "_id": point.id,
+                        "_collection_name": vector_store.collection_name,
+                    },
+                )
+                for point in points
+            ]
+            for points in results
+        ]
+
+    def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        limit: int,
+        offset: int = 0,
+        filter: Optional[models.Filter] = None,
+        score_threshold: Optional[float] = None,
+        with_content: bool = True,
+        metadata_keys: Optional[List[str]] = None,
+    ) -> List[List[VectorSearchResult]]:
+        if metadata_keys is None:
+            with_payload = [Qdrant.METADATA_KEY]
+        else:
+            with_payload = [f"{Qdrant.METADATA_KEY}.{key}" for key in metadata_keys]
+        if with_content:
+            with_payload.append(Qdrant.CONTENT_KEY)
+
+        results = self.qdrant_client.search_batch(
+            collection_name=collection_name,
+            requests=[
+                models.SearchRequest(
+                    vector=vector,
+                    filter=filter,
+                    limit=limit,
+                    offset=offset,
+                    score_threshold=score_threshold,
+                    with_payload=with_payload or False,
+                )
+                for vector in vectors
+            ],
+        )
+        return [
+            [
+                VectorSearchResult(
+                    id=str(point.id),
+                    score=point.score,
+                    page_content=point.payload.get(Qdrant.CONTENT_KEY),
+                    metadata=point.payload.get(Qdrant.METADATA_KEY) or {},
+                )
+                for point in points
+            ]
+            for points in results
+        ]
+
     def get_vector_client(self):
         logger.debug("[Qdrant] Getting Qdrant client")
         return self.qdrant_client
@@ -276,6 +627,47 @@ class QdrantVectorDB(BaseVectorDB):
             f"[Qdrant] Deleted {vectors_to_be_deleted_count} data point vectors"
         )
 
+    def supports_filtered_deletes(self) -> bool:
+        return True
+
+    def delete_data_source_vectors(
+        self,
+        collection_name: str,
+        data_source_fqn: str,
+        exclude_data_ingestion_run_name: Optional[str] = None,
+    ):
+        logger.debug(
+            f"[Qdrant] Deleting vectors of data source {data_source_fqn} from collection {collection_name}"
+        )
+        self.qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key=f"metadata.{DATA_SOURCE_FQN_METADATA_KEY}",
+                            match=models.MatchValue(value=data_source_fqn),
+                        ),
+                    ],
+                    must_not=(
+                        [
+                            models.FieldCondition(
+                                key=f"metadata.{DATA_INGESTION_RUN_NAME_METADATA_KEY}",
+                                match=models.MatchValue(
+                                    value=exclude_data_ingestion_run_name
+                                ),
+                            ),
+                        ]
+                        if exclude_data_ingestion_run_name
+                        else None
+                    ),
+                )
+            ),
+        )
+        logger.debug(
+            f"[Qdrant] Deleted vectors of data source {data_source_fqn} from collection {collection_name}"
+        )
+
     def list_documents_in_collection(
         self, collection_name: str, base_document_id: str = None
     ) -> List[str]:
@@ -10,7 +10,7 @@ from langchain_community.vectorstores.singlestoredb import SingleStoreDB
 from backend.constants import DATA_POINT_FQN_METADATA_KEY, DATA_POINT_HASH_METADATA_KEY
 from backend.logger import logger
 from backend.modules.vector_db.base import BaseVectorDB
-from backend.types import DataPointVector, VectorDBConfig
+from backend.types import DataPointVector, VectorDataType, VectorDBConfig
 
 MAX_SCROLL_LIMIT = int(1e6)
 BATCH_SIZE = 1000
@@ -126,7 +126,13 @@ class SingleStoreVectorDB(BaseVectorDB):
     def __init__(self, config: VectorDBConfig):
         self.host = config.url
 
-    def create_collection(self, collection_name: str, embeddings: Embeddings):
+    def create_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ):
+        self.warn_if_vector_dtype_unsupported(vector_dtype)
         _validate_collection_name(collection_name)
         logger.debug(f"[SingleStore] Creating new collection {collection_name}...")
 
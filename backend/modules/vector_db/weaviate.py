@@ -8,7 +8,7 @@ from langchain_core.documents import Document
 from backend.constants import DATA_POINT_FQN_METADATA_KEY
 from backend.logger import logger
 from backend.modules.vector_db.base import BaseVectorDB
-from backend.types import DataPointVector, VectorDBConfig
+from backend.types import DataPointVector, VectorDataType, VectorDBConfig
 
 
 def decapitalize(s):
@@ -30,7 +30,13 @@ class WeaviateVectorDB(BaseVectorDB):
             ),
         )
 
-    def create_collection(self, collection_name: str, embeddings: Embeddings):
+    def create_collection(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        vector_dtype: VectorDataType = VectorDataType.FLOAT32,
+    ):
+        self.warn_if_vector_dtype_unsupported(vector_dtype)
         self.weaviate_client.schema.create_class(
             {
                 "class": collection_name.capitalize(),
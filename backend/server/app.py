@@ -9,6 +9,8 @@ from fastapi.responses import JSONResponse
 from prisma.errors import RecordNotFoundError, UniqueViolationError
 
 from backend.logger import logger
+from backend.modules.model_gateway.model_gateway import model_gateway
+from backend.modules.parsers.web_parser import close_browser_pools
 from backend.modules.query_controllers.query_controller import QUERY_CONTROLLER_REGISTRY
 from backend.server.routers.collection import router as collection_router
 from backend.server.routers.components import router as components_router
@@ -21,6 +23,10 @@ from backend.utils import AsyncProcessPoolExecutor
 
 @asynccontextmanager
 async def _process_pool_lifespan_manager(app: FastAPI):
+    # Load in-process models before serving, without blocking the event loop
+    await asyncio.get_running_loop().run_in_executor(
+        None, model_gateway.warm_up_local_models
+    )
     app.state.process_pool = None
     if settings.PROCESS_POOL_WORKERS > 0:
         app.state.process_pool = AsyncProcessPoolExecutor(
@@ -52,6 +58,8 @@ async def _process_pool_lifespan_manager(app: FastAPI):
         health_check_task.cancel()
         logger.info("Shutting down the process pool")
         app.state.process_pool.shutdown(wait=True)
+    await model_gateway.http_clients.aclose()
+    await close_browser_pools()
 
 
 # FastAPI Initialization
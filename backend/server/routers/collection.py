@@ -67,10 +67,12 @@ async def create_collection(
     logger.info(f"Creating collection {collection.name} on vector db...")
     VECTOR_STORE_CLIENT.create_collection(
         collection_name=collection.name,
-        embeddings=model_gateway.get_embedder_from_model_config(
-            model_name=collection.embedder_config.name
+        embeddings=model_gateway.get_embedder_from_embedder_config(
+            collection.embedder_config
         ),
+        vector_dtype=collection.embedder_config.vector_dtype,
     )
+    await VECTOR_STORE_CLIENT.await_collection_ready(collection_name=collection.name)
     logger.info(f"Created collection... {created_collection}")
 
     if collection.associated_data_sources:
@@ -124,6 +124,26 @@ def get_enabled_models(
     )
 
 
+@router.get("/model-gateway/http-pool-stats")
+def get_model_gateway_http_pool_stats():
+    """
+    Request counters and connection pool usage of the pooled HTTP clients of every provider base url
+    """
+    return JSONResponse(
+        content={"http_pools": model_gateway.http_clients.get_stats()},
+    )
+
+
+@router.get("/model-gateway/endpoint-stats")
+def get_model_gateway_endpoint_stats():
+    """
+    Time to first token, load and circuit state of the endpoints of multi endpoint chat models
+    """
+    return JSONResponse(
+        content={"endpoints": model_gateway.get_endpoint_stats()},
+    )
+
+
 @router.get("/get_signed_url")
 def get_signed_url(
     data_point_fqn: str = Query(...),
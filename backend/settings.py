@@ -25,12 +25,36 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "info"
     TFY_SERVICE_ROOT_PATH: str = ""
     BRAVE_API_KEY: str = ""
+    # Internet search runs alongside retrieval, past the latency budget answers use the vector store only
+    INTERNET_SEARCH_LATENCY_BUDGET_SECONDS: float = 3.0
+    INTERNET_SEARCH_REQUEST_TIMEOUT_SECONDS: float = 2.0
+    INTERNET_SEARCH_CACHE_TTL_SECONDS: int = 3600
+    INTERNET_SEARCH_CACHE_SIZE: int = 1024
     UNSTRUCTURED_IO_URL: str = ""
     UNSTRUCTURED_IO_API_KEY: str = ""
     PROCESS_POOL_WORKERS: int = 1
+    # Number of data points of a batch parsed concurrently during ingestion
+    PARSER_CONCURRENCY: int = 1
     LOCAL_DATA_DIRECTORY: str = os.path.abspath(
         os.path.join(os.path.dirname(os.path.dirname(__file__)), "user_data")
     )
+    LOADER_MANIFEST_DIRECTORY: str = os.path.abspath(
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), ".loader_manifests")
+    )
+    # Disk budget of the temporary workspace of an ingestion run, 0 means unbounded
+    INGESTION_WORKSPACE_DISK_BUDGET_MB: int = 0
+    # Connection pools shared by all model clients of a provider base url
+    MODEL_GATEWAY_HTTP2: bool = True
+    MODEL_GATEWAY_MAX_CONNECTIONS: int = 100
+    MODEL_GATEWAY_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    MODEL_GATEWAY_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    MODEL_GATEWAY_TIMEOUT_SECONDS: float = 600.0
+    MODEL_GATEWAY_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    # Answer tokens of a stream are sent together until this many ms or chars are buffered, 0 disables
+    SSE_COALESCE_WINDOW_MS: float = 20.0
+    SSE_COALESCE_MAX_CHARS: int = 64
+    # Compress streams of clients sending `Accept-Encoding: gzip`
+    SSE_GZIP: bool = True
     ALLOW_CORS: bool = False
     CORS_CONFIG: Dict[str, Any] = Field(
         default_factory=lambda: {
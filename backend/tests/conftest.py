@@ -0,0 +1,77 @@
+import os
+from typing import Callable, List, Optional
+
+import pytest
+
+# backend.settings validates the environment on import, tests run with local defaults
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "MODELS_CONFIG_PATH", os.path.join(REPO_ROOT, "models_config.sample.yaml")
+)
+os.environ.setdefault("LOCAL", "true")
+os.environ.setdefault("METADATA_STORE_CONFIG", '{"provider":"prisma"}')
+os.environ.setdefault(
+    "VECTOR_DB_CONFIG", '{"provider":"numpy", "config": {"path": "./numpy_vector_db"}}'
+)
+
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+
+from backend.constants import (
+    DATA_INGESTION_RUN_NAME_METADATA_KEY,
+    DATA_POINT_FQN_METADATA_KEY,
+    DATA_POINT_HASH_METADATA_KEY,
+    DATA_SOURCE_FQN_METADATA_KEY,
+)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Texts ending in `-<i>` embed to [1, i / 100, 0, 0]: the larger `i`, the farther the
+    text from the query vector [1, 0, 0, 0]
+    """
+
+    def _embed(self, text: str) -> List[float]:
+        suffix = text.rsplit("-", 1)[-1]
+        i = int(suffix) if suffix.isdigit() else 0
+        return [1.0, i / 100, 0.0, 0.0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def _make_documents(
+    data_point_fqn: str,
+    data_point_hash: str,
+    count: int,
+    data_source_fqn: str = "ds::a",
+    data_ingestion_run_name: Optional[str] = "run-1",
+) -> List[Document]:
+    metadata = {
+        DATA_POINT_FQN_METADATA_KEY: data_point_fqn,
+        DATA_POINT_HASH_METADATA_KEY: data_point_hash,
+        DATA_SOURCE_FQN_METADATA_KEY: data_source_fqn,
+    }
+    if data_ingestion_run_name:
+        metadata[DATA_INGESTION_RUN_NAME_METADATA_KEY] = data_ingestion_run_name
+    return [
+        Document(
+            page_content=f"{data_point_fqn}-{data_point_hash}-{i}",
+            metadata={**metadata, "chunk": i},
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(scope="session")
+def embeddings() -> FakeEmbeddings:
+    return FakeEmbeddings()
+
+
+@pytest.fixture(scope="session")
+def make_documents() -> Callable[..., List[Document]]:
+    """`count` chunks of a data point, with the metadata written by the indexer"""
+    return _make_documents
@@ -0,0 +1,211 @@
+import math
+import uuid
+
+import pytest
+
+pytest.importorskip("milvus_lite")
+
+from langchain.docstore.document import Document
+
+from backend.constants import (
+    DATA_INGESTION_RUN_NAME_METADATA_KEY,
+    DATA_POINT_FQN_METADATA_KEY,
+)
+from backend.modules.vector_db.milvus import DEFAULT_SEARCH_PARAMS, MilvusVectorDB
+from backend.types import VectorDBConfig
+
+
+@pytest.fixture(scope="module")
+def vector_db(tmp_path_factory) -> MilvusVectorDB:
+    # Milvus Lite serves uris pointing to a local file
+    url = str(tmp_path_factory.mktemp("milvus") / "milvus.db")
+    vector_db = MilvusVectorDB(VectorDBConfig(provider="milvus", url=url))
+    yield vector_db
+    vector_db.milvus_client.close()
+
+
+@pytest.fixture
+def collection_name(vector_db, embeddings) -> str:
+    collection_name = f"test_{uuid.uuid4().hex}"
+    vector_db.create_collection(collection_name, embeddings)
+    yield collection_name
+    vector_db.delete_collection(collection_name)
+
+
+def test_upsert_deletes_outdated_versions(
+    vector_db, collection_name, embeddings, make_documents
+):
+    vector_db.upsert_documents(
+        collection_name,
+        make_documents("ds::a::f1", "h1", 3) + make_documents("ds::a::f2", "h1", 2),
+        embeddings,
+    )
+    vector_db.upsert_documents(
+        collection_name, make_documents("ds::a::f1", "h2", 1), embeddings
+    )
+
+    data_point_vectors = vector_db.list_data_point_vectors(collection_name, "ds::a")
+    assert sorted(
+        (vector.data_point_fqn, vector.data_point_hash) for vector in data_point_vectors
+    ) == [("ds::a::f1", "h2"), ("ds::a::f2", "h1"), ("ds::a::f2", "h1")]
+
+
+def test_non_incremental_upsert_keeps_previous_versions(
+    vector_db, collection_name, embeddings, make_documents
+):
+    vector_db.upsert_documents(
+        collection_name, make_documents("ds::a::f1", "h1", 2), embeddings
+    )
+    vector_db.upsert_documents(
+        collection_name,
+        make_documents("ds::a::f1", "h2", 1),
+        embeddings,
+        incremental=False,
+    )
+    assert len(vector_db.list_data_point_vectors(collection_name, "ds::a")) == 3
+
+
+def test_list_data_point_vectors_across_batches(
+    vector_db, collection_name, embeddings, make_documents
+):
+    documents = []
+    for i in range(5):
+        documents += make_documents(f"ds::a::f{i}", "h1", 7)
+    documents += make_documents("ds::a.b::f0", "h1", 4, data_source_fqn="ds::a.b")
+    vector_db.upsert_documents(collection_name, documents, embeddings)
+
+    for batch_size in (1, 3, 7, 10, 100):
+        data_point_vectors = vector_db.list_data_point_vectors(
+            collection_name, "ds::a", batch_size=batch_size
+        )
+        listed_ids = [vector.data_point_vector_id for vector in data_point_vectors]
+        assert len(listed_ids) == len(set(listed_ids)) == 35
+        assert all(
+            vector.data_point_fqn.startswith("ds::a::") for vector in data_point_vectors
+        )
+    assert len(vector_db.list_data_point_vectors(collection_name, "ds::a.b")) == 4
+
+
+def test_delete_data_point_vectors_by_id(
+    vector_db, collection_name, embeddings, make_documents
+):
+    vector_db.upsert_documents(
+        collection_name, make_documents("ds::a::f1", "h1", 10), embeddings
+    )
+    data_point_vectors = vector_db.list_data_point_vectors(collection_name, "ds::a")
+
+    vector_db.delete_data_point_vectors(
+        collection_name, data_point_vectors[:7], batch_size=3
+    )
+
+    remaining = vector_db.list_data_point_vectors(collection_name, "ds::a")
+    assert {vector.data_point_vector_id for vector in remaining} == {
+        vector.data_point_vector_id for vector in data_point_vectors[7:]
+    }
+
+
+def test_delete_data_source_vectors(
+    vector_db, collection_name, embeddings, make_documents
+):
+    vector_db.upsert_documents(
+        collection_name,
+        make_documents("ds::a::f1", "h1", 2)
+        # Written before the run names were recorded in the metadata
+        + make_documents("ds::a::f2", "h1", 2, data_ingestion_run_name=None)
+        + make_documents("ds::a::f3", "h1", 3, data_ingestion_run_name="run-2")
+        + make_documents("ds::b::f1", "h1", 1, data_source_fqn="ds::b"),
+        embeddings,
+    )
+
+    assert (
+        vector_db.backfill_data_ingestion_run_names(
+            collection_name, "backfilled", batch_size=1
+        )
+        == 2
+    )
+    backfilled = vector_db.milvus_client.query(
+        collection_name,
+        filter=f'metadata["{DATA_POINT_FQN_METADATA_KEY}"] == "ds::a::f2"',
+        output_fields=["metadata", "text"],
+    )
+    assert sorted(entity["text"] for entity in backfilled) == [
+        "ds::a::f2-h1-0",
+        "ds::a::f2-h1-1",
+    ]
+    assert all(
+        entity["metadata"][DATA_INGESTION_RUN_NAME_METADATA_KEY] == "backfilled"
+        for entity in backfilled
+    )
+    vector_db.delete_data_source_vectors(
+        collection_name, "ds::a", exclude_data_ingestion_run_name="run-2"
+    )
+    assert {
+        vector.data_point_fqn
+        for vector in vector_db.list_data_point_vectors(collection_name, "ds::a")
+    } == {"ds::a::f3"}
+
+    vector_db.delete_data_source_vectors(collection_name, "ds::a")
+    assert vector_db.list_data_point_vectors(collection_name, "ds::a") == []
+    assert len(vector_db.list_data_point_vectors(collection_name, "ds::b")) == 1
+
+
+def test_search_params(vector_db, collection_name, monkeypatch):
+    # Milvus Lite collections are IVF_FLAT indexed, the index type is read back from Milvus
+    vector_db._index_types.clear()
+    assert vector_db._get_search_params(collection_name) == {
+        "metric_type": "COSINE",
+        "params": DEFAULT_SEARCH_PARAMS["IVF_FLAT"],
+    }
+
+    # Configured search params override the defaults of the index type
+    monkeypatch.setattr(vector_db.milvus_config, "search_params", {"nprobe": 4})
+    assert vector_db._get_search_params(collection_name) == {
+        "metric_type": "COSINE",
+        "params": {"nprobe": 4},
+    }
+    results = vector_db.search(collection_name, [[1.0, 0.0, 0.0, 0.0]], limit=1)
+    assert results == [[]]
+
+
+def test_search(vector_db, collection_name, embeddings):
+    documents = [
+        Document(page_content=f"doc-{i}", metadata={"chunk": i, "source": "test"})
+        for i in range(40)
+    ]
+    vector_db.upsert_documents(collection_name, documents, embeddings)
+    query = [[1.0, 0.0, 0.0, 0.0]]
+
+    [first_page] = vector_db.search(collection_name, query, limit=5)
+    assert [result.page_content for result in first_page] == [
+        f"doc-{i}" for i in range(5)
+    ]
+    assert first_page[0].metadata == {"chunk": 0, "source": "test"}
+    assert first_page[1].score == pytest.approx(1 / math.sqrt(1 + 0.01**2), abs=1e-4)
+
+    [second_page] = vector_db.search(
+        collection_name,
+        query,
+        limit=5,
+        offset=5,
+        with_content=False,
+        metadata_keys=["chunk"],
+    )
+    assert [result.metadata for result in second_page] == [
+        {"chunk": i} for i in range(5, 10)
+    ]
+    assert all(result.page_content is None for result in second_page)
+    assert not {result.id for result in first_page} & {
+        result.id for result in second_page
+    }
+
+    # Cosine similarities, results below the threshold are cut
+    score_threshold = 1 / math.sqrt(1 + 0.125**2)
+    [results] = vector_db.search(
+        collection_name, query, limit=20, score_threshold=score_threshold
+    )
+    assert [result.page_content for result in results] == [
+        f"doc-{i}" for i in range(13)
+    ]
+
+    with pytest.raises(NotImplementedError):
+        vector_db.search(collection_name, query, limit=5, filter={"must": []})
@@ -0,0 +1,188 @@
+import os
+from typing import List
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pymongo = pytest.importorskip("pymongo")
+
+from backend.modules.vector_db import mongo
+from backend.types import VectorDBConfig
+
+# Server backed tests run against this MongoDB, they are skipped when it is not reachable
+MONGODB_TEST_URL = os.getenv("MONGODB_TEST_URL", "mongodb://localhost:27017")
+
+
+def make_vector_db(url: str, database_name: str) -> mongo.MongoVectorDB:
+    vector_db = mongo.MongoVectorDB(
+        VectorDBConfig(
+            provider="mongo", url=url, config={"database_name": database_name}
+        )
+    )
+    # The vector search index is Atlas only, the collection gets the regular indexes
+    vector_db.db.create_collection("test")
+    vector_db._create_indexes("test")
+    return vector_db
+
+
+@pytest.fixture
+def vector_db(monkeypatch) -> mongo.MongoVectorDB:
+    monkeypatch.setattr(mongo, "MongoClient", mongomock.MongoClient)
+    return make_vector_db("mongodb://localhost", "test")
+
+
+@pytest.fixture
+def server_vector_db(request) -> mongo.MongoVectorDB:
+    client = pymongo.MongoClient(MONGODB_TEST_URL, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip(f"No MongoDB server at {MONGODB_TEST_URL}")
+    database_name = f"cognita_test_{os.getpid()}"
+    request.addfinalizer(lambda: client.drop_database(database_name))
+    return make_vector_db(MONGODB_TEST_URL, database_name)
+
+
+def test_upsert_deletes_outdated_versions(vector_db, embeddings, make_documents):
+    vector_db.upsert_documents("test", make_documents("ds::a::f1", "h1", 3), embeddings)
+    vector_db.upsert_documents("test", make_documents("ds::a::f2", "h1", 2), embeddings)
+    vector_db.upsert_documents("test", make_documents("ds::a::f1", "h2", 1), embeddings)
+
+    data_point_vectors = vector_db.list_data_point_vectors("test", "ds::a")
+    assert sorted(
+        (vector.data_point_fqn, vector.data_point_hash) for vector in data_point_vectors
+    ) == [("ds::a::f1", "h2"), ("ds::a::f2", "h1"), ("ds::a::f2", "h1")]
+
+
+def test_non_incremental_upsert_keeps_previous_versions(
+    vector_db, embeddings, make_documents
+):
+    vector_db.upsert_documents("test", make_documents("ds::a::f1", "h1", 2), embeddings)
+    vector_db.upsert_documents(
+        "test", make_documents("ds::a::f1", "h2", 1), embeddings, incremental=False
+    )
+    assert len(vector_db.list_data_point_vectors("test", "ds::a")) == 3
+
+
+def test_list_data_point_vectors_across_batches(vector_db, embeddings, make_documents):
+    documents = []
+    for i in range(5):
+        documents += make_documents(f"ds::a::f{i}", "h1", 7)
+    # Same prefix, different data source
+    documents += make_documents("ds::a.b::f0", "h1", 4, data_source_fqn="ds::a.b")
+    vector_db.upsert_documents("test", documents, embeddings)
+
+    ids = {str(doc["_id"]) for doc in vector_db.db["test"].find({})}
+    for batch_size in (1, 3, 7, 10, 100):
+        data_point_vectors = vector_db.list_data_point_vectors(
+            "test", "ds::a", batch_size=batch_size
+        )
+        listed_ids = [vector.data_point_vector_id for vector in data_point_vectors]
+        assert len(listed_ids) == len(set(listed_ids)) == 35
+        assert set(listed_ids) < ids
+        assert all(
+            vector.data_point_fqn.startswith("ds::a::") for vector in data_point_vectors
+        )
+    assert len(vector_db.list_document_vector_points("test")) == 39
+
+
+def test_delete_data_point_vectors_by_id(vector_db, embeddings, make_documents):
+    vector_db.upsert_documents(
+        "test", make_documents("ds::a::f1", "h1", 10), embeddings
+    )
+    data_point_vectors = vector_db.list_data_point_vectors("test", "ds::a")
+
+    vector_db.delete_data_point_vectors("test", data_point_vectors[:7], batch_size=3)
+
+    remaining = vector_db.list_data_point_vectors("test", "ds::a")
+    assert {vector.data_point_vector_id for vector in remaining} == {
+        vector.data_point_vector_id for vector in data_point_vectors[7:]
+    }
+
+
+def test_list_and_delete_documents(vector_db, embeddings, make_documents):
+    vector_db.upsert_documents("test", make_documents("ds::a::f1", "h1", 2), embeddings)
+    vector_db.upsert_documents(
+        "test",
+        make_documents("ds::b::f1", "h1", 3, data_source_fqn="ds::b"),
+        embeddings,
+    )
+    assert sorted(vector_db.list_documents_in_collection("test")) == [
+        "ds::a::f1",
+        "ds::b::f1",
+    ]
+
+    vector_db.delete_documents("test", ["ds::b::f1"])
+    assert vector_db.list_documents_in_collection("test") == ["ds::a::f1"]
+
+
+def test_delete_data_source_vectors(vector_db, embeddings, make_documents):
+    vector_db.upsert_documents("test", make_documents("ds::a::f1", "h1", 2), embeddings)
+    vector_db.upsert_documents(
+        "test",
+        make_documents("ds::a::f2", "h1", 3, data_ingestion_run_name="run-2"),
+        embeddings,
+    )
+    vector_db.upsert_documents(
+        "test",
+        make_documents("ds::b::f1", "h1", 1, data_source_fqn="ds::b"),
+        embeddings,
+    )
+
+    vector_db.delete_data_source_vectors(
+        "test", "ds::a", exclude_data_ingestion_run_name="run-2"
+    )
+    assert {
+        vector.data_point_fqn
+        for vector in vector_db.list_data_point_vectors("test", "ds::a")
+    } == {"ds::a::f2"}
+
+    vector_db.delete_data_source_vectors("test", "ds::a")
+    assert vector_db.list_data_point_vectors("test", "ds::a") == []
+    assert len(vector_db.list_data_point_vectors("test", "ds::b")) == 1
+
+
+def _plan_stages(plan) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages += _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages += _plan_stages(value)
+    return stages
+
+
+def test_listing_pages_on_the_fqn_id_index(
+    server_vector_db, monkeypatch, embeddings, make_documents
+):
+    documents = []
+    for i in range(20):
+        documents += make_documents(f"ds::a::f{i:02d}", "h1", 5)
+    documents += make_documents("ds::b::f0", "h1", 5, data_source_fqn="ds::b")
+    server_vector_db.upsert_documents("test", documents, embeddings)
+
+    cursors = []
+    find = pymongo.collection.Collection.find
+
+    def recording_find(self, *args, **kwargs):
+        cursor = find(self, *args, **kwargs)
+        cursors.append(cursor)
+        return cursor
+
+    monkeypatch.setattr(pymongo.collection.Collection, "find", recording_find)
+    data_point_vectors = server_vector_db.list_data_point_vectors(
+        "test", "ds::a", batch_size=8
+    )
+    listed_ids = [vector.data_point_vector_id for vector in data_point_vectors]
+    assert len(listed_ids) == len(set(listed_ids)) == 100
+
+    # Every page is a range scan of the index, without a blocking sort
+    assert len(cursors) > 2
+    for cursor in cursors:
+        stages = _plan_stages(cursor.clone().explain()["queryPlanner"]["winningPlan"])
+        assert "IXSCAN" in stages
+        assert "SORT" not in stages
+        assert "COLLSCAN" not in stages
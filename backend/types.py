@@ -1,7 +1,7 @@
 import enum
 import uuid
 from enum import Enum
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
 from pydantic import (
     BaseModel,
@@ -30,6 +30,8 @@ class DataIngestionMode(str, Enum):
     NONE = "NONE"
     INCREMENTAL = "INCREMENTAL"
     FULL = "FULL"
+    # Rebuild the data source into a shadow collection and atomically swap it in
+    BLUE_GREEN = "BLUE_GREEN"
 
 
 class DataPoint(ConfiguredBaseModel):
@@ -65,6 +67,17 @@ class DataPoint(ConfiguredBaseModel):
         return f"{FQN_SEPARATOR}".join([self.data_source_fqn, self.data_point_uri])
 
 
+class VectorSearchResult(ConfiguredBaseModel):
+    """
+    A chunk returned by a vector search, with only the payload that was requested
+    """
+
+    id: str
+    score: float
+    page_content: Optional[str] = None
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+
 class DataPointVector(ConfiguredBaseModel):
     """
     Data point vector describes a single data point in the vector store
@@ -130,12 +143,38 @@ class ModelProviderConfig(ConfiguredBaseModel):
     provider_name: str
     api_format: str
     base_url: Optional[str] = None
+    # Several endpoints serving the same models, chat requests are routed across them
+    base_urls: List[str] = Field(default_factory=list)
+    # See `EndpointRoutingConfig`
+    routing: Dict[str, Any] = Field(default_factory=dict)
     api_key_env_var: str
     default_headers: Dict[str, str] = Field(default_factory=dict)
     llm_model_ids: List[str] = Field(default_factory=list)
     embedding_model_ids: List[str] = Field(default_factory=list)
     reranking_model_ids: List[str] = Field(default_factory=list)
     audio_model_ids: List[str] = Field(default_factory=list)
+    # Provider specific settings, e.g. the runtime of `api_format: local` models
+    parameters: Dict[str, Any] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def ensure_base_url(self) -> "ModelProviderConfig":
+        # Embedding, reranking and audio models are not routed, they use the first endpoint
+        if self.base_url is None and self.base_urls:
+            self.base_url = self.base_urls[0]
+        return self
+
+
+class VectorDataType(str, Enum):
+    """
+    Storage datatype of the vectors of a collection
+    FLOAT32: Full precision vectors
+    FLOAT16: Half precision vectors, halves memory and disk
+    UINT8: Scalar quantized vectors held in memory, full precision vectors are kept on disk for rescoring
+    """
+
+    FLOAT32 = "float32"
+    FLOAT16 = "float16"
+    UINT8 = "uint8"
 
 
 class EmbedderConfig(ConfiguredBaseModel):
@@ -145,6 +184,10 @@ class EmbedderConfig(ConfiguredBaseModel):
 
     name: str
     parameters: Dict[str, Any] = Field(default_factory=dict)
+    # Truncate embeddings to the first `dimensions` components and renormalize them,
+    # only meaningful for models trained with Matryoshka representation learning
+    dimensions: Optional[int] = Field(default=None, gt=0)
+    vector_dtype: VectorDataType = VectorDataType.FLOAT32
 
     @model_validator(mode="before")
     @classmethod
@@ -196,6 +239,38 @@ class QdrantClientConfig(ConfiguredBaseModel):
     timeout: int = 300
 
 
+class MilvusClientConfig(ConfiguredBaseModel):
+    """
+    Milvus extra configuration
+    """
+
+    model_config = ConfigDict(extra="allow")
+
+    db_name: str = "milvus_default_db"
+    metric_type: str = "COSINE"
+    # ANN index of the vectors, HNSW on Milvus servers and IVF_FLAT on Milvus Lite if not set
+    index_type: Optional[Literal["FLAT", "HNSW", "IVF_FLAT", "IVF_PQ"]] = None
+    # Build parameters of the index, the defaults of the index type fill the missing ones
+    index_params: Dict[str, Any] = Field(default_factory=dict)
+    # Query time parameters of the index (`ef` of HNSW, `nprobe` of IVF), defaults as above
+    search_params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class NumpyVectorDBConfig(ConfiguredBaseModel):
+    """
+    Memory-mapped NumPy vector db extra configuration
+    """
+
+    # Directory of the collections, one sub directory per collection
+    path: str = "./numpy_vector_db"
+    # Collections with fewer live vectors are searched exhaustively, larger ones with an IVF index
+    ivf_min_vectors: int = Field(default=100_000, ge=1)
+    # Number of IVF lists scanned per query, higher is slower with a better recall
+    ivf_nprobe: int = Field(default=16, ge=1)
+    # Rows scored per matrix product of an exhaustive search, bounds the memory of a search
+    search_chunk_size: int = Field(default=65_536, ge=1)
+
+
 class MetadataStoreConfig(ConfiguredBaseModel):
     """
     Metadata store configuration
@@ -303,6 +378,31 @@ class DataIngestionRun(BaseDataIngestionRun):
     )
 
 
+class SkippedChunk(ConfiguredBaseModel):
+    """
+    A chunk skipped as a duplicate, kept so that it can be re-admitted once its canonical chunk is gone
+    """
+
+    chunk_hash: str
+    signature: Optional[int] = None
+    duplicate_of: str = Field(
+        title="Fully qualified name of the data point of the canonical chunk",
+    )
+    page_content: str
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+
+class DedupIndexEntry(ConfiguredBaseModel):
+    """
+    Chunk deduplication state of a data point of a collection
+    """
+
+    data_point_fqn: str
+    # (exact hash, simhash or None) of the canonical chunks of the data point
+    chunks: List[Tuple[str, Optional[int]]] = Field(default_factory=list)
+    skipped_chunks: List[SkippedChunk] = Field(default_factory=list)
+
+
 class BaseDataSource(ConfiguredBaseModel):
     """
     Data source configuration
@@ -1,5 +1,4 @@
 import asyncio
-import zipfile
 from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from contextvars import copy_context
 from functools import partial
@@ -36,21 +35,6 @@ def unflatten(dct, sub_dct_key_name, prefix=None):
     return new_dct
 
 
-def unzip_file(file_path, dest_dir):
-    """
-    Unzip the data given the input and output path.
-
-    Args:
-        file_path (str): The path of the ZIP file to be extracted.
-        dest_dir (str): The destination directory where the contents will be extracted.
-
-    Returns:
-        None
-    """
-    with zipfile.ZipFile(file_path, "r") as zip_ref:
-        zip_ref.extractall(dest_dir)
-
-
 def _get_artifacts_repo(fqn: str, cache: Optional[dict] = None) -> Any:
     if cache is not None and fqn in cache:
         return cache[fqn]